@@ -0,0 +1,26 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.rollup import rebuild_rollup
+
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Некорректная дата: {value} (ожидается ГГГГ-ММ-ДД)")
+
+
+class Command(BaseCommand):
+    help = "Пересобирает дневную сводку заказов (DailyOrderRollup) по таблице заказов"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=parse_date, help="Первый день (по умолчанию — первый заказ)")
+        parser.add_argument('--end', type=parse_date, help="Последний день (по умолчанию — последний заказ)")
+        parser.add_argument('--chunk-days', type=int, default=31,
+                            help="Дней в одной транзакции (по умолчанию 31)")
+
+    def handle(self, *args, **options):
+        total = rebuild_rollup(options['start'], options['end'], chunk_days=options['chunk_days'])
+        self.stdout.write(self.style.SUCCESS(f"Сводка пересобрана: строк — {total}"))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOrderRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='День')),
+                ('status', models.CharField(max_length=20, verbose_name='Статус')),
+                ('orders', models.IntegerField(default=0, verbose_name='Количество заказов')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Сумма заказов')),
+                ('on_time', models.IntegerField(default=0, verbose_name='Доставлено в срок')),
+            ],
+            options={
+                'verbose_name': 'Сводка заказов за день',
+                'verbose_name_plural': 'Сводки заказов за день',
+                'constraints': [models.UniqueConstraint(fields=('date', 'status'), name='rollup_unique_date_status')],
+            },
+        ),
+    ]
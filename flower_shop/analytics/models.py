@@ -22,4 +22,32 @@ class Report(models.Model):
         super().clean()
 
     def __str__(self):
-        return f"Отчет за {self.period_start} - {self.period_end}"
\ No newline at end of file
+        return f"Отчет за {self.period_start} - {self.period_end}"
+
+
+class DailyOrderRollup(models.Model):
+    """
+    Денормализованная сводка заказов за день (по местному времени) в разрезе
+    статусов. Поддерживается сигналами заказов (analytics.signals), пересобирается
+    командой backfill_order_rollup; отчёты суммируют её строки вместо заказов.
+    """
+    date = models.DateField(verbose_name="День")
+    status = models.CharField(max_length=20, verbose_name="Статус")
+    orders = models.IntegerField(default=0, verbose_name="Количество заказов")
+    revenue = models.DecimalField(
+        verbose_name="Сумма заказов",
+        max_digits=14,
+        decimal_places=2,
+        default=0
+    )
+    on_time = models.IntegerField(default=0, verbose_name="Доставлено в срок")
+
+    class Meta:
+        verbose_name = "Сводка заказов за день"
+        verbose_name_plural = "Сводки заказов за день"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status'], name='rollup_unique_date_status')
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.orders}"
@@ -0,0 +1,101 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from orders.models import Order
+
+from .models import DailyOrderRollup
+
+# Поля заказа, от которых зависит его вклад в сводку
+ORDER_FIELDS = ('order_date', 'status', 'total_price', 'delivered_date', 'delivery_date')
+
+
+def order_contribution(order_date, status, total_price, delivered_date, delivery_date):
+    """
+    Вклад заказа в сводку: (день, статус, сумма, доставлен в срок).
+    Принимает значения полей ORDER_FIELDS; None — если заказ ещё без даты.
+    """
+    if order_date is None:
+        return None
+    on_time = bool(
+        status == 'delivered' and delivered_date and delivery_date and delivered_date <= delivery_date
+    )
+    return timezone.localtime(order_date).date(), status, total_price or 0, on_time
+
+
+def _delta(revenue, on_time, sign):
+    """Выражения F() для инкрементального изменения сводки на один заказ"""
+    return {
+        'orders': F('orders') + sign,
+        'revenue': F('revenue') + sign * revenue,
+        'on_time': F('on_time') + sign * int(on_time),
+    }
+
+
+def apply_order(contribution, sign=1):
+    """Добавляет (sign=1) или вычитает (sign=-1) вклад заказа в сводку его дня и статуса"""
+    if contribution is None:
+        return
+    day, status, revenue, on_time = contribution
+    lookup = {'date': day, 'status': status}
+    with transaction.atomic():
+        updated = DailyOrderRollup.objects.filter(**lookup).update(**_delta(revenue, on_time, sign))
+        if not updated and sign > 0:
+            DailyOrderRollup.objects.get_or_create(**lookup)
+            DailyOrderRollup.objects.filter(**lookup).update(**_delta(revenue, on_time, sign))
+
+
+def compute_rollup(start, end):
+    """
+    Точные сводки за дни [start, end), посчитанные заново по заказам.
+    Генерирует (день, статус, {orders, revenue, on_time}).
+    """
+    tz = timezone.get_current_timezone()
+    rows = (
+        Order.objects
+        .filter(
+            order_date__gte=timezone.make_aware(datetime.combine(start, time.min), tz),
+            order_date__lt=timezone.make_aware(datetime.combine(end, time.min), tz),
+        )
+        .annotate(day=TruncDate('order_date', tzinfo=tz))
+        .order_by()
+        .values('day', 'status')
+        .annotate(
+            orders=Count('id'),
+            revenue=Sum('total_price'),
+            on_time=Count('id', filter=Q(status='delivered', delivered_date__lte=F('delivery_date'))),
+        )
+    )
+    for row in rows:
+        yield row.pop('day'), row.pop('status'), row
+
+
+def rebuild_rollup(start=None, end=None, chunk_days=31):
+    """
+    Пересобирает сводки за дни [start, end] по заказам (по умолчанию — за всю
+    историю) порциями по chunk_days дней, каждая в своей транзакции: длинная
+    история не держит одну большую транзакцию. Возвращает число строк сводки.
+    """
+    if start is None or end is None:
+        bounds = Order.objects.aggregate(first=Min('order_date'), last=Max('order_date'))
+        if bounds['first'] is None:
+            return 0
+        start = start or timezone.localtime(bounds['first']).date()
+        end = end or timezone.localtime(bounds['last']).date()
+
+    total = 0
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days), end + timedelta(days=1))
+        with transaction.atomic():
+            DailyOrderRollup.objects.filter(date__gte=chunk_start, date__lt=chunk_end).delete()
+            rows = DailyOrderRollup.objects.bulk_create([
+                DailyOrderRollup(date=day, status=status, **stats)
+                for day, status, stats in compute_rollup(chunk_start, chunk_end)
+            ])
+        total += len(rows)
+        chunk_start = chunk_end
+    return total
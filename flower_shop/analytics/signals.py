@@ -0,0 +1,34 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from orders.models import Order
+
+from .rollup import ORDER_FIELDS, apply_order, order_contribution
+
+
+@receiver(pre_save, sender=Order, dispatch_uid='analytics_order_remember_contribution')
+def remember_order_contribution(sender, instance, raw=False, **kwargs):
+    # Запоминаем прежний вклад заказа, чтобы при смене статуса или суммы сдвинуть сводку
+    instance._previous_contribution = None
+    if instance.pk and not raw:
+        previous = Order.objects.filter(pk=instance.pk).values_list(*ORDER_FIELDS).first()
+        if previous:
+            instance._previous_contribution = order_contribution(*previous)
+
+
+@receiver(post_save, sender=Order, dispatch_uid='analytics_order_rollup_saved')
+def update_rollup_on_save(sender, instance, raw=False, **kwargs):
+    # QuerySet.update() и bulk_create сигналов не шлют — после массовых
+    # изменений сводку пересобирает команда backfill_order_rollup
+    if raw:
+        return
+    previous = getattr(instance, '_previous_contribution', None)
+    current = order_contribution(*(getattr(instance, field) for field in ORDER_FIELDS))
+    if previous != current:
+        apply_order(previous, sign=-1)
+        apply_order(current)
+
+
+@receiver(post_delete, sender=Order, dispatch_uid='analytics_order_rollup_deleted')
+def update_rollup_on_delete(sender, instance, **kwargs):
+    apply_order(order_contribution(*(getattr(instance, field) for field in ORDER_FIELDS)), sign=-1)
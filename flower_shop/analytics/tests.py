@@ -4,8 +4,16 @@ from hypothesis import given, strategies as st, assume
 from hypothesis.extra.django import TestCase as HypTestCase
 import datetime
 from django.apps import apps
+from django.core.management import call_command
+from django.utils import timezone
+import io
+
+from analytics.utils import build_report, report_totals
 
 Report = apps.get_model('analytics', 'Report')
+DailyOrderRollup = apps.get_model('analytics', 'DailyOrderRollup')
+Order = apps.get_model('orders', 'Order')
+CustomUser = apps.get_model('users', 'CustomUser')
 
 
 class ReportTests(TestCase):
@@ -52,4 +60,74 @@ class AnalyticsHypothesisTests(HypTestCase):
             on_time_delivery_percent=95.0
         )
         self.assertEqual(report.period_start, start_date)
-        self.assertEqual(float(report.total_revenue), float(revenue))
\ No newline at end of file
+        self.assertEqual(float(report.total_revenue), float(revenue))
+
+
+class DailyOrderRollupTests(TestCase):
+    """Дневная сводка заказов: поддержка сигналами, пересборка, отчёты по сводке"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username="rollup", password="x")
+        self.now = timezone.now()
+
+    def make_order(self, days_ago=0, status='ordered', price=1000, late=False):
+        order_date = self.now - datetime.timedelta(days=days_ago)
+        order = Order.objects.create(
+            user=self.user, status=status, total_price=price,
+            delivery_date=order_date + datetime.timedelta(days=1), address="Rollup Address",
+        )
+        # order_date — auto_now_add; сдвигаем через save(), чтобы сработали сигналы
+        order.order_date = order_date
+        if status == 'delivered':
+            order.delivered_date = order_date + datetime.timedelta(days=2 if late else 0)
+        order.save()
+        return order
+
+    def stored(self):
+        return {
+            (row.date, row.status): (row.orders, row.revenue, row.on_time)
+            for row in DailyOrderRollup.objects.exclude(orders=0)
+        }
+
+    def test_rollup_follows_order_changes(self):
+        order = self.make_order(price=1000)
+        day = timezone.localtime(order.order_date).date()
+        self.assertEqual(self.stored(), {(day, 'ordered'): (1, 1000, 0)})
+
+        order.status = 'delivered'
+        order.total_price = 1500
+        order.save()
+        self.assertEqual(self.stored(), {(day, 'delivered'): (1, 1500, 1)})
+
+        order.delete()
+        self.assertEqual(self.stored(), {})
+
+    def test_backfill_matches_incremental(self):
+        for i, days in enumerate([0, 0, 3, 40, 400, 800]):
+            self.make_order(days, status=['ordered', 'delivered', 'canceled'][i % 3], price=100 * (i + 1), late=i % 2)
+        incremental = self.stored()
+
+        DailyOrderRollup.objects.all().delete()
+        out = io.StringIO()
+        call_command('backfill_order_rollup', '--chunk-days', '7', stdout=out)
+        self.assertIn("Сводка пересобрана", out.getvalue())
+        self.assertEqual(self.stored(), incremental)
+
+    def test_report_sums_rollup(self):
+        self.make_order(1, price=1000)
+        self.make_order(2, status='delivered', price=2000)
+        self.make_order(3, status='delivered', price=3000, late=True)
+        self.make_order(4, status='canceled', price=5000)
+        self.make_order(900, price=7000)
+
+        today = timezone.localdate()
+        with self.assertNumQueries(2):
+            report = build_report(today - datetime.timedelta(days=10), today)
+        self.assertEqual(report.total_orders, 3)
+        self.assertEqual(report.total_revenue, 6000)
+        self.assertEqual(report.on_time_delivery_percent, 50.0)
+
+        # Запросы по сводке не зависят от длины периода
+        with self.assertNumQueries(1):
+            totals = report_totals(today - datetime.timedelta(days=5 * 365), today)
+        self.assertEqual(totals['total_orders'], 4)
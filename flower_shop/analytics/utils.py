@@ -0,0 +1,34 @@
+from django.db.models import Q, Sum
+
+from .models import DailyOrderRollup, Report
+
+
+def report_totals(period_start, period_end):
+    """
+    Итоги за дни [period_start, period_end] по сводке DailyOrderRollup —
+    один агрегирующий запрос по строкам дней, а не по заказам. Отменённые
+    заказы не учитываются, как в Order.get_stats.
+    """
+    totals = DailyOrderRollup.objects.filter(
+        date__gte=period_start,
+        date__lte=period_end
+    ).exclude(status='canceled').aggregate(
+        total_orders=Sum('orders'),
+        total_revenue=Sum('revenue'),
+        delivered=Sum('orders', filter=Q(status='delivered')),
+        on_time=Sum('on_time'),
+    )
+    delivered = totals['delivered'] or 0
+    return {
+        'total_orders': totals['total_orders'] or 0,
+        'total_revenue': totals['total_revenue'] or 0,
+        'on_time_delivery_percent': round(100 * (totals['on_time'] or 0) / delivered, 2) if delivered else 0.0,
+    }
+
+
+def build_report(period_start, period_end):
+    """Создаёт отчёт Report за период по сводке заказов"""
+    report = Report(period_start=period_start, period_end=period_end, **report_totals(period_start, period_end))
+    report.full_clean()
+    report.save()
+    return report
@@ -0,0 +1,180 @@
+"""
+Нагрузка на читающие страницы (главная, каталог, товар, отзывы товара,
+лента отзывов) при большом числе одновременных запросов: WSGI — пул потоков,
+как у gunicorn --threads, против ASGI — один цикл событий, как у uvicorn.
+Запросы подаются прямо в WSGIHandler / ASGIHandler, без сети. Под ASGI
+страницы проверяются и с async-представлениями (settings.ASYNC_VIEWS, как
+в asgi.py), и с синхронными.
+
+    python -m benchmarks.asgi_load --concurrency 8 64 --requests 400
+"""
+import asyncio
+import importlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+from benchmarks.common import base_parser, benchmark_database, percentile, print_table, seed_products, setup_django
+
+
+def wsgi_get(app, path, query=''):
+    environ = {}
+    setup_testing_defaults(environ)
+    environ.update(PATH_INFO=path, QUERY_STRING=query)
+    status = []
+    body = app(environ, lambda line, headers, exc_info=None: status.append(line))
+    try:
+        for _ in body:
+            pass
+    finally:
+        body.close()
+    return int(status[0].split()[0])
+
+
+async def asgi_get(app, path, query=''):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': query.encode(), 'headers': [(b'host', b'testserver')],
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 50000),
+    }
+    finished = asyncio.Event()
+    request_sent = False
+    status = None
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Клиент не отключается, пока не прочитал ответ
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body' and not message.get('more_body'):
+            finished.set()
+
+    await app(scope, receive, send)
+    return status
+
+
+def run_wsgi(app, path, query, total, concurrency):
+    def timed(_):
+        started = time.perf_counter()
+        status = wsgi_get(app, path, query)
+        return status, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(timed, range(total)))
+    return results, time.perf_counter() - started
+
+
+def run_asgi(app, path, query, total, concurrency):
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def timed():
+            async with semaphore:
+                started = time.perf_counter()
+                status = await asgi_get(app, path, query)
+                return status, (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(timed() for _ in range(total)))
+        return results, time.perf_counter() - started
+
+    return asyncio.run(main())
+
+
+def use_async_views(enabled):
+    """Переключает маршруты между синхронными и async-представлениями"""
+    from django.conf import settings
+    from django.urls import clear_url_caches
+
+    settings.ASYNC_VIEWS = enabled
+    # catalog.urls подключается из корневых маршрутов — перечитываем его первым
+    for module in ('catalog.urls', settings.ROOT_URLCONF):
+        importlib.reload(importlib.import_module(module))
+    clear_url_caches()
+
+
+def seed_reviews(count, product_ids, users=50):
+    from catalog.models import Review
+    from catalog.ratings import rebuild_ratings
+    from users.models import CustomUser
+
+    authors = CustomUser.objects.bulk_create([
+        CustomUser(username=f'reviewer{i}', password='!') for i in range(users)
+    ])
+    # Один отзыв на пару (пользователь, товар)
+    Review.objects.bulk_create([
+        Review(user=authors[i % users], product_id=product_ids[i // users % len(product_ids)],
+               text=f'Отзыв {i}', rating=1 + i % 5)
+        for i in range(count)
+    ])
+    rebuild_ratings()
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--size', type=int, default=500, help="Товаров в каталоге")
+    parser.add_argument('--requests', type=int, default=400, help="Запросов на страницу и режим")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[8, 64])
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.core.handlers.asgi import ASGIHandler
+    from django.core.handlers.wsgi import WSGIHandler
+
+    from catalog.models import Product
+
+    settings.ALLOWED_HOSTS = ['*']
+
+    with benchmark_database(args.db):
+        seed_products(args.size)
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        seed_reviews(args.size * 2, product_ids)
+        product_id = product_ids[0]
+
+        pages = [
+            ('главная', '/', ''),
+            ('каталог', '/catalog/', ''),
+            ('товар', f'/catalog/{product_id}/', ''),
+            ('отзывы товара', f'/catalog/{product_id}/reviews/', ''),
+            ('лента отзывов', '/reviews/', 'limit=20'),
+        ]
+        servers = [
+            ('WSGI', 'sync', WSGIHandler(), run_wsgi),
+            ('ASGI', 'async', ASGIHandler(), run_asgi),
+            ('ASGI', 'sync', ASGIHandler(), run_asgi),
+        ]
+
+        rows = []
+        for label, path, query in pages:
+            for concurrency in args.concurrency:
+                for server, views, app, run in servers:
+                    use_async_views(views == 'async')
+                    # Прогрев: шаблоны, кэш выборок каталога, соединения с БД
+                    run(app, path, query, concurrency, concurrency)
+                    results, elapsed = run(app, path, query, args.requests, concurrency)
+                    statuses = {status for status, _ in results}
+                    assert statuses == {200}, f"{server} {path}: статусы {statuses}"
+                    samples = [latency for _, latency in results]
+                    rows.append([
+                        label, concurrency, server, views, f"{len(results) / elapsed:.0f}",
+                        f"{percentile(samples, 50):.1f}", f"{percentile(samples, 95):.1f}",
+                        f"{percentile(samples, 99):.1f}",
+                    ])
+
+    print(f"Товаров: {args.size}, запросов на замер: {args.requests}")
+    print_table(['страница', 'параллельно', 'сервер', 'представления', 'запросов/с', 'p50, ms', 'p95, ms', 'p99, ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Подписи к фото товаров в уведомлениях: стоимость отрисовки без кэша
+(загрузка шрифта, отрисовка, JPEG — как раньше на каждый вызов), промаха
+и попадания дискового кэша captions.
+
+    python -m benchmarks.captions --size 1200
+"""
+import os
+import tempfile
+
+from benchmarks.common import base_parser, measure, ms, print_table, summarize
+
+CAPTION = "Товар 1/3\nКрасные розы Эксплорер 60 см\nКоличество: 25 × 180₽"
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--size', type=int, default=1200, help="Сторона исходного фото, px")
+    args = parser.parse_args()
+
+    from PIL import Image
+
+    import captions
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'product.jpg')
+        Image.effect_noise((args.size, args.size), 64).convert('RGB').save(source, quality=90)
+        cache_dir = os.path.join(tmp, 'cache')
+        counter = iter(range(10 ** 9))
+
+        def uncached():
+            captions.get_font.cache_clear()
+            fd, path = tempfile.mkstemp(suffix='.jpg', dir=tmp)
+            os.close(fd)
+            captions.render_caption(source, CAPTION, path)
+            os.remove(path)
+
+        def miss():
+            # Новый текст — новый ключ
+            captions.captioned_image(source, f"{CAPTION} #{next(counter)}", cache_dir, 10 ** 9)
+
+        def hit():
+            captions.captioned_image(source, CAPTION, cache_dir, 10 ** 9)
+
+        rows = []
+        for name, func in [("без кэша", uncached), ("промах кэша", miss), ("попадание кэша", hit)]:
+            stats = summarize(measure(func, args.repeat))
+            rows.append([name, ms(stats['p50']), ms(stats['p95'])])
+
+    print(f"Фото {args.size}×{args.size}")
+    print_table(["вызов", "p50", "p95"], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Фильтры каталога: время первой страницы и фасетных счётчиков для комбинаций
+фильтров и сортировок формы catalog.html — без индексов каталога и с ними.
+Кэш выборок не участвует: замеряются сами запросы. Статистика планировщика
+(ANALYZE) собирается в обоих случаях, как это делает миграция индексов.
+
+    python -m benchmarks.catalog_filters --size 100000
+"""
+from benchmarks.common import (
+    base_parser, benchmark_database, measure, ms, print_table, seed_products, setup_django, summarize,
+)
+
+FILTERS = [
+    ('без фильтров', {}),
+    ('группа', {'group': 'Одиночные цветы'}),
+    ('группа + подгруппа', {'group': 'Одиночные цветы', 'subgroup': 'Розы'}),
+    ('группа + подгруппа + тип', {'group': 'Одиночные цветы', 'subgroup': 'Розы', 'flower_type': 'Красные розы'}),
+    ('тип цветка', {'flower_type': 'Красные розы'}),
+    ('цвет', {'colors': 'Белый'}),
+    ('новинки', {'is_new': 'on'}),
+    ('хиты продаж', {'is_bestseller': 'on'}),
+    ('в наличии', {'in_stock': 'on'}),
+    ('группа + в наличии', {'group': 'Одиночные цветы', 'in_stock': 'on'}),
+    ('новинки + в наличии', {'is_new': 'on', 'in_stock': 'on'}),
+]
+ORDERINGS = [('по умолчанию', None), ('цена ↑', 'price'), ('цена ↓', '-price')]
+
+
+def catalog_indexes():
+    from catalog.models import Product
+    return list(Product._meta.indexes)
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--size', type=int, default=100_000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+    from django.http import QueryDict
+    from django.test import RequestFactory
+
+    from catalog.facets import compute_facets
+    from catalog.models import Product, ProductColor
+    from catalog.pagination import paginate_catalog
+    from catalog.views import _filter_products, _product_filter
+
+    settings.ALLOWED_HOSTS = ['*']
+    factory = RequestFactory()
+
+    def run(params):
+        request = factory.get('/catalog/', params)
+        filtered = _filter_products(request, _product_filter(request))
+        facets = compute_facets(filtered)
+        paginate_catalog(filtered, request.GET, facets['total'])
+
+    with benchmark_database(args.db):
+        seed_products(args.size)
+        white = ProductColor.objects.get(name='Белый').pk
+
+        combos = []
+        for filter_label, filters in FILTERS:
+            for ordering_label, ordering in ORDERINGS:
+                params = QueryDict(mutable=True)
+                for key, value in filters.items():
+                    params[key] = str(white) if key == 'colors' else value
+                if ordering:
+                    params['ordering'] = ordering
+                combos.append((filter_label, ordering_label, params))
+
+        def measure_all():
+            return [summarize(measure(lambda: run(params), args.repeat)) for _, _, params in combos]
+
+        def analyze():
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        analyze()
+        after = measure_all()
+        with connection.schema_editor() as editor:
+            for index in catalog_indexes():
+                editor.remove_index(Product, index)
+        analyze()
+        before = measure_all()
+
+    rows = [
+        [filter_label, ordering_label, ms(old['p50']), ms(old['p95']), ms(new['p50']), ms(new['p95'])]
+        for (filter_label, ordering_label, _), old, new in zip(combos, before, after)
+    ]
+    print(f"Товаров: {args.size}")
+    print_table(['фильтры', 'сортировка', 'p50 до', 'p95 до', 'p50 после', 'p95 после'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Оформление заказа: число SQL-запросов и время POST /orders/checkout/
+для корзин из 1, 20 и 200 строк. Уведомление в Telegram только ставится в очередь.
+
+    python -m benchmarks.checkout --lines 1 20 200
+"""
+import time
+
+from benchmarks.common import base_parser, benchmark_database, ms, print_table, setup_django, summarize
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--lines', type=int, nargs='+', default=[1, 20, 200])
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, setup_test_environment
+    from django.urls import reverse
+    from django.utils import timezone
+
+    from catalog.models import Product
+    from orders.models import Cart, CartItem
+    from users.models import CustomUser
+
+    setup_test_environment()
+    delivery_date = (timezone.localtime() + timezone.timedelta(hours=3)).strftime('%Y-%m-%dT%H:%M')
+
+    with benchmark_database(args.db):
+        user = CustomUser.objects.create_user(username='bench', password='bench', address='Бенчмарк, 1')
+        products = Product.objects.bulk_create([
+            Product(name=f"Товар {i}", price=100 + i, quantity=10 ** 9, image='products/bench.jpg')
+            for i in range(max(args.lines))
+        ])
+        cart = Cart.objects.create(user=user)
+        client = Client()
+        client.force_login(user)
+
+        rows = []
+        for size in args.lines:
+            samples = []
+            queries = 0
+            for _ in range(args.repeat):
+                CartItem.objects.bulk_create([
+                    CartItem(cart=cart, product=product, quantity=2) for product in products[:size]
+                ])
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = client.post(reverse('orders:checkout'), {
+                        'delivery_date': delivery_date,
+                        'use_profile_address': True,
+                    })
+                    samples.append((time.perf_counter() - started) * 1000)
+                assert response.status_code == 302 and not cart.cartitem_set.exists(), "Заказ не оформлен"
+                queries = len(captured)
+
+            stats = summarize(samples)
+            rows.append([size, queries, ms(stats['p50']), ms(stats['p95'])])
+
+        print_table(['строк в корзине', 'SQL-запросов', 'p50', 'p95'], rows)
+
+
+if __name__ == '__main__':
+    main()
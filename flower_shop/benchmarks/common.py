@@ -0,0 +1,160 @@
+"""
+Общая обвязка бенчмарков.
+
+Бенчмарки запускаются из каталога flower_shop/ как модули:
+    python -m benchmarks.search --sizes 10000 100000
+
+Каждый работает на отдельной тестовой БД (по умолчанию SQLite в памяти,
+--db путь/к/файлу.sqlite3 — файловая), рабочая db.sqlite3 не затрагивается.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'flower_shop.settings')
+    # bot.py проверяет формат токена при импорте; в Telegram бенчмарки не ходят
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:benchmark')
+    os.environ.setdefault('SECRET_KEY_DJANGO', 'benchmark')
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    # Иначе каждый запрос копится в connection.queries
+    settings.DEBUG = False
+
+
+def base_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--db', help="Файл SQLite для тестовой БД (по умолчанию — в памяти)")
+    parser.add_argument('--repeat', type=int, default=20, help="Повторов каждого замера")
+    return parser
+
+
+@contextmanager
+def benchmark_database(db_name=None):
+    """Создаёт чистую тестовую БД со всеми миграциями и удаляет её после замеров"""
+    from django.conf import settings
+    from django.db import connection
+
+    if db_name:
+        settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = db_name
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def measure(func, repeat=20, warmup=2):
+    """Время выполнения func в миллисекундах для каждого из repeat прогонов"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+        'mean': statistics.fmean(samples),
+    }
+
+
+def print_table(headers, rows):
+    rows = [[str(cell) for cell in row] for row in rows]
+    widths = [max(len(str(h)), *(len(row[i]) for row in rows)) if rows else len(str(h))
+              for i, h in enumerate(headers)]
+    line = '  '.join(str(h).ljust(w) for h, w in zip(headers, widths))
+    print(line)
+    print('-' * len(line))
+    for row in rows:
+        print('  '.join(cell.ljust(w) for cell, w in zip(row, widths)))
+    print()
+
+
+def ms(value):
+    return f"{value:.2f} ms"
+
+
+ADJECTIVES = ['Красные', 'Белые', 'Розовые', 'Кремовые', 'Пионовидные', 'Кустовые', 'Эквадорские']
+NOUNS = ['розы', 'хризантемы', 'букет', 'композиция', 'корзина', 'нежность', 'рассвет', 'праздник']
+SYLLABLES = ['ба', 'ка', 'ри', 'ди', 'ло', 'ми', 'на', 'эл', 'са', 'то', 'ве', 'ру', 'фа', 'ни', 'ко']
+
+
+def cultivars(rng, count=3000):
+    """Названия сортов: несколько реальных и много синтетических, как в живом каталоге"""
+    names = {'Бакарди', 'Альянс', 'Фридом', 'Эксплорер', 'Аваланш', 'Мондиаль', 'Сантини', 'Джумелия'}
+    while len(names) < count:
+        names.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(3, 4))).capitalize())
+    return sorted(names)
+
+
+COLOR_NAMES = ['Красный', 'Белый', 'Розовый', 'Жёлтый', 'Кремовый', 'Фиолетовый']
+
+
+def seed_products(count, batch_size=5000, seed=42):
+    """
+    Синтетический каталог: случайные названия, классификаторы, флаги, цены,
+    остатки и 1–3 цвета на товар. Сигналы не вызываются (bulk_create),
+    поисковый индекс и сводки при необходимости строятся отдельно.
+    """
+    from catalog.models import Product, ProductColor
+
+    rng = random.Random(seed)
+    sorts = cultivars(rng)
+    colors = [
+        ProductColor.objects.get_or_create(name=name, defaults={'css_name': name})[0]
+        for name in COLOR_NAMES
+    ]
+    groups = [value for value, _ in Product.GROUP_CHOICES]
+    subgroups = [value for value, _ in Product.SUBGROUP_CHOICES]
+    flower_types = [value for value, _ in Product.FLOWER_TYPE_CHOICES]
+    through = Product.colors.through
+
+    created = 0
+    while created < count:
+        size = min(batch_size, count - created)
+        products = Product.objects.bulk_create([
+            Product(
+                name=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.choice(sorts)} {created + i}',
+                group=rng.choice(groups),
+                subgroup=rng.choice(subgroups),
+                flower_type=rng.choice(flower_types),
+                price=rng.randrange(100, 20000),
+                is_new=rng.random() < 0.1,
+                is_bestseller=rng.random() < 0.05,
+                quantity=rng.choice([0, 0, 1, 5, 10, 50]),
+            )
+            for i in range(size)
+        ])
+        through.objects.bulk_create([
+            through(product_id=product.pk, productcolor_id=color.pk)
+            for product in products
+            for color in rng.sample(colors, rng.randint(1, 3))
+        ])
+        created += size
+    return created
@@ -0,0 +1,156 @@
+"""
+Конкурентная запись в SQLite: потоки одновременно оформляют заказы
+(корзина + POST /orders/checkout/), меняют статусы заказов и читают историю
+заказов. Сравниваются профили соединения: SQLite по умолчанию (журнал
+DELETE, synchronous=FULL) и settings.SQLITE_PRAGMAS (WAL, synchronous=NORMAL,
+mmap). Блокировки видны только на файле, поэтому БД всегда файловая.
+
+    python -m benchmarks.db_contention --workers 4 16 --ops 100
+"""
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import base_parser, benchmark_database, percentile, print_table, setup_django
+
+DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'mmap_size': 0}
+# Доли операций в потоке: оформление, смена статуса, чтение истории
+MIX = {'checkout': 1, 'status': 1, 'read': 2}
+STATUSES = ['ordered', 'in_assemble', 'assembled', 'in_delivery', 'delivered']
+
+
+def use_pragmas(pragmas):
+    """PRAGMA для соединений, открытых после вызова (во всех потоках)"""
+    from django.db import connection
+
+    connection.close()
+    connection.settings_dict['OPTIONS']['init_command'] = ';'.join(
+        f'PRAGMA {name}={value}' for name, value in pragmas.items()
+    )
+
+
+def seed(workers, products=100, orders=500):
+    from catalog.models import Product
+    from orders.models import Cart, Order
+    from users.models import CustomUser
+
+    product_ids = [product.pk for product in Product.objects.bulk_create([
+        Product(name=f"Товар {i}", price=100 + i, quantity=10 ** 9, image='products/bench.jpg')
+        for i in range(products)
+    ])]
+    users = [
+        CustomUser.objects.create_user(username=f'writer{i}', password='bench', address='Бенчмарк, 1')
+        for i in range(workers)
+    ]
+    Cart.objects.bulk_create([Cart(user=user) for user in users])
+    Order.objects.bulk_create([
+        Order(user=users[i % workers], total_price=100, address='Бенчмарк, 1') for i in range(orders)
+    ])
+    order_ids = list(Order.objects.values_list('pk', flat=True))
+    return users, product_ids, order_ids
+
+
+def run_worker(user, product_ids, order_ids, ops, delivery_date, barrier, rng):
+    """Поток-клиент: ops операций из MIX. Возвращает [(операция, мс, успех)]"""
+    from django.db import OperationalError, connection, transaction
+    from django.test import Client
+    from django.urls import reverse
+
+    from orders.models import CartItem, Order
+
+    client = Client()
+    client.force_login(user)
+    checkout_url = reverse('orders:checkout')
+    success_url = reverse('orders:my_orders')
+    kinds = rng.choices(list(MIX), weights=list(MIX.values()), k=ops)
+    results = []
+    barrier.wait()
+    try:
+        for kind in kinds:
+            started = time.perf_counter()
+            try:
+                if kind == 'checkout':
+                    CartItem.objects.bulk_create([
+                        CartItem(cart=user.cart, product_id=product_id, quantity=1)
+                        for product_id in rng.sample(product_ids, 3)
+                    ])
+                    response = client.post(checkout_url, {
+                        'delivery_date': delivery_date,
+                        'use_profile_address': True,
+                    })
+                    # Ошибку базы представление показывает сообщением и уводит в корзину
+                    ok = response.status_code == 302 and response.url == success_url
+                elif kind == 'status':
+                    # Как в админке: чтение заказа и полное сохранение
+                    with transaction.atomic():
+                        order = Order.objects.get(pk=rng.choice(order_ids))
+                        order.status = rng.choice(STATUSES)
+                        order.save()
+                    ok = True
+                else:
+                    list(Order.objects.filter(user=user).order_by('-order_date')[:20])
+                    ok = True
+            except OperationalError:
+                ok = False
+            results.append((kind, (time.perf_counter() - started) * 1000, ok))
+    finally:
+        connection.close()
+    return results
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--workers', type=int, nargs='+', default=[4, 16], help="Параллельных потоков")
+    parser.add_argument('--ops', type=int, default=100, help="Операций на поток")
+    args = parser.parse_args()
+    db_name = args.db or os.path.join(tempfile.gettempdir(), 'flower_shop_contention.sqlite3')
+
+    setup_django()
+    from django.conf import settings
+    from django.test.utils import setup_test_environment
+    from django.utils import timezone
+
+    setup_test_environment()
+    delivery_date = (timezone.localtime() + timezone.timedelta(hours=3)).strftime('%Y-%m-%dT%H:%M')
+    profiles = [('по умолчанию', DEFAULT_PRAGMAS), ('WAL', settings.SQLITE_PRAGMAS)]
+
+    rows = []
+    for workers in args.workers:
+        for label, pragmas in profiles:
+            use_pragmas(pragmas)
+            with benchmark_database(db_name) as connection:
+                with connection.cursor() as cursor:
+                    journal_mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+                users, product_ids, order_ids = seed(workers)
+                barrier = threading.Barrier(workers)
+                rngs = [random.Random(i) for i in range(workers)]
+
+                started = time.perf_counter()
+                with ThreadPoolExecutor(workers) as pool:
+                    futures = [
+                        pool.submit(run_worker, user, product_ids, order_ids, args.ops, delivery_date, barrier, rng)
+                        for user, rng in zip(users, rngs)
+                    ]
+                    results = [result for future in futures for result in future.result()]
+                elapsed = time.perf_counter() - started
+
+            for kind in MIX:
+                samples = [latency for op, latency, _ in results if op == kind]
+                failed = sum(1 for op, _, ok in results if op == kind and not ok)
+                rows.append([
+                    workers, label, journal_mode, kind, len(samples), failed,
+                    f"{len(results) / elapsed:.0f}",
+                    f"{percentile(samples, 50):.1f}", f"{percentile(samples, 95):.1f}",
+                    f"{percentile(samples, 99):.1f}",
+                ])
+
+    print(f"БД: {db_name}, операций на поток: {args.ops}")
+    print_table(['потоков', 'профиль', 'журнал', 'операция', 'всего', 'ошибок', 'всех опер./с',
+                 'p50, ms', 'p95, ms', 'p99, ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
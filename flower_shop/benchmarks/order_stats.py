@@ -0,0 +1,90 @@
+"""
+Статистика заказов для /stats: семь запросов get_period_stats (как раньше)
+против одного запроса с условными агрегатами Order.get_stats.
+
+    python -m benchmarks.order_stats --sizes 100000 1000000
+"""
+import random
+
+from benchmarks.common import base_parser, benchmark_database, measure, ms, print_table, setup_django, summarize
+
+
+def seed_orders(count, batch_size=20000, seed=42):
+    """Заказы за последние два года со случайными статусами, суммами и сроками доставки"""
+    from django.utils import timezone
+
+    from orders.models import Order
+    from users.models import CustomUser
+
+    rng = random.Random(seed)
+    users = [
+        CustomUser.objects.create_user(username=f'stats{i}', password='bench')
+        for i in range(20)
+    ]
+    statuses = [value for value, _ in Order.STATUS_CHOICES]
+    now = timezone.now()
+
+    # order_date — auto_now_add: иначе bulk_create проставит всем текущее время
+    field = Order._meta.get_field('order_date')
+    field.auto_now_add = False
+    try:
+        created = 0
+        while created < count:
+            size = min(batch_size, count - created)
+            orders = []
+            for _ in range(size):
+                order_date = now - timezone.timedelta(seconds=rng.randrange(2 * 365 * 24 * 3600))
+                delivery_date = order_date + timezone.timedelta(hours=rng.randrange(2, 72))
+                status = rng.choice(statuses)
+                orders.append(Order(
+                    user=rng.choice(users),
+                    status=status,
+                    order_date=order_date,
+                    delivery_date=delivery_date,
+                    delivered_date=(
+                        delivery_date + timezone.timedelta(hours=rng.randrange(-3, 3))
+                        if status == 'delivered' else None
+                    ),
+                    total_price=rng.randrange(500, 20000),
+                    address='Бенчмарк, 1',
+                ))
+            Order.objects.bulk_create(orders)
+            created += size
+    finally:
+        field.auto_now_add = True
+    return created
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from orders.models import Order
+
+    def per_period():
+        return {
+            name: Order.objects.get_period_stats(start, end)
+            for name, (start, end) in Order.stats_periods().items()
+        }
+
+    rows = []
+    for size in args.sizes:
+        with benchmark_database(args.db):
+            seed_orders(size)
+            assert per_period() == Order.get_stats(), "Результаты расходятся"
+            for name, func in [("7 запросов", per_period), ("1 запрос", Order.get_stats)]:
+                with CaptureQueriesContext(connection) as captured:
+                    func()
+                stats = summarize(measure(func, args.repeat, warmup=1))
+                rows.append([size, name, len(captured), ms(stats['p50']), ms(stats['p95'])])
+
+    print_table(["заказов", "вариант", "запросов", "p50", "p95"], rows)
+
+
+if __name__ == '__main__':
+    main()
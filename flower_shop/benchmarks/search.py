@@ -0,0 +1,70 @@
+"""
+Поиск по каталогу: прежний путь (icontains / iregex по catalog_product)
+против инвертированного индекса catalog.search.
+
+    python -m benchmarks.search --sizes 10000 100000 1000000
+"""
+import re
+import time
+
+from benchmarks.common import (
+    base_parser, benchmark_database, measure, ms, print_table, seed_products, setup_django, summarize,
+)
+
+QUERIES = [
+    ('слово', 'бакарди'),
+    ('префикс', 'пионовид'),
+    ('частые слова', 'кустовые розы'),
+    ('слово + сорт', 'розы бакарди'),
+    ('wildcard', 'Красные*'),
+    ('опечатка', 'бокарди'),
+]
+
+
+def legacy_search(queryset, search_query):
+    """Копия прежней логики catalog_view до появления индекса"""
+    if '*' in search_query:
+        regex_pattern = search_query.replace('*', '.*')
+        regex_pattern = re.escape(regex_pattern).replace(r'\.\*', '.*')
+        return queryset.filter(name__iregex=f'^{regex_pattern}$')
+    return queryset.filter(name__icontains=search_query)
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    setup_django()
+    from catalog.models import Product
+    from catalog.search import rebuild_index, search
+
+    for size in args.sizes:
+        with benchmark_database(args.db):
+            seed_products(size)
+            started = time.perf_counter()
+            rebuild_index()
+            print(f"Товаров: {size}, построение индекса: {time.perf_counter() - started:.1f} s")
+
+            rows = []
+            for label, query in QUERIES:
+                legacy_hits = len(list(legacy_search(Product.objects.all(), query).values_list('id', flat=True)))
+                legacy = summarize(measure(
+                    lambda: list(legacy_search(Product.objects.all(), query).values_list('id', flat=True)),
+                    repeat=args.repeat
+                ))
+                indexed = summarize(measure(lambda: search(query), repeat=args.repeat))
+                rows.append([
+                    label, query,
+                    legacy_hits, ms(legacy['p50']), ms(legacy['p95']),
+                    len(search(query)), ms(indexed['p50']), ms(indexed['p95']),
+                ])
+            print_table(
+                ['тип', 'запрос', 'найдено (старый)', 'p50 старый', 'p95 старый',
+                 'найдено (индекс)', 'p50 индекс', 'p95 индекс'],
+                rows
+            )
+
+
+if __name__ == '__main__':
+    main()
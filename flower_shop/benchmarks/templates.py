@@ -0,0 +1,88 @@
+"""
+Время отрисовки шаблонов страниц (catalog.render_timing) с пустым и
+заполненным кэшом фрагментов: шапка, подвал, карточки каталога. Время
+включающее — страница содержит время base.html, base.html — время шапки.
+
+    python -m benchmarks.templates --size 1000 --repeat 30
+"""
+import time
+from collections import defaultdict
+
+from benchmarks.common import base_parser, benchmark_database, percentile, print_table, seed_products, setup_django
+
+# Сколько самых долгих шаблонов страницы показывать
+TOP = 6
+
+
+def measure_page(client, url, repeat, cold):
+    """{шаблон: [мс за запрос]} и время запросов целиком"""
+    from django.core.cache import caches
+
+    from catalog.render_timing import collect
+
+    per_template = defaultdict(list)
+    requests = []
+    client.get(url)
+    for _ in range(repeat):
+        if cold:
+            caches['template_fragments'].clear()
+        with collect() as timings:
+            started = time.perf_counter()
+            response = client.get(url)
+            requests.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, f"{url}: {response.status_code}"
+        totals = defaultdict(float)
+        for name, duration in timings:
+            totals[name] += duration
+        for name, duration in totals.items():
+            per_template[name].append(duration)
+    return per_template, requests
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--size', type=int, default=1000, help="Товаров в каталоге")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from django.urls import reverse
+
+    from catalog.models import Product
+    from users.models import CustomUser
+
+    setup_test_environment()
+
+    with benchmark_database(args.db):
+        seed_products(args.size)
+        product_id = Product.objects.order_by('pk').values_list('pk', flat=True).first()
+        user = CustomUser.objects.create_user(username='bench', password='bench')
+        anonymous = Client()
+        authenticated = Client()
+        authenticated.force_login(user)
+
+        pages = [
+            ('главная', reverse('home')),
+            ('каталог', reverse('catalog:catalog')),
+            ('товар', reverse('catalog:product_detail', args=[product_id])),
+        ]
+        rows = []
+        for label, url in pages:
+            for who, client in (('гость', anonymous), ('покупатель', authenticated)):
+                for mode, cold in (('пустой', True), ('заполнен', False)):
+                    per_template, requests = measure_page(client, url, args.repeat, cold)
+                    rows.append([label, who, mode, 'запрос целиком',
+                                 f"{percentile(requests, 50):.2f}", f"{percentile(requests, 95):.2f}"])
+                    slowest = sorted(per_template, key=lambda name: -percentile(per_template[name], 50))
+                    for name in slowest[:TOP]:
+                        samples = per_template[name]
+                        rows.append(['', '', '', name,
+                                     f"{percentile(samples, 50):.2f}", f"{percentile(samples, 95):.2f}"])
+
+    print(f"Товаров: {args.size}, запросов на замер: {args.repeat}")
+    print_table(['страница', 'пользователь', 'кэш фрагментов', 'шаблон', 'p50, ms', 'p95, ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
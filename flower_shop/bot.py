@@ -14,8 +14,10 @@ django.setup()  # Теперь Django инициализирован
 ############################ 08 06 2025
 
 import platform
-from PIL import Image, ImageDraw, ImageFont
-import tempfile
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from captions import captioned_image
 
 django.setup()
 
@@ -25,16 +27,20 @@ from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
 from asgiref.sync import sync_to_async
 from orders.models import Order
+from orders.snapshots import load_order_snapshot
 from django.contrib.auth import get_user_model
 
 import asyncio
 
 import logging
 from aiogram import Bot
+from aiogram.bot.api import TelegramAPIServer
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 from django.utils import timezone
 from decimal import Decimal
+from datetime import datetime, timedelta, timezone as dt_timezone
+from catalog.pagination import keyset_filter
 
 if platform.system() == 'Windows':
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
@@ -83,7 +89,7 @@ async def help_command(message: types.Message):
     help_text = """
 Доступные команды:
 /start - Запуск бота
-/orders - Список заказов
+/orders [статус] [дней] - Список заказов
 /status - Изменить статус заказа
 /stats - Статистика
 /help - Помощь
@@ -127,63 +133,146 @@ async def process_order_id(message: types.Message, state: FSMContext):
     finally:
         await state.finish()
 
+# Начало отсчёта для курсора страниц /orders: время заказа в микросекундах
+ORDERS_CURSOR_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+ORDERS_INACTIVE_STATUSES = ['delivered', 'canceled']
+
+def parse_orders_args(text):
+    """
+    Фильтры команды /orders [статус] [дней]: статус — код из Order.STATUS_CHOICES,
+    дней — только заказы за последние N дней. Возвращает (status, days) или
+    выбрасывает ValueError.
+    """
+    status, days = None, 0
+    statuses = dict(Order.STATUS_CHOICES)
+    for arg in text.split()[1:]:
+        if arg.isdigit():
+            days = int(arg)
+        elif arg in statuses:
+            status = arg
+        else:
+            raise ValueError(arg)
+    return status, days
+
+def encode_orders_cursor(status, days, order):
+    """
+    callback_data кнопки «Дальше»: фильтры и ключ (order_date, id) последнего
+    заказа страницы. Компактный формат — Telegram ограничивает callback_data 64 байтами.
+    """
+    timestamp = (order.order_date - ORDERS_CURSOR_EPOCH) // timedelta(microseconds=1)
+    return f"orders:{status or '-'}:{days}:{timestamp}:{order.id}"
+
+def decode_orders_cursor(data):
+    _, status, days, timestamp, order_id = data.split(':')
+    order_date = ORDERS_CURSOR_EPOCH + timedelta(microseconds=int(timestamp))
+    return (None if status == '-' else status), int(days), [order_date, int(order_id)]
+
+def format_orders_page(status=None, days=0, after=None):
+    """
+    Страница списка заказов для /orders: (текст, callback_data следующей страницы
+    или None). Keyset-пагинация по (order_date, id) от новых к старым; строки
+    заказов берутся из prefetch, без запросов на каждый заказ. Синхронная —
+    вызывается целиком в одном sync_to_async.
+    """
+    ordering = ('-order_date', '-id')
+    orders = Order.objects.select_related('user').prefetch_related('cartitem_set__product')
+    if status:
+        orders = orders.filter(status=status)
+    else:
+        orders = orders.exclude(status__in=ORDERS_INACTIVE_STATUSES)
+    if days:
+        orders = orders.filter(order_date__gte=timezone.now() - timedelta(days=days))
+    if after:
+        orders = orders.filter(keyset_filter(ordering, after))
+
+    page_size = settings.BOT_ORDERS_PAGE_SIZE
+    orders = list(orders.order_by(*ordering)[:page_size + 1])
+    next_cursor = encode_orders_cursor(status, days, orders[page_size - 1]) if len(orders) > page_size else None
+    orders = orders[:page_size]
+
+    if not orders:
+        if after:
+            return "📭 Больше заказов нет", None
+        return ("📭 Заказов нет" if status or days else "📭 Активных заказов нет"), None
+
+    title = dict(Order.STATUS_CHOICES)[status] if status else "Активные заказы"
+    response = [f"*📌 {title}:*\n"]
+
+    for order in orders:
+        delivery_date = order.delivery_date.strftime('%d.%m.%Y %H:%M') if order.delivery_date else "Не указана"
+        username = order.user.username if order.user else "Неизвестный пользователь"
+        phone = order.user.phone if order.user and order.user.phone else "Не указан"
+
+        # Состав заказа — из prefetch_related
+        order_items = [
+            f"• {item.product.name}\n"
+            f"  {item.quantity} × {item.product.price} ₽ = {item.product.price * item.quantity} ₽"
+            for item in order.cartitem_set.all()
+        ]
+
+        response.extend([
+            f"*🆔 Заказ* `#{order.id}`",
+            f"*📅 Дата заказа:* {order.order_date.strftime('%d.%m.%Y %H:%M')}",
+            f"*📦 План доставки:* {delivery_date}",
+            f"*🚚 Статус:* {order.get_status_display()}",
+            f"*💵 Сумма:* {order.total_price} ₽",
+            f"*👤 Клиент:* {username}",
+            f"*📱 Телефон:* {phone}",
+            f"📱 *Адрес доставки:* {order.address}",
+            f"\n*📦 Состав заказа:*\n" + "\n".join(order_items) if order_items else "*🛒 Корзина пуста*"
+        ])
+        response.append("\n▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬\n")
+
+    return "\n".join(response), next_cursor
+
+async def send_orders_page(message, text, next_cursor):
+    """Отправляет страницу; кнопка «Дальше» — под последней частью"""
+    parts = split_text(text)
+    for i, part in enumerate(parts, 1):
+        keyboard = None
+        if next_cursor and i == len(parts):
+            keyboard = types.InlineKeyboardMarkup().add(
+                types.InlineKeyboardButton("➡️ Дальше", callback_data=next_cursor)
+            )
+        await message.answer(part, parse_mode="Markdown", reply_markup=keyboard)
+
 @dp.message_handler(commands=['orders'])
 async def handle_all_active_orders(message: types.Message):
-    """Вывод активных заказов (исключая Доставлено и Отменено)"""
+    """
+    Вывод заказов по страницам BOT_ORDERS_PAGE_SIZE. Без аргументов — активные
+    (исключая Доставлено и Отменено); /orders <статус> <дней> — с фильтрами.
+    """
+    text = message.text if isinstance(message.text, str) else ''
     try:
-        orders = await sync_to_async(list)(
-            Order.objects.exclude(status__in=['delivered', 'canceled'])
-                .select_related('user')
-                .prefetch_related('cartitem_set__product')  # Добавляем оптимизацию
-                .order_by('-order_date')
-        )
+        status, days = parse_orders_args(text)
+    except ValueError as e:
+        statuses = ", ".join(dict(Order.STATUS_CHOICES))
+        await message.answer(f"❌ Неизвестный фильтр «{e}». Формат: /orders [статус] [дней]\nСтатусы: {statuses}")
+        return
 
-        if not orders:
-            await message.answer("📭 Активных заказов нет")
-            return
-
-        response = ["*📌 Активные заказы:*\n"]
-
-        for order in orders:
-            delivery_date = order.delivery_date.strftime('%d.%m.%Y %H:%M') if order.delivery_date else "Не указана"
-            status = order.get_status_display()
-            username = order.user.username if order.user else "Неизвестный пользователь"
-            phone = order.user.phone if order.user and order.user.phone else "Не указан"
-            address = order.user.address if order.user and order.user.address else "Не указан"
-
-            # Формируем состав заказа
-            items = await sync_to_async(list)(order.cartitem_set.all())
-            order_items = []
-            for item in items:
-                item_total = item.product.price * item.quantity
-                order_items.append(
-                    f"• {item.product.name}\n"
-                    f"  {item.quantity} × {item.product.price} ₽ = {item_total} ₽"
-                )
-
-            order_info = [
-                f"*🆔 Заказ* `#{order.id}`",
-                f"*📅 Дата заказа:* {order.order_date.strftime('%d.%m.%Y %H:%M')}",
-                f"*📦 План доставки:* {delivery_date}",
-                f"*🚚 Статус:* {status}",
-                f"*💵 Сумма:* {order.total_price} ₽",
-                f"*👤 Клиент:* {username}",
-                f"*📱 Телефон:* {phone}",
-                f"📱 *Адрес доставки:* {order.address}",
-                f"\n*📦 Состав заказа:*\n" + "\n".join(order_items) if order_items else "*🛒 Корзина пуста*"
-            ]
-
-            response.extend(order_info)
-            response.append("\n▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬\n")
-
-        full_text = "\n".join(response)
-        for part in split_text(full_text):
-            await message.answer(part, parse_mode="Markdown")
+    try:
+        page_text, next_cursor = await sync_to_async(format_orders_page)(status, days)
+        await send_orders_page(message, page_text, next_cursor)
 
     except Exception as e:
         logger.error(f"Ошибка: {str(e)}", exc_info=True)
         await message.answer("⚠️ Ошибка при загрузке данных")
 
+@dp.callback_query_handler(lambda callback: callback.data and callback.data.startswith('orders:'))
+async def handle_orders_next_page(callback: types.CallbackQuery):
+    """Следующая страница /orders по кнопке «Дальше»"""
+    try:
+        status, days, after = decode_orders_cursor(callback.data)
+        page_text, next_cursor = await sync_to_async(format_orders_page)(status, days, after)
+        # Кнопка с предыдущей страницы убирается, чтобы страницу не запросили дважды
+        await callback.message.edit_reply_markup()
+        await send_orders_page(callback.message, page_text, next_cursor)
+    except Exception as e:
+        logger.error(f"Ошибка: {str(e)}", exc_info=True)
+        await callback.message.answer("⚠️ Ошибка при загрузке данных")
+    finally:
+        await callback.answer()
+
 async def on_startup(dp):
     await bot.set_my_commands([
         types.BotCommand("start", "Запуск бота"),
@@ -202,120 +291,123 @@ if __name__ == "__main__":
     start_bot()
 
 
-# Добавляем новую функцию для получения URL изображения
-async def add_caption_to_image(image_path, caption):
-    """Добавляет подпись с белым фоном к изображению"""
-    try:
-        # Увеличиваем размер шрифта в 2 раза
-        font_size = 40  # Было 20
-        padding = 20  # Увеличиваем отступы
-        line_spacing = 10
+# Отрисовка подписей (Pillow) выполняется вне цикла событий бота: в пуле
+# процессов, а если он недоступен — в пуле потоков. Семафор ограничивает
+# число одновременных отрисовок, не занимая все воркеры одним заказом.
+_render_executor = None
+_render_semaphores = weakref.WeakKeyDictionary()
 
-        # Укажите правильный путь к шрифту на вашем сервере
+def get_render_executor():
+    global _render_executor
+    if _render_executor is None:
+        workers = settings.CAPTION_RENDER_WORKERS
+        if settings.CAPTION_RENDER_EXECUTOR == 'process':
+            try:
+                _render_executor = ProcessPoolExecutor(max_workers=workers)
+            except (OSError, ImportError, NotImplementedError) as e:
+                # Нет поддержки multiprocessing (например, без /dev/shm)
+                logger.warning(f"Пул процессов недоступен, отрисовка в потоках: {e}")
+        if _render_executor is None:
+            _render_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='caption')
+    return _render_executor
+
+def shutdown_render_executor():
+    global _render_executor
+    if _render_executor is not None:
+        _render_executor.shutdown(wait=False, cancel_futures=True)
+        _render_executor = None
+
+def _render_semaphore():
+    # Семафор привязан к циклу событий: у каждого цикла свой
+    loop = asyncio.get_running_loop()
+    if loop not in _render_semaphores:
+        _render_semaphores[loop] = asyncio.Semaphore(settings.CAPTION_RENDER_CONCURRENCY)
+    return _render_semaphores[loop]
+
+async def run_render(func, *args):
+    """
+    Выполняет func(*args) в пуле отрисовки с ограничением параллельности и
+    таймаутом CAPTION_RENDER_TIMEOUT. Упавший пул процессов заменяется пулом потоков.
+    """
+    global _render_executor
+    loop = asyncio.get_running_loop()
+    async with _render_semaphore():
         try:
-            font = ImageFont.truetype("arial.ttf", font_size)
-        except IOError:
-            # Fallback к стандартному шрифту если arial не найден
-            font = ImageFont.load_default()
-
-        with Image.open(image_path) as img:
-            img_width, img_height = img.size
-
-            # Создаем временное изображение для измерения текста
-            temp_draw = ImageDraw.Draw(img)
-
-            # Разбиваем текст на строки с учетом переноса
-            lines = []
-            for line in caption.split('\n'):
-                current_line = []
-                for word in line.split():
-                    current_line.append(word)
-                    test_line = ' '.join(current_line)
-                    text_width = temp_draw.textlength(test_line, font=font)
-                    if text_width > img_width - 2 * padding:
-                        lines.append(' '.join(current_line[:-1]))
-                        current_line = [word]
-                lines.append(' '.join(current_line))
-
-            # Рассчитываем высоту текстового блока
-            text_height = (font_size + line_spacing) * len(lines) + 2 * padding
-
-            # Создаем новое изображение
-            new_height = img_height + text_height
-            new_img = Image.new("RGB", (img_width, new_height), (255, 255, 255))
-            new_img.paste(img, (0, 0))
-
-            draw = ImageDraw.Draw(new_img)
-
-            # Рисуем текст с центральным выравниванием
-            y_position = img_height + padding
-            for line in lines:
-                text_width = draw.textlength(line, font=font)
-                x_position = (img_width - text_width) / 2  # Центрирование
-                draw.text(
-                    (x_position, y_position),
-                    line,
-                    fill=(0, 0, 0),
-                    font=font,
-                    stroke_width=1,
-                    stroke_fill=(255, 255, 255)
-                )
-                y_position += font_size + line_spacing
-
-            # Сохранение во временный файл
-            fd, temp_path = tempfile.mkstemp(suffix='.jpg')
-            new_img.save(temp_path, quality=95)
-            os.close(fd)
-
-            return temp_path
+            future = loop.run_in_executor(get_render_executor(), func, *args)
+            return await asyncio.wait_for(future, settings.CAPTION_RENDER_TIMEOUT)
+        except BrokenProcessPool:
+            logger.warning("Пул процессов отрисовки упал, переключаемся на потоки")
+            shutdown_render_executor()
+            _render_executor = ThreadPoolExecutor(
+                max_workers=settings.CAPTION_RENDER_WORKERS, thread_name_prefix='caption'
+            )
+            future = loop.run_in_executor(_render_executor, func, *args)
+            return await asyncio.wait_for(future, settings.CAPTION_RENDER_TIMEOUT)
 
+async def add_caption_to_image(image_path, caption):
+    """
+    Добавляет подпись с белым фоном к изображению. Результат берётся из
+    дискового кэша captions: та же подпись к тому же фото не перерисовывается.
+    Отрисовка идёт в пуле (run_render) и не блокирует другие обработчики бота;
+    при ошибке или таймауте отправляется исходное фото.
+    """
+    try:
+        return await run_render(
+            captioned_image,
+            image_path,
+            caption,
+            settings.CAPTION_CACHE_DIR,
+            settings.CAPTION_CACHE_MAX_BYTES
+        )
+    except asyncio.TimeoutError:
+        logger.error(f"Отрисовка подписи не уложилась в {settings.CAPTION_RENDER_TIMEOUT} с: {image_path}")
+        return image_path
     except Exception as e:
         logger.error(f"Ошибка обработки изображения: {str(e)}")
         return image_path
 
 async def get_order_media_items(order):
+    """Фото товаров заказа с подписями по снимку заказа (orders.snapshots.OrderSnapshot)"""
     try:
-        items = await sync_to_async(list)(order.cartitem_set.all())
-        media_items = []
-
-        for idx, item in enumerate(items, 1):
-            product = await sync_to_async(lambda: item.product)()
-            if not product.image:
-                continue
-
-            # Получение пути к изображению
-            relative_path = await sync_to_async(lambda: product.image.name)()
-            absolute_path = os.path.join(settings.MEDIA_ROOT, relative_path)
-            absolute_path = os.path.normpath(absolute_path)
+        lines = [(idx, line) for idx, line in enumerate(order.lines, 1) if line.image_name]
+        paths = [
+            os.path.normpath(os.path.join(settings.MEDIA_ROOT, line.image_name))
+            for _, line in lines
+        ]
+        # Проверка существования файлов — один переход в поток на весь заказ
+        exists = await sync_to_async(lambda: [os.path.exists(path) for path in paths])()
 
-            # Проверка существования файла
-            if not await sync_to_async(os.path.exists)(absolute_path):
+        total_items = len(order.lines)
+        media_items = []
+        for (idx, line), path, found in zip(lines, paths, exists):
+            if not found:
                 continue
-
-            # Формирование подписи
-            total_items = len(items)
             caption = (
                 f"Товар {idx}/{total_items}\n"
-                f"{product.name}\n"
-                f"Количество: {item.quantity} × {product.price}₽"
+                f"{line.product_name}\n"
+                f"Количество: {line.quantity} × {line.price}₽"
             )
+            media_items.append((path, caption))
 
-            # Добавление подписи к изображению
-            processed_path = await add_caption_to_image(absolute_path, caption)
-
-            media_items.append({
-                'path': processed_path,
-                'is_temp': processed_path != absolute_path
-            })
-
-        return media_items
+        # Подписи рисуются параллельно в пуле отрисовки, порядок фото сохраняется
+        paths = await asyncio.gather(*(
+            add_caption_to_image(path, caption) for path, caption in media_items
+        ))
+        return [{'path': path} for path in paths]
 
     except Exception as e:
         logger.error(f"Ошибка при обработке медиа: {str(e)}")
         return []
 
-# Глобальный экземпляр бота и сессии
-bot_instance = Bot(token=settings.TELEGRAM_BOT_TOKEN)
+# Глобальный экземпляр бота и сессии. TELEGRAM_API_SERVER — адрес локального
+# Bot API сервера (или поддельного в тестах) вместо api.telegram.org
+if settings.TELEGRAM_API_SERVER:
+    bot_instance = Bot(
+        token=settings.TELEGRAM_BOT_TOKEN,
+        server=TelegramAPIServer.from_base(settings.TELEGRAM_API_SERVER)
+    )
+else:
+    bot_instance = Bot(token=settings.TELEGRAM_BOT_TOKEN)
 
 # Синхронный враппер
 def sync_send_notification(order):
@@ -328,82 +420,108 @@ def sync_send_notification(order):
         loop.run_until_complete(bot_instance.close())
         loop.close()
 
+# Telegram принимает в альбом от 2 до 10 фото
+MEDIA_GROUP_LIMIT = 10
+
+async def prepare_order_notification(order):
+    """
+    Готовит уведомление о заказе один раз на все чаты: текст и фото с подписями.
+    order — снимок заказа (orders.snapshots.OrderSnapshot).
+    После первой успешной отправки в prepared['file_ids'] сохраняются file_id
+    загруженных фото — остальным чатам уходят они, без повторной загрузки.
+    """
+    return {
+        'parts': split_text(await format_order_message(order)),
+        'media': await get_order_media_items(order),
+        'file_ids': None,
+    }
+
+async def send_media(chat_id, photos):
+    """
+    Отправляет фото альбомами по MEDIA_GROUP_LIMIT (одиночное — обычным фото).
+    photos — открытые файлы или file_id. Возвращает file_id отправленных фото.
+    """
+    file_ids = []
+    for start in range(0, len(photos), MEDIA_GROUP_LIMIT):
+        chunk = photos[start:start + MEDIA_GROUP_LIMIT]
+        if len(chunk) == 1:
+            messages = [await bot_instance.send_photo(chat_id=chat_id, photo=chunk[0])]
+        else:
+            album = types.MediaGroup()
+            for photo in chunk:
+                album.attach_photo(types.InputFile(photo) if hasattr(photo, 'read') else photo)
+            messages = await bot_instance.send_media_group(chat_id=chat_id, media=album)
+        # Берётся самый крупный вариант фото
+        file_ids.extend(message.photo[-1].file_id for message in messages)
+    return file_ids
+
+async def send_prepared_notification(prepared, chat_id):
+    """
+    Отправляет подготовленное уведомление в один чат. Ошибки Telegram не глотаются:
+    по ним очередь уведомлений (orders.notifications) планирует повтор.
+    """
+    for part in prepared['parts']:
+        await bot_instance.send_message(
+            chat_id=chat_id,
+            text=part,
+            parse_mode="Markdown"
+        )
+
+    if prepared['file_ids']:
+        await send_media(chat_id, prepared['file_ids'])
+    elif prepared['media']:
+        photos = [open(item['path'], 'rb') for item in prepared['media']]
+        try:
+            prepared['file_ids'] = await send_media(chat_id, photos)
+        finally:
+            for photo in photos:
+                photo.close()
+
+    logger.info(f"Уведомление отправлено в чат {chat_id}")
+
+async def send_order_notification(order, chat_id):
+    """Отправляет уведомление о заказе в один чат"""
+    snapshot = await sync_to_async(load_order_snapshot)(order.pk)
+    prepared = await prepare_order_notification(snapshot)
+    await send_prepared_notification(prepared, chat_id)
+
 # Изменения в функции send_telegram_notification
 async def send_telegram_notification(order):
+    """Отправка во все чаты администраторов без повторов (ошибки только логируются)"""
     check_telegram_settings()
 
     try:
-        message = await format_order_message(order)
-
+        snapshot = await sync_to_async(load_order_snapshot)(order.pk)
+        prepared = await prepare_order_notification(snapshot)
         for chat_id in settings.TELEGRAM_ADMIN_CHAT_IDS:
-            media_items = await get_order_media_items(order)
             try:
-                # Отправка текста (УБРАН ПАРАМЕТР SESSION)
-                for part in split_text(message):
-                    await bot_instance.send_message(
-                        chat_id=chat_id,
-                        text=part,
-                        parse_mode="Markdown"
-                    )
-
-                # Отправка медиа (УБРАН ПАРАМЕТР SESSION)
-                if media_items:
-                    for item in media_items:
-                        try:
-                            with open(item['path'], 'rb') as photo:
-                                await bot_instance.send_photo(
-                                    chat_id=chat_id,
-                                    photo=photo,
-                                    parse_mode="Markdown"
-                                )
-                        finally:
-                            if item.get('is_temp', False):
-                                await sync_to_async(os.remove)(item['path'])
-
-                logger.info(f"Уведомление отправлено в чат {chat_id}")
-
+                await send_prepared_notification(prepared, chat_id)
             except Exception as e:
                 logger.error(f"Ошибка отправки: {str(e)}")
-                if media_items:
-                    for item in media_items:
-                        if item.get('is_temp', False) and await sync_to_async(os.path.exists)(item['path']):
-                            await sync_to_async(os.remove)(item['path'])
 
     except Exception as e:
         logger.error(f"Критическая ошибка: {str(e)}", exc_info=True)
 
 async def format_order_message(order):
-    # Создаем асинхронные версии функций для работы с временем
-    async_localtime = sync_to_async(timezone.localtime)
-    async_strftime = sync_to_async(lambda dt: dt.strftime('%d.%m.%Y %H:%M'))
-
-    # Получаем и форматируем даты с учетом часового пояса
-    order_date = await async_localtime(order.order_date)
-    delivery_date = await async_localtime(order.delivery_date)
-
-    items = await sync_to_async(list)(order.cartitem_set.all())
-
-    order_items = []
-    for item in items:
-        product = await sync_to_async(lambda: item.product)()
-        item_total = product.price * item.quantity
-        order_items.append(
-            f"• *{product.name}*\n"
-            f"  {item.quantity} × {product.price} ₽ = {item_total} ₽"
-        )
-
-    user = await sync_to_async(lambda: order.user)()
-    phone = await sync_to_async(lambda: user.phone if user.phone else "Не указан")()
-    address = await sync_to_async(lambda: user.address if user.address else "Не указан")()
+    """Текст уведомления по снимку заказа (orders.snapshots.OrderSnapshot), без запросов к БД"""
+    # Даты с учетом часового пояса
+    order_date = timezone.localtime(order.order_date)
+    delivery_date = timezone.localtime(order.delivery_date)
+
+    order_items = [
+        f"• *{line.product_name}*\n"
+        f"  {line.quantity} × {line.price} ₽ = {line.total} ₽"
+        for line in order.lines
+    ]
 
     return (
             "🛒 *Новый заказ!*\n\n"
             f"🆔 *#{order.id}*\n"
-            f"📅 *Дата заказа:* {await async_strftime(order_date)}\n"
-            f"📦 *План доставки:* {await async_strftime(delivery_date)}\n"
+            f"📅 *Дата заказа:* {order_date.strftime('%d.%m.%Y %H:%M')}\n"
+            f"📦 *План доставки:* {delivery_date.strftime('%d.%m.%Y %H:%M')}\n"
             f"💵 *Сумма:* {order.total_price} ₽\n"
-            f"👤 *Клиент:* {user.username}\n"
-            f"📱 *Телефон:* {phone}\n"
+            f"👤 *Клиент:* {order.username}\n"
+            f"📱 *Телефон:* {order.phone or 'Не указан'}\n"
             f"📦 *Адрес доставки:* {order.address}\n\n"
             "*Состав заказа:*\n" + "\n".join(order_items)
     )
@@ -499,6 +617,7 @@ import atexit
 
 @atexit.register
 def cleanup():
+    shutdown_render_executor()
     try:
         loop = asyncio.new_event_loop()
         loop.run_until_complete(bot_instance.close())
@@ -0,0 +1,158 @@
+"""
+Подписи под фотографиями товаров для уведомлений о заказах.
+
+Модуль не зависит от Django: только Pillow и файловая система. Готовые
+изображения складываются в дисковый кэш с адресацией по содержимому: имя
+файла — хэш от исходного изображения (путь, размер, mtime), текста подписи,
+шрифта и его размера. Повторная подпись того же товара с тем же количеством
+и ценой стоит одного stat() вместо перерисовки и перекодирования JPEG.
+Кэш ограничен по суммарному размеру, вытесняются давно не читанные файлы.
+"""
+import hashlib
+import os
+import tempfile
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+FONT_NAME = "arial.ttf"
+FONT_SIZE = 40
+PADDING = 20
+LINE_SPACING = 10
+JPEG_QUALITY = 95
+# Меняется вместе с раскладкой подписи: старые файлы кэша перестают совпадать
+RENDER_VERSION = 1
+
+
+@lru_cache(maxsize=16)
+def get_font(name=FONT_NAME, size=FONT_SIZE):
+    """Шрифт загружается один раз на процесс для каждой пары (имя, размер)"""
+    try:
+        return ImageFont.truetype(name, size)
+    except IOError:
+        # Fallback к стандартному шрифту если arial не найден
+        return ImageFont.load_default()
+
+
+def wrap_caption(caption, font, max_width):
+    """
+    Разбивает подпись на строки не шире max_width. Ширина каждого слова
+    измеряется один раз, строка набирается суммой ширин, а не повторным
+    измерением всё удлиняющейся строки.
+    """
+    space = font.getlength(' ')
+    lines = []
+    for paragraph in caption.split('\n'):
+        current, width = [], 0
+        for word in paragraph.split():
+            word_width = font.getlength(word)
+            new_width = width + space + word_width if current else word_width
+            if current and new_width > max_width:
+                lines.append(' '.join(current))
+                current, new_width = [], word_width
+            current.append(word)
+            width = new_width
+        lines.append(' '.join(current))
+    return lines
+
+
+def render_caption(image_path, caption, output_path, font_name=FONT_NAME, font_size=FONT_SIZE):
+    """Рисует подпись на белой полосе под изображением и сохраняет JPEG в output_path"""
+    font = get_font(font_name, font_size)
+    with Image.open(image_path) as img:
+        img_width, img_height = img.size
+        lines = wrap_caption(caption, font, img_width - 2 * PADDING)
+
+        # Высота текстового блока
+        text_height = (font_size + LINE_SPACING) * len(lines) + 2 * PADDING
+        new_img = Image.new("RGB", (img_width, img_height + text_height), (255, 255, 255))
+        new_img.paste(img, (0, 0))
+
+    draw = ImageDraw.Draw(new_img)
+    y_position = img_height + PADDING
+    for line in lines:
+        # Центральное выравнивание
+        x_position = (img_width - draw.textlength(line, font=font)) / 2
+        draw.text(
+            (x_position, y_position),
+            line,
+            fill=(0, 0, 0),
+            font=font,
+            stroke_width=1,
+            stroke_fill=(255, 255, 255)
+        )
+        y_position += font_size + LINE_SPACING
+
+    new_img.save(output_path, format='JPEG', quality=JPEG_QUALITY)
+
+
+def cache_key(image_path, caption, font_name=FONT_NAME, font_size=FONT_SIZE):
+    """
+    Ключ готового изображения. Исходник опознаётся по пути, размеру и mtime:
+    замена фото товара меняет ключ без чтения и хэширования всего файла.
+    """
+    stat = os.stat(image_path)
+    raw = '\0'.join(map(str, [
+        RENDER_VERSION, os.path.abspath(image_path), stat.st_size, stat.st_mtime_ns,
+        caption, font_name, font_size,
+    ]))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def evict(cache_dir, max_bytes, keep=None):
+    """
+    Удаляет давно не читанные файлы, пока кэш больше max_bytes. Время
+    последнего чтения — mtime: его обновляет captioned_image при попадании
+    (atime на многих системах не ведётся). Файл keep не удаляется.
+    """
+    entries = []
+    total = 0
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.endswith('.jpg'):
+                stat = entry.stat()
+                total += stat.st_size
+                if entry.path != keep:
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Уже удалил параллельный процесс
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def captioned_image(image_path, caption, cache_dir, max_bytes, font_name=FONT_NAME, font_size=FONT_SIZE):
+    """
+    Путь к изображению с подписью из кэша; при промахе изображение рисуется
+    и сохраняется. Файл пишется во временный и переименовывается, так что
+    параллельные процессы не увидят недописанный JPEG.
+    """
+    key = cache_key(image_path, caption, font_name, font_size)
+    path = os.path.join(cache_dir, f'{key}.jpg')
+    try:
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=cache_dir)
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            render_caption(image_path, caption, output, font_name, font_size)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    # Вытеснение проверяется только при записи: попадания кэш не растят
+    evict(cache_dir, max_bytes, keep=path)
+    return path
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Product, Review, ProductColor, Favorite
+from .models import Product, Review, ProductColor, Favorite, ProductRating
 #from .models import Article
 
 @admin.register(Product)
@@ -34,6 +34,11 @@ class ReviewAdmin(admin.ModelAdmin):
     list_filter = ('rating', 'created_at')
     search_fields = ('user__username', 'product__name', 'text')
 
+@admin.register(ProductRating)
+class ProductRatingAdmin(admin.ModelAdmin):
+    list_display = ('product', 'average', 'rating_count', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5')
+    readonly_fields = ('product', 'rating_sum', 'rating_count', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5')
+
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('user', 'product', 'created_at')
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+CACHE_ALIAS = 'catalog'
+VERSION_KEY = 'catalog:version'
+HITS_KEY = 'catalog:hits'
+MISSES_KEY = 'catalog:misses'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def caches_user_state(alias):
+    """
+    Можно ли хранить в кэше alias состояние пользователя. LocMemCache у
+    каждого процесса свой: сброс в одном процессе не дошёл бы до других,
+    поэтому он годится только при settings.CACHE_USER_STATE_IN_LOCMEM.
+    """
+    return settings.CACHE_USER_STATE_IN_LOCMEM or not isinstance(caches[alias], LocMemCache)
+
+
+def normalize_params(params):
+    """
+    Канонический вид GET-параметров: ключи и значения отсортированы, пустые
+    значения отброшены. ?group=Букеты&ordering= и ?ordering=&group=Букеты дают один ключ.
+    """
+    items = []
+    for key in sorted(params):
+        values = sorted(value.strip() for value in params.getlist(key) if value.strip())
+        if values:
+            items.append([key, values])
+    return items
+
+
+def get_version():
+    """
+    Версия данных каталога — часть каждого ключа. Начальное значение берётся
+    из времени, чтобы после вытеснения ключа версия не повторила старую.
+    """
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    cache = _cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_catalog():
+    """
+    Сбрасывает все закэшированные выборки сменой версии. Повторно — после
+    коммита: запрос, прочитавший старые данные до коммита, мог успеть
+    сохранить их под новой версией. Вызывается сигналами товаров; массовые
+    операции (bulk_create, QuerySet.update) сигналов не шлют и вызывают её сами.
+    """
+    bump_version()
+    transaction.on_commit(bump_version)
+
+
+def make_key(kind, params):
+    raw = json.dumps(normalize_params(params), ensure_ascii=False)
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'catalog:{kind}:{get_version()}:{digest}'
+
+
+def _count(key):
+    cache = _cache()
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def get_or_compute(kind, params, compute):
+    """Значение из кэша по виду выборки и параметрам запроса или compute() с сохранением"""
+    cache = _cache()
+    key = make_key(kind, params)
+    value = cache.get(key)
+    if value is not None:
+        _count(HITS_KEY)
+        return value
+
+    _count(MISSES_KEY)
+    value = compute()
+    cache.set(key, value)
+    return value
+
+
+def get_stats():
+    cache = _cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    _cache().delete_many([HITS_KEY, MISSES_KEY])
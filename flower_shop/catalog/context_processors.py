@@ -0,0 +1,8 @@
+from .favorites import request_favorite_ids
+
+
+def favorites_badge(request):
+    """Число избранных товаров для шапки — из кэша избранного, без запроса к БД"""
+    if not hasattr(request, 'user'):
+        return {'favorites_count': 0}
+    return {'favorites_count': len(request_favorite_ids(request))}
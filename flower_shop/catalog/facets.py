@@ -0,0 +1,59 @@
+from django.db.models import BooleanField, Count, ExpressionWrapper, Q
+
+from .models import Product
+
+CHOICE_FACETS = ('group', 'subgroup', 'flower_type')
+FLAG_FACETS = ('is_new', 'is_bestseller', 'in_stock')
+
+
+def compute_facets(queryset):
+    """
+    Счётчики товаров по значениям фильтров для уже отфильтрованного queryset.
+    Два запроса независимо от числа значений: группировка по классификаторам
+    и флагам (комбинаций не больше сотни) и группировка связей товар—цвет.
+    """
+    product_ids = queryset.order_by().values('pk')
+
+    facets = {name: {} for name in CHOICE_FACETS}
+    facets['flags'] = dict.fromkeys(FLAG_FACETS, 0)
+    facets['total'] = 0
+
+    # Группировка прямо по отфильтрованному queryset: без обёртки pk IN (...)
+    # классификаторы и флаги читаются из покрывающего индекса product_classifier_idx
+    rows = (
+        queryset.order_by()
+        .annotate(in_stock=ExpressionWrapper(Q(quantity__gt=0), output_field=BooleanField()))
+        .values(*CHOICE_FACETS, 'is_new', 'is_bestseller', 'in_stock')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    for row in rows:
+        count = row['count']
+        facets['total'] += count
+        for name in CHOICE_FACETS:
+            facets[name][row[name]] = facets[name].get(row[name], 0) + count
+        for flag in FLAG_FACETS:
+            if row[flag]:
+                facets['flags'][flag] += count
+
+    facets['colors'] = dict(
+        Product.colors.through.objects.filter(product_id__in=product_ids)
+        .values('productcolor_id')
+        .annotate(count=Count('product_id'))
+        .order_by()
+        .values_list('productcolor_id', 'count')
+    )
+    return facets
+
+
+def apply_facet_labels(form, facets):
+    """Дописывает счётчики к подписям выбора в форме ProductFilter"""
+    for name in CHOICE_FACETS:
+        field = form.fields[name]
+        field.choices = [
+            (value, f"{label} ({facets[name].get(value, 0)})" if value else label)
+            for value, label in field.choices
+        ]
+
+    colors = facets['colors']
+    form.fields['colors'].label_from_instance = lambda color: f"{color.name} ({colors.get(color.pk, 0)})"
@@ -0,0 +1,68 @@
+"""
+Избранное пользователя для карточек каталога.
+
+Множество id избранных товаров читается одним запросом и хранится в кэше
+'catalog' под ключом пользователя; в пределах запроса оно запоминается на
+request. Любое изменение Favorite (переключение, удаление со страницы
+избранного, админка, каскад при удалении товара) сбрасывает ключ через
+сигналы (signals.py). Кэш 'catalog' в памяти процесса используется, только
+если это разрешено явно (cache.caches_user_state): сброс дошёл бы лишь до
+одного из процессов сервера.
+"""
+from django.core.cache import caches
+from django.db import transaction
+
+from .cache import CACHE_ALIAS, caches_user_state
+from .models import Favorite, Product
+
+
+def favorites_key(user_id):
+    return f'catalog:favorites:{user_id}'
+
+
+def get_favorite_ids(user_id):
+    """frozenset id избранных товаров пользователя — из кэша или одним запросом"""
+    if not caches_user_state(CACHE_ALIAS):
+        return frozenset(Favorite.objects.filter(user_id=user_id).values_list('product_id', flat=True))
+    cache = caches[CACHE_ALIAS]
+    key = favorites_key(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(Favorite.objects.filter(user_id=user_id).values_list('product_id', flat=True))
+        cache.set(key, ids)
+    return ids
+
+
+def request_favorite_ids(request):
+    """Избранное текущего пользователя, загруженное не больше одного раза за запрос"""
+    if not request.user.is_authenticated:
+        return frozenset()
+    if not hasattr(request, '_favorite_ids'):
+        request._favorite_ids = get_favorite_ids(request.user.pk)
+    return request._favorite_ids
+
+
+def invalidate_favorites(user_id):
+    """
+    Сбрасывает закэшированное избранное. Повторно — после коммита, как и
+    invalidate_catalog: параллельный запрос мог закэшировать старый набор.
+    """
+    key = favorites_key(user_id)
+    cache = caches[CACHE_ALIAS]
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def toggle_favorite(user, product_id):
+    """
+    Добавляет товар в избранное или убирает его оттуда. Возвращает новое
+    состояние: True — товар в избранном. Для несуществующего товара —
+    Product.DoesNotExist.
+    """
+    deleted, _ = Favorite.objects.filter(user=user, product_id=product_id).delete()
+    if deleted:
+        return False
+    if not Product.objects.filter(pk=product_id).exists():
+        raise Product.DoesNotExist(product_id)
+    Favorite.objects.get_or_create(user=user, product_id=product_id)
+    return True
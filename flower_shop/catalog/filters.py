@@ -58,7 +58,11 @@ class ProductFilter(django_filters.FilterSet):
 
 
     def filter_colors(self, queryset, name, value):
-        return queryset.filter(colors__name__in=value).distinct() if value else queryset
+        # Подзапрос по таблице связей вместо JOIN + DISTINCT по всем колонкам товара
+        if not value:
+            return queryset
+        with_colors = Product.colors.through.objects.filter(productcolor__in=value).values('product_id')
+        return queryset.filter(pk__in=with_colors)
 
     def filter_new(self, queryset, name, value):
         return queryset.filter(is_new=True) if value else queryset
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from catalog.cache import get_stats, invalidate_catalog, reset_stats
+
+
+class Command(BaseCommand):
+    help = "Показывает долю попаданий в кэш выборок каталога"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Обнулить счётчики")
+        parser.add_argument('--clear', action='store_true', help="Сбросить закэшированные выборки")
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        self.stdout.write(
+            f"Попаданий: {stats['hits']}, промахов: {stats['misses']}, "
+            f"доля попаданий: {stats['hit_ratio']:.1%}"
+        )
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS("Счётчики обнулены"))
+        if options['clear']:
+            invalidate_catalog()
+            self.stdout.write(self.style.SUCCESS("Кэш каталога сброшен"))
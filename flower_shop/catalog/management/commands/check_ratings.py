@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.ratings import check_ratings, rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = "Проверяет согласованность сводок рейтингов с таблицей отзывов"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help="Пересобрать сводки при найденных расхождениях")
+
+    def handle(self, *args, **options):
+        mismatches = check_ratings()
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Сводки рейтингов согласованы"))
+            return
+
+        for product_id, expected, actual in mismatches:
+            target = f"товар #{product_id}" if product_id is not None else "общая сводка"
+            self.stdout.write(f"{target}: ожидалось {expected}, сохранено {actual}")
+
+        if options['fix']:
+            rebuild_ratings()
+            self.stdout.write(self.style.SUCCESS(f"Исправлено расхождений: {len(mismatches)}"))
+            return
+
+        raise CommandError(f"Найдено расхождений: {len(mismatches)}")
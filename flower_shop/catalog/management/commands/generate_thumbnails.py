@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from catalog.models import Product
+from catalog.thumbnails import IMAGE_ERRORS, generate_derivatives, prune_derivatives
+
+
+class Command(BaseCommand):
+    help = "Создаёт уменьшенные копии фото всех товаров (THUMBNAIL_SIZES × JPEG/WebP)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true',
+                            help="Удалить копии фото, которых больше нет ни у одного товара")
+
+    def handle(self, *args, **options):
+        created = failed = 0
+        for product in Product.objects.exclude(image='').exclude(image__isnull=True).iterator():
+            try:
+                generate_derivatives(product)
+                created += 1
+            except IMAGE_ERRORS as e:
+                failed += 1
+                self.stderr.write(f"Товар #{product.pk}: {e}")
+        self.stdout.write(self.style.SUCCESS(f"Обработано товаров: {created}, с ошибками: {failed}"))
+
+        if options['prune']:
+            image_hashes = Product.objects.exclude(image_hash='').values_list('image_hash', flat=True)
+            removed = prune_derivatives(set(image_hashes))
+            self.stdout.write(self.style.SUCCESS(f"Удалено лишних копий: {removed}"))
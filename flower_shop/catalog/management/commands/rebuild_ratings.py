@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from catalog.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = "Пересобирает сводки рейтингов товаров и магазина по таблице отзывов"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Размер пакета bulk_create (по умолчанию 1000)")
+
+    def handle(self, *args, **options):
+        total = rebuild_ratings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Сводки пересобраны: товаров с отзывами — {total}"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from catalog.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Пересобирает поисковый индекс товаров (слова и триграммы словаря)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help="Сколько товаров индексировать за один пакет (по умолчанию 2000)")
+
+    def handle(self, *args, **options):
+        total = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Проиндексировано товаров: {total}"))
@@ -0,0 +1,69 @@
+# Generated by Django 5.2 on 2026-10-18 15:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def populate_ratings(apps, schema_editor):
+    Review = apps.get_model('catalog', 'Review')
+    ProductRating = apps.get_model('catalog', 'ProductRating')
+    GlobalRating = apps.get_model('catalog', 'GlobalRating')
+
+    aggregates = {
+        'rating_sum': Sum('rating'),
+        'rating_count': Count('id'),
+        **{f'rating_{i}': Count('id', filter=Q(rating=i)) for i in range(1, 6)},
+    }
+    ProductRating.objects.bulk_create(
+        ProductRating(**row)
+        for row in Review.objects.order_by().values('product_id').annotate(**aggregates)
+    )
+    stats = Review.objects.aggregate(**aggregates)
+    stats['rating_sum'] = stats['rating_sum'] or 0
+    GlobalRating.objects.create(pk=1, **stats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GlobalRating',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rating_sum', models.PositiveIntegerField(default=0, verbose_name='Сумма оценок')),
+                ('rating_count', models.PositiveIntegerField(default=0, verbose_name='Количество отзывов')),
+                ('rating_1', models.PositiveIntegerField(default=0, verbose_name='Оценок 1')),
+                ('rating_2', models.PositiveIntegerField(default=0, verbose_name='Оценок 2')),
+                ('rating_3', models.PositiveIntegerField(default=0, verbose_name='Оценок 3')),
+                ('rating_4', models.PositiveIntegerField(default=0, verbose_name='Оценок 4')),
+                ('rating_5', models.PositiveIntegerField(default=0, verbose_name='Оценок 5')),
+            ],
+            options={
+                'verbose_name': 'Общий рейтинг',
+                'verbose_name_plural': 'Общий рейтинг',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductRating',
+            fields=[
+                ('rating_sum', models.PositiveIntegerField(default=0, verbose_name='Сумма оценок')),
+                ('rating_count', models.PositiveIntegerField(default=0, verbose_name='Количество отзывов')),
+                ('rating_1', models.PositiveIntegerField(default=0, verbose_name='Оценок 1')),
+                ('rating_2', models.PositiveIntegerField(default=0, verbose_name='Оценок 2')),
+                ('rating_3', models.PositiveIntegerField(default=0, verbose_name='Оценок 3')),
+                ('rating_4', models.PositiveIntegerField(default=0, verbose_name='Оценок 4')),
+                ('rating_5', models.PositiveIntegerField(default=0, verbose_name='Оценок 5')),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to='catalog.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг товара',
+                'verbose_name_plural': 'Рейтинги товаров',
+            },
+        ),
+        migrations.RunPython(populate_ratings, migrations.RunPython.noop),
+    ]
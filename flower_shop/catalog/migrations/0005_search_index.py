@@ -0,0 +1,83 @@
+# Generated by Django 5.2 on 2026-10-18 15:37
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Копия токенизатора и весов catalog.search на момент миграции: миграция
+# не должна меняться вместе с живым кодом. После изменения токенизатора
+# индекс пересобирается командой rebuild_search_index
+NAME_WEIGHT = 3
+LABEL_WEIGHT = 1
+MAX_TOKEN_LENGTH = 100
+WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return [word[:MAX_TOKEN_LENGTH] for word in WORD_RE.findall(text.lower().replace('ё', 'е'))]
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def build_search_index(apps, schema_editor):
+    Product = apps.get_model('catalog', 'Product')
+    SearchToken = apps.get_model('catalog', 'SearchToken')
+    SearchTrigram = apps.get_model('catalog', 'SearchTrigram')
+
+    postings = []
+    vocabulary = set()
+    for product in Product.objects.iterator(chunk_size=2000):
+        tokens = dict.fromkeys(
+            tokenize(' '.join([product.get_group_display(), product.get_subgroup_display(),
+                               product.get_flower_type_display()])),
+            LABEL_WEIGHT
+        )
+        tokens.update(dict.fromkeys(tokenize(product.name), NAME_WEIGHT))
+        postings.extend(SearchToken(product_id=product.pk, token=token, weight=weight)
+                        for token, weight in tokens.items())
+        vocabulary.update(tokens)
+
+    SearchToken.objects.bulk_create(postings, batch_size=1000)
+    SearchTrigram.objects.bulk_create(
+        [SearchTrigram(token=token, trigram=trigram) for token in vocabulary for trigram in trigrams(token)],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_review_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=100)),
+                ('trigram', models.CharField(max_length=3)),
+            ],
+            options={
+                'unique_together': {('trigram', 'token')},
+                'indexes': [models.Index(fields=['token'], name='search_trigram_token_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=100)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='catalog.product')),
+            ],
+            options={
+                'unique_together': {('token', 'product')},
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
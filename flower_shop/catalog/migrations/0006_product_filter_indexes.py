@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 20:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['group', 'subgroup', 'flower_type', 'is_new', 'is_bestseller', 'quantity'], name='product_classifier_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['flower_type', 'price'], name='product_type_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'id'], name='product_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='product_price_idx'),
+        ),
+        # Статистика для планировщика: без неё SQLite считает любое равенство
+        # по группе избирательным и сортирует выборку вместо обхода индекса сортировки
+        migrations.RunSQL('ANALYZE', reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -54,17 +54,33 @@ class Product(models.Model):
         null=True,  # Разрешить NULL в базе данных
         blank=True  # Разрешить пустое значение в формах
     )
+    # sha256 содержимого фото: из него строятся имена уменьшенных копий (catalog.thumbnails)
+    image_hash = models.CharField(max_length=64, blank=True, editable=False, verbose_name="Хэш изображения")
     colors = models.ManyToManyField(ProductColor, verbose_name="Основные цвета")
     is_new = models.BooleanField(default=False, verbose_name="Новинка")
     is_bestseller = models.BooleanField(default=False, verbose_name="Хит продаж")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Версия карточки для кэша фрагментов: меняется при каждом save() и при смене цветов
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Изменён")
 
     quantity = models.PositiveIntegerField(
         verbose_name="Количество на складе",
         default=1)
 
-    #class Meta:
+    class Meta:
         #app_label = 'catalog'  # Добавил для теста явное указание приложения
+        indexes = [
+            # Фильтры группа → подгруппа → тип (по префиксу) и фасетные счётчики:
+            # группировка по классификаторам и флагам читается из индекса целиком
+            models.Index(
+                fields=['group', 'subgroup', 'flower_type', 'is_new', 'is_bestseller', 'quantity'],
+                name='product_classifier_idx',
+            ),
+            models.Index(fields=['flower_type', 'price'], name='product_type_price_idx'),
+            # Сортировки каталога и keyset-пагинация (catalog.pagination.CATALOG_ORDERINGS)
+            models.Index(fields=['created_at', 'id'], name='product_created_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -110,8 +126,96 @@ class Review(models.Model):
         verbose_name="Дата создания"
     )
 
-    #class Meta:
+    class Meta:
         #app_label = 'catalog'  # Добавил для теста явное указание приложения
+        indexes = [
+            # keyset-пагинация ленты отзывов /reviews/
+            models.Index(fields=['-created_at', '-id'], name='review_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Отзыв от {self.user.username}"
+
+class RatingSummary(models.Model):
+    """Денормализованная сводка оценок: сумма, количество и гистограмма 1..5"""
+    rating_sum = models.PositiveIntegerField(default=0, verbose_name="Сумма оценок")
+    rating_count = models.PositiveIntegerField(default=0, verbose_name="Количество отзывов")
+    rating_1 = models.PositiveIntegerField(default=0, verbose_name="Оценок 1")
+    rating_2 = models.PositiveIntegerField(default=0, verbose_name="Оценок 2")
+    rating_3 = models.PositiveIntegerField(default=0, verbose_name="Оценок 3")
+    rating_4 = models.PositiveIntegerField(default=0, verbose_name="Оценок 4")
+    rating_5 = models.PositiveIntegerField(default=0, verbose_name="Оценок 5")
+
+    class Meta:
+        abstract = True
+
+    @property
+    def average(self):
+        if not self.rating_count:
+            return 0
+        return round(self.rating_sum / self.rating_count, 1)
+
+    @property
+    def histogram(self):
+        return {i: getattr(self, f'rating_{i}') for i in range(1, 6)}
+
+
+class ProductRating(RatingSummary):
+    product = models.OneToOneField(
+        'Product',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='rating_summary',
+        verbose_name="Товар"
+    )
+
+    class Meta:
+        verbose_name = "Рейтинг товара"
+        verbose_name_plural = "Рейтинги товаров"
+
+    def __str__(self):
+        return f"Рейтинг {self.product_id}: {self.average}"
+
+
+class GlobalRating(RatingSummary):
+    # Единственная строка с pk=1 — сводка по всем отзывам магазина
+
+    class Meta:
+        verbose_name = "Общий рейтинг"
+        verbose_name_plural = "Общий рейтинг"
+
+    def __str__(self):
+        return f"Общий рейтинг: {self.average}"
+
+
+class SearchToken(models.Model):
+    """Постинг инвертированного индекса поиска: слово → товар с весом поля"""
+    product = models.ForeignKey(
+        'Product',
+        on_delete=models.CASCADE,
+        related_name='search_tokens'
+    )
+    token = models.CharField(max_length=100)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('token', 'product')
+
+    def __str__(self):
+        return f"{self.token} → {self.product_id}"
+
+
+class SearchTrigram(models.Model):
+    """Триграммы словаря поиска — для нечёткого и wildcard-поиска по словам"""
+    token = models.CharField(max_length=100)
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        unique_together = ('trigram', 'token')
+        indexes = [
+            # словарь: префиксный диапазон по слову
+            models.Index(fields=['token'], name='search_trigram_token_idx'),
+        ]
 
     def __str__(self):
-        return f"Отзыв от {self.user.username}"
\ No newline at end of file
+        return f"{self.trigram} → {self.token}"
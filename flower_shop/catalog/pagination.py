@@ -0,0 +1,157 @@
+import base64
+import binascii
+import json
+import math
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    """Кодирует значения ключа последней строки страницы в непрозрачный курсор"""
+    raw = json.dumps([str(value) for value in values], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Раскодирует курсор; при подмене или порче курсора выбрасывает ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError("Некорректный курсор") from e
+
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(v, str) for v in values):
+        raise ValueError("Некорректный курсор")
+    return values
+
+
+def parse_cursor(model, ordering, cursor):
+    """
+    Значения курсора, приведённые к типам полей ключа (to_python): курсор
+    с подменёнными значениями даёт ValueError, а не ошибку в запросе
+    """
+    values = decode_cursor(cursor, len(ordering))
+    try:
+        return [
+            model._meta.get_field(field.lstrip('-')).to_python(value)
+            for field, value in zip(ordering, values)
+        ]
+    except (ValidationError, TypeError, ValueError) as e:
+        raise ValueError("Некорректный курсор") from e
+
+
+def keyset_filter(ordering, values):
+    """
+    Условие «строго после курсора» для составного ключа сортировки.
+    Для ('-created_at', '-id') это
+    created_at < v0 OR (created_at = v0 AND id < v1).
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def keyset_page(queryset, ordering, cursor=None, limit=20):
+    """
+    Одна страница keyset-пагинации: (строки, курсор следующей страницы или None).
+    queryset может быть результатом values(): ключевые поля берутся по имени.
+    """
+    rows = list(_keyset_query(queryset, ordering, cursor)[:limit + 1])
+    return _keyset_result(rows, ordering, limit)
+
+
+async def akeyset_page(queryset, ordering, cursor=None, limit=20):
+    """keyset_page для async-представлений: строки читаются через async ORM"""
+    rows = [row async for row in _keyset_query(queryset, ordering, cursor)[:limit + 1]]
+    return _keyset_result(rows, ordering, limit)
+
+
+def _keyset_query(queryset, ordering, cursor):
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(keyset_filter(ordering, parse_cursor(queryset.model, ordering, cursor)))
+    return queryset
+
+
+def _keyset_result(rows, ordering, limit):
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    key = [
+        last[field.lstrip('-')] if isinstance(last, dict) else getattr(last, field.lstrip('-'))
+        for field in ordering
+    ]
+    return rows, encode_cursor(key)
+
+
+# Ключи keyset-пагинации каталога для вариантов OrderingFilter; id делает ключ уникальным
+CATALOG_ORDERINGS = {
+    'price': ('price', 'id'),
+    '-price': ('-price', '-id'),
+}
+CATALOG_DEFAULT_ORDERING = ('created_at', 'id')
+
+
+def catalog_ordering(params):
+    return CATALOG_ORDERINGS.get(params.get('ordering'), CATALOG_DEFAULT_ORDERING)
+
+
+def paginate_catalog(queryset, params, total=None, ranked=False):
+    """
+    Страница каталога. Первые страницы — по номеру (?page=N, OFFSET), дальше —
+    по курсору (?cursor=...), стоимость которого не зависит от глубины. Выдача поиска
+    по релевантности (ranked) ограничена MAX_RESULTS и листается только по номеру.
+    total — число товаров под фильтром, если уже посчитано (фасетами): нужно для
+    номеров страниц; без него отдаётся только ссылка на продолжение.
+    """
+    per_page = settings.CATALOG_PAGE_SIZE
+    ordering = catalog_ordering(params)
+    num_pages = max(1, math.ceil(total / per_page)) if total is not None else None
+    page = {
+        'number': None,
+        'num_pages': num_pages,
+        'page_range': range(1, min(num_pages or 1, settings.CATALOG_MAX_OFFSET_PAGE) + 1),
+        'next_page': None,
+        'next_cursor': None,
+    }
+
+    cursor = params.get('cursor')
+    if cursor and not ranked:
+        page['products'], page['next_cursor'] = keyset_page(queryset, ordering, cursor, per_page)
+        return page
+
+    try:
+        number = max(int(params.get('page', 1)), 1)
+    except (TypeError, ValueError):
+        number = 1
+    if not ranked:
+        # Глубже CATALOG_MAX_OFFSET_PAGE листаем курсором, а не OFFSET
+        number = min(number, settings.CATALOG_MAX_OFFSET_PAGE)
+        queryset = queryset.order_by(*ordering)
+    if num_pages is not None:
+        number = min(number, num_pages)
+
+    start = (number - 1) * per_page
+    # Лишняя строка показывает, есть ли продолжение, без отдельного COUNT
+    products = list(queryset[start:start + per_page + 1])
+    has_next = len(products) > per_page
+    products = products[:per_page]
+    page['number'] = number
+    page['products'] = products
+
+    if has_next:
+        if ranked:
+            page['next_page'] = number + 1
+        else:
+            last = products[-1]
+            page['next_cursor'] = encode_cursor([getattr(last, field.lstrip('-')) for field in ordering])
+    return page
@@ -0,0 +1,128 @@
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import GlobalRating, ProductRating, Review
+
+GLOBAL_RATING_PK = 1
+RATING_FIELDS = ('rating_sum', 'rating_count', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5')
+
+
+def _delta(rating, sign):
+    """Выражения F() для инкрементального изменения сводки на одну оценку"""
+    return {
+        'rating_sum': F('rating_sum') + sign * rating,
+        'rating_count': F('rating_count') + sign,
+        f'rating_{rating}': F(f'rating_{rating}') + sign,
+    }
+
+
+def _apply(model, lookup, rating, sign):
+    updated = model.objects.filter(**lookup).update(**_delta(rating, sign))
+    # Строку сводки создаём только при добавлении оценки: при каскадном
+    # удалении товара сводка уже может быть удалена вместе с ним
+    if not updated and sign > 0:
+        model.objects.get_or_create(**lookup)
+        model.objects.filter(**lookup).update(**_delta(rating, sign))
+
+
+def apply_rating(product_id, rating, sign=1):
+    """Добавляет (sign=1) или вычитает (sign=-1) оценку в сводках товара и магазина"""
+    if rating not in range(1, 6):
+        return
+    with transaction.atomic():
+        _apply(ProductRating, {'product_id': product_id}, rating, sign)
+        _apply(GlobalRating, {'pk': GLOBAL_RATING_PK}, rating, sign)
+
+
+def get_product_rating(product):
+    """Сводка по товару; для товара без отзывов — пустая несохранённая сводка"""
+    try:
+        return product.rating_summary
+    except ProductRating.DoesNotExist:
+        return ProductRating(product=product)
+
+
+def get_global_rating():
+    return GlobalRating.objects.filter(pk=GLOBAL_RATING_PK).first() or GlobalRating(pk=GLOBAL_RATING_PK)
+
+
+async def aget_global_rating():
+    return await GlobalRating.objects.filter(pk=GLOBAL_RATING_PK).afirst() or GlobalRating(pk=GLOBAL_RATING_PK)
+
+
+def _aggregates():
+    return {
+        'rating_sum': Sum('rating'),
+        'rating_count': Count('id'),
+        **{f'rating_{i}': Count('id', filter=Q(rating=i)) for i in range(1, 6)},
+    }
+
+
+def compute_product_ratings():
+    """Точные сводки по товарам, посчитанные заново по таблице отзывов"""
+    rows = (
+        Review.objects.order_by()
+        .values('product_id')
+        .annotate(**_aggregates())
+        .iterator(chunk_size=2000)
+    )
+    for row in rows:
+        yield row.pop('product_id'), row
+
+
+def compute_global_rating():
+    stats = Review.objects.aggregate(**_aggregates())
+    stats['rating_sum'] = stats['rating_sum'] or 0
+    return stats
+
+
+def rebuild_ratings(batch_size=1000):
+    """Полностью пересобирает сводки из отзывов. Возвращает число товаров со сводкой"""
+    with transaction.atomic():
+        ProductRating.objects.all().delete()
+        GlobalRating.objects.all().delete()
+
+        batch = []
+        total = 0
+        for product_id, stats in compute_product_ratings():
+            batch.append(ProductRating(product_id=product_id, **stats))
+            if len(batch) >= batch_size:
+                ProductRating.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            ProductRating.objects.bulk_create(batch)
+            total += len(batch)
+
+        GlobalRating.objects.create(pk=GLOBAL_RATING_PK, **compute_global_rating())
+    return total
+
+
+def check_ratings():
+    """
+    Сверяет сохранённые сводки с таблицей отзывов.
+    Возвращает список расхождений (product_id или None для общей сводки, ожидаемое, фактическое).
+    """
+    mismatches = []
+    empty = dict.fromkeys(RATING_FIELDS, 0)
+
+    stored = {
+        row.pop('product_id'): row
+        for row in ProductRating.objects.values('product_id', *RATING_FIELDS).iterator(chunk_size=2000)
+    }
+    for product_id, expected in compute_product_ratings():
+        actual = stored.pop(product_id, empty)
+        if actual != expected:
+            mismatches.append((product_id, expected, actual))
+    # Оставшиеся сводки относятся к товарам без отзывов и должны быть нулевыми
+    for product_id, actual in stored.items():
+        if actual != empty:
+            mismatches.append((product_id, empty, actual))
+
+    expected = compute_global_rating()
+    actual = GlobalRating.objects.filter(pk=GLOBAL_RATING_PK).values(*RATING_FIELDS).first() or empty
+    if actual != expected:
+        mismatches.append((None, expected, actual))
+
+    return mismatches
+
@@ -0,0 +1,81 @@
+"""
+Время отрисовки шаблонов по именам.
+
+Django в тестах подменяет Template._render (instrumented_test_render) — через
+эту же точку проходит каждая отрисовка: страница, её {% extends %} и каждый
+{% include %}. install() оборачивает её замером, а collect() собирает замеры
+текущего запроса или участка кода:
+
+    with collect() as timings:
+        client.get('/')
+    # [('header.html', 1.9), ('base.html', 14.2), ('home.html', 14.6)]
+
+Время включающее: base.html содержит время header.html, страница — время
+base.html. Шаблоны, отрисованные внутри фрагмента из кэша, не замеряются.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+
+_timings = ContextVar('template_timings', default=None)
+
+
+def install():
+    """Оборачивает Template._render замером; повторный вызов ничего не меняет"""
+    render = Template._render
+    if getattr(render, 'timed', False):
+        return
+
+    def timed_render(self, context):
+        timings = _timings.get()
+        if timings is None:
+            return render(self, context)
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            timings.append((self.name or '<string>', (time.perf_counter() - started) * 1000))
+
+    timed_render.timed = True
+    Template._render = timed_render
+
+
+@contextmanager
+def collect():
+    """Список (шаблон, мс) всех отрисовок внутри блока в порядке завершения"""
+    install()
+    timings = []
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def server_timing(timings):
+    """Значение заголовка Server-Timing: одна метрика на отрисовку"""
+    return ', '.join(
+        f'tpl{index};desc="{name}";dur={duration:.2f}'
+        for index, (name, duration) in enumerate(timings)
+    )
+
+
+class TemplateTimingMiddleware:
+    """Отдаёт замеры в заголовке Server-Timing и пишет их в журнал (DEBUG)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install()
+
+    def __call__(self, request):
+        with collect() as timings:
+            response = self.get_response(request)
+        if timings:
+            response['Server-Timing'] = server_timing(timings)
+            logger.debug(f"{request.path}: " + ', '.join(f"{name} {duration:.1f} ms" for name, duration in timings))
+        return response
@@ -0,0 +1,288 @@
+import re
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Sum, Value, When
+
+from .models import Product, SearchToken, SearchTrigram
+
+# Вес поля, из которого взято слово: название важнее классификаторов
+NAME_WEIGHT = 3
+LABEL_WEIGHT = 1
+
+# Вклад типа совпадения слова запроса в ранг товара
+EXACT_SCORE = 3
+PREFIX_SCORE = 2
+FUZZY_SCORE = 1
+
+# Минимальное сходство триграмм (коэффициент Жаккара) для нечёткого совпадения
+FUZZY_THRESHOLD = 0.4
+FUZZY_MIN_LENGTH = 4
+
+# Больше результатов пользователю не нужно, а список id уходит в IN (...)
+MAX_RESULTS = 1000
+# Сколько слов словаря максимум подставляется вместо одного префикса/опечатки
+MAX_EXPANSIONS = 200
+
+MAX_TOKEN_LENGTH = 100
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    return text.lower().replace('ё', 'е')
+
+
+def tokenize(text):
+    return [word[:MAX_TOKEN_LENGTH] for word in WORD_RE.findall(normalize(text))]
+
+
+def trigrams(word):
+    """Триграммы слова с дополнением пробелами, как в pg_trgm"""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(left, right):
+    left, right = trigrams(left), trigrams(right)
+    return len(left & right) / len(left | right)
+
+
+def product_tokens(product):
+    """Слова товара с весом поля: название + подписи группы, подгруппы и типа"""
+    tokens = {}
+    labels = ' '.join([
+        product.get_group_display(),
+        product.get_subgroup_display(),
+        product.get_flower_type_display(),
+    ])
+    for token in tokenize(labels):
+        tokens[token] = LABEL_WEIGHT
+    for token in tokenize(product.name):
+        tokens[token] = NAME_WEIGHT
+    return tokens
+
+
+def _index_rows(products):
+    postings = []
+    vocabulary = set()
+    for product in products:
+        for token, weight in product_tokens(product).items():
+            postings.append(SearchToken(product_id=product.pk, token=token, weight=weight))
+            vocabulary.add(token)
+    return postings, vocabulary
+
+
+def _add_vocabulary(vocabulary):
+    SearchTrigram.objects.bulk_create(
+        [SearchTrigram(token=token, trigram=trigram) for token in vocabulary for trigram in trigrams(token)],
+        ignore_conflicts=True,
+        batch_size=1000
+    )
+
+
+def _drop_vocabulary(tokens):
+    """
+    Убирает из словаря слова tokens, на которые не ссылается ни один товар:
+    иначе мёртвые слова занимают места MAX_EXPANSIONS при раскрытии префикса
+    """
+    if not tokens:
+        return
+    SearchTrigram.objects.filter(token__in=tokens).exclude(
+        token__in=SearchToken.objects.filter(token__in=tokens).values('token')
+    ).delete()
+
+
+def index_product(product):
+    """Переиндексирует один товар (вызывается из сигнала post_save)"""
+    postings, vocabulary = _index_rows([product])
+    with transaction.atomic():
+        old_tokens = set(SearchToken.objects.filter(product_id=product.pk).values_list('token', flat=True))
+        SearchToken.objects.filter(product_id=product.pk).delete()
+        SearchToken.objects.bulk_create(postings)
+        _add_vocabulary(vocabulary)
+        _drop_vocabulary(old_tokens - vocabulary)
+
+
+def unindex_product(product):
+    """Чистит словарь после удаления товара: постинги удаляются каскадно"""
+    _drop_vocabulary(set(product_tokens(product)))
+
+
+def rebuild_index(batch_size=2000):
+    """Полная пересборка индекса по всем товарам. Возвращает число проиндексированных товаров"""
+    total = 0
+    with transaction.atomic():
+        SearchToken.objects.all().delete()
+        SearchTrigram.objects.all().delete()
+
+        products = Product.objects.only('id', 'name', 'group', 'subgroup', 'flower_type')
+        batch = []
+        for product in products.iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                total += _flush(batch)
+                batch = []
+        if batch:
+            total += _flush(batch)
+    return total
+
+
+def _flush(products):
+    postings, vocabulary = _index_rows(products)
+    SearchToken.objects.bulk_create(postings, batch_size=1000)
+    _add_vocabulary(vocabulary)
+    return len(products)
+
+
+def _vocabulary_by_trigrams(grams, min_shared):
+    """Слова словаря, у которых с запросом не меньше min_shared общих триграмм"""
+    return list(
+        SearchTrigram.objects.filter(trigram__in=grams)
+        .values('token')
+        .annotate(shared=Count('id'))
+        .filter(shared__gte=min_shared)
+        .values_list('token', flat=True)
+    )
+
+
+def _vocabulary_by_prefix(prefix):
+    # Диапазон [prefix, prefix + '\uffff') использует B-tree индекс и в SQLite, и в PostgreSQL
+    return list(
+        SearchTrigram.objects.filter(token__gte=prefix, token__lt=prefix + '\uffff')
+        .order_by('token')
+        .values_list('token', flat=True)
+        .distinct()[:MAX_EXPANSIONS]
+    )
+
+
+def _expand_word(word):
+    """
+    Раскрывает слово запроса в слова словаря, сгруппированные по вкладу в ранг:
+    {EXACT_SCORE: [...], PREFIX_SCORE: [...]} или, если таких нет, {FUZZY_SCORE: [...]}.
+    """
+    tokens = _vocabulary_by_prefix(word)
+    if tokens:
+        groups = {EXACT_SCORE: [t for t in tokens if t == word], PREFIX_SCORE: [t for t in tokens if t != word]}
+        return {score: group for score, group in groups.items() if group}
+
+    if len(word) < FUZZY_MIN_LENGTH:
+        return {}
+    grams = trigrams(word)
+    # Из |A ∩ B| / |A ∪ B| >= t следует |A ∩ B| >= t * |A|
+    candidates = _vocabulary_by_trigrams(grams, max(1, int(FUZZY_THRESHOLD * len(grams))))
+    close = sorted(candidates, key=lambda token: -similarity(word, token))
+    close = [token for token in close if similarity(word, token) >= FUZZY_THRESHOLD][:MAX_EXPANSIONS]
+    return {FUZZY_SCORE: close} if close else {}
+
+
+def _rank_words(words):
+    """
+    Один сгруппированный запрос по постингам: товар должен совпасть со всеми
+    словами (HAVING по числу различных слов), ранг — сумма вес поля × тип совпадения.
+    Пересечение, ранжирование и LIMIT выполняет база, в Python приходит только топ.
+    """
+    expansions = [_expand_word(word) for word in words]
+    if not all(expansions):
+        return []
+
+    all_tokens = {token for groups in expansions for tokens in groups.values() for token in tokens}
+    score = Case(
+        *[
+            When(token__in=tokens, then=Value(factor))
+            for groups in expansions for factor, tokens in groups.items()
+        ],
+        default=Value(0),
+        output_field=IntegerField()
+    )
+    word_index = Case(
+        *[
+            When(token__in=[token for tokens in groups.values() for token in tokens], then=Value(index))
+            for index, groups in enumerate(expansions)
+        ],
+        output_field=IntegerField()
+    )
+    postings = SearchToken.objects.filter(token__in=all_tokens)
+    if len(expansions) > 1:
+        # Кандидаты ограничиваются товарами самого редкого слова запроса:
+        # частые слова («розы») тогда проверяются точечно по индексу (token, product)
+        rarest = min(
+            ([token for tokens in groups.values() for token in tokens] for groups in expansions),
+            key=lambda tokens: SearchToken.objects.filter(token__in=tokens).count()
+        )
+        postings = postings.filter(
+            product_id__in=SearchToken.objects.filter(token__in=rarest).values('product_id')
+        )
+    rows = (
+        postings
+        .values('product_id')
+        .annotate(rank=Sum(F('weight') * score), matched=Count(word_index, distinct=True))
+        .filter(matched=len(expansions))
+        .order_by('-rank', 'product_id')
+        .values_list('product_id', flat=True)[:MAX_RESULTS]
+    )
+    return list(rows)
+
+
+def _wildcard_regex(pattern):
+    parts = (re.escape(part) for part in normalize(pattern).split('*'))
+    return re.compile('^' + '.*'.join(parts) + '$')
+
+
+def _match_wildcard(pattern):
+    """
+    Шаблон с '*' сопоставляется со всем названием (как прежний iregex).
+    Кандидаты отбираются по индексу через самое длинное слово шаблона,
+    затем проверяются регулярным выражением только они. Короткое (1-2 буквы)
+    слово ищется по префиксу, только если с него начинается слово названия;
+    после '*' оно может оказаться в середине слова — тогда проверяются все названия.
+    """
+    regex = _wildcard_regex(pattern)
+    normalized = normalize(pattern)
+    words = list(WORD_RE.finditer(normalized.replace('*', ' ')))
+    products = Product.objects.all()
+
+    if words:
+        anchor_match = max(words, key=lambda match: len(match.group()))
+        anchor = anchor_match.group()[:MAX_TOKEN_LENGTH]
+        start = anchor_match.start()
+        if len(anchor) >= 3:
+            grams = {gram for gram in trigrams(anchor) if ' ' not in gram}
+            tokens = [
+                token for token in _vocabulary_by_trigrams(grams, len(grams))
+                if anchor in token
+            ]
+            products = products.filter(search_tokens__token__in=tokens).distinct()
+        elif start == 0 or normalized[start - 1] != '*':
+            tokens = _vocabulary_by_prefix(anchor)
+            products = products.filter(search_tokens__token__in=tokens).distinct()
+
+    return {
+        product_id: NAME_WEIGHT
+        for product_id, name in products.values_list('id', 'name').iterator(chunk_size=2000)
+        if regex.match(normalize(name))
+    }
+
+
+def search(query):
+    """
+    Ищет товары по строке запроса. Возвращает список id по убыванию релевантности.
+    Все слова запроса должны совпасть (AND).
+    """
+    query = query.strip()
+    if not query:
+        return []
+
+    if '*' in query:
+        scores = _match_wildcard(query)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [product_id for product_id, _ in ranked[:MAX_RESULTS]]
+
+    return _rank_words(list(dict.fromkeys(tokenize(query))))
+
+
+def filter_by_search(queryset, query):
+    """Сужает queryset до найденных товаров и сортирует их по релевантности"""
+    ids = search(query)
+    if not ids:
+        return queryset.none()
+    rank = Case(*[When(pk=pk, then=position) for position, pk in enumerate(ids)], output_field=IntegerField())
+    return queryset.filter(pk__in=ids).order_by(rank)
@@ -0,0 +1,157 @@
+import logging
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import invalidate_catalog
+from .favorites import invalidate_favorites
+from .models import Favorite, Product, ProductColor, Review
+from .ratings import apply_rating
+from .search import index_product, unindex_product
+from .thumbnails import IMAGE_ERRORS, content_hash, generate_derivatives
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELDS = {'name', 'group', 'subgroup', 'flower_type'}
+
+
+@receiver(pre_save, sender=Review, dispatch_uid='catalog_review_remember_rating')
+def remember_review_rating(sender, instance, raw=False, **kwargs):
+    # Запоминаем прежнюю оценку, чтобы при редактировании отзыва сдвинуть сводку
+    instance._previous_rating = None
+    if instance.pk and not raw:
+        instance._previous_rating = (
+            Review.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=Review, dispatch_uid='catalog_review_rating_saved')
+def update_rating_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_rating', None)
+    if created or previous is None:
+        apply_rating(instance.product_id, instance.rating)
+    elif previous != (instance.product_id, instance.rating):
+        apply_rating(previous[0], previous[1], sign=-1)
+        apply_rating(instance.product_id, instance.rating)
+
+
+@receiver(post_delete, sender=Review, dispatch_uid='catalog_review_rating_deleted')
+def update_rating_on_delete(sender, instance, **kwargs):
+    apply_rating(instance.product_id, instance.rating, sign=-1)
+
+
+@receiver(post_save, sender=Product, dispatch_uid='catalog_product_search_index')
+def update_search_index(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and not SEARCH_FIELDS & set(update_fields)):
+        return
+    index_product(instance)
+
+
+@receiver(post_delete, sender=Product, dispatch_uid='catalog_product_search_unindex')
+def drop_search_vocabulary(sender, instance, **kwargs):
+    # Постинги уже удалены каскадно, в словаре остались слова товара
+    unindex_product(instance)
+
+
+@receiver(pre_save, sender=Product, dispatch_uid='catalog_product_image_hash')
+def hash_product_image(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Новая загрузка ещё не записана в хранилище: хэшируем загруженный файл
+    instance._image_uploaded = False
+    if raw or (update_fields and 'image' not in update_fields):
+        return
+    if not instance.image:
+        instance.image_hash = ''
+    elif not instance.image._committed:
+        instance.image_hash = content_hash(instance.image)
+        instance._image_uploaded = True
+    elif instance.image_hash and not instance._state.adding:
+        # Назначен уже лежащий в хранилище файл (product.image = 'products/x.jpg'):
+        # старый хэш сбрасывается, ensure_image_hash посчитает новый при показе
+        stored = sender.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+        if stored != instance.image.name:
+            instance.image_hash = ''
+
+
+@receiver(post_save, sender=Product, dispatch_uid='catalog_product_thumbnails')
+def generate_thumbnails_on_upload(sender, instance, raw=False, **kwargs):
+    if raw or not getattr(instance, '_image_uploaded', False):
+        return
+    try:
+        generate_derivatives(instance)
+    except IMAGE_ERRORS as e:
+        # Не получилось сейчас — тег thumbnail_url повторит при показе
+        logger.warning(f"Не удалось подготовить уменьшенные копии товара {instance.pk}: {e}")
+
+
+@receiver(post_save, sender=Product, dispatch_uid='catalog_product_cache_saved')
+@receiver(post_delete, sender=Product, dispatch_uid='catalog_product_cache_deleted')
+def invalidate_cache_on_product_change(sender, raw=False, **kwargs):
+    # Любое поле товара (цена, количество, флаги, название) влияет на выборки
+    if not raw:
+        invalidate_catalog()
+
+
+@receiver(m2m_changed, sender=Product.colors.through, dispatch_uid='catalog_product_cache_colors')
+def invalidate_cache_on_colors_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_catalog()
+
+
+@receiver(post_delete, sender=ProductColor, dispatch_uid='catalog_color_cache_deleted')
+def invalidate_cache_on_color_delete(sender, **kwargs):
+    # Связи с товарами удаляются каскадно без m2m_changed, а от них зависят
+    # фасет цветов и выборки с фильтром по цвету
+    invalidate_catalog()
+
+
+@receiver(m2m_changed, sender=Product.colors.through, dispatch_uid='catalog_product_card_colors')
+def touch_products_on_colors_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # Цвета выводятся в карточке: сдвигаем updated_at — версию закэшированной карточки.
+    # Со стороны цвета при clear() pk_set пуст: товары запоминаются до очистки
+    if reverse and action == 'pre_clear':
+        instance._cleared_product_ids = set(
+            Product.objects.filter(colors=instance).values_list('pk', flat=True)
+        )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        product_ids = {instance.pk}
+    elif action == 'post_clear':
+        product_ids = getattr(instance, '_cleared_product_ids', set())
+    else:
+        product_ids = pk_set
+    if product_ids:
+        Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=ProductColor, dispatch_uid='catalog_color_card_saved')
+def touch_products_on_color_save(sender, instance, created, raw=False, **kwargs):
+    # css_name цвета — часть карточки каждого товара этого цвета
+    if not raw and not created:
+        Product.objects.filter(colors=instance).update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=ProductColor, dispatch_uid='catalog_color_card_deleting')
+def remember_color_products(sender, instance, **kwargs):
+    # Связи удаляются каскадно без m2m_changed: товары запоминаются до удаления
+    instance._deleted_product_ids = set(
+        Product.objects.filter(colors=instance).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=ProductColor, dispatch_uid='catalog_color_card_deleted')
+def touch_products_on_color_delete(sender, instance, **kwargs):
+    product_ids = getattr(instance, '_deleted_product_ids', set())
+    if product_ids:
+        Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Favorite, dispatch_uid='catalog_favorite_saved')
+@receiver(post_delete, sender=Favorite, dispatch_uid='catalog_favorite_deleted')
+def invalidate_favorites_on_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_favorites(instance.user_id)
@@ -0,0 +1,19 @@
+from django import template
+
+from catalog import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail_url(product, size='card', fmt='jpeg'):
+    """
+    URL уменьшенной копии фото товара:
+
+        {% load thumbnails %}
+        <picture>
+            <source type="image/webp" srcset="{% thumbnail_url product 'card' 'webp' %}">
+            <img src="{% thumbnail_url product 'card' %}" alt="{{ product.name }}">
+        </picture>
+    """
+    return thumbnails.thumbnail_url(product, size, fmt)
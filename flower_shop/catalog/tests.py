@@ -1,16 +1,57 @@
 from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.core.cache import caches
+from django.http import QueryDict
 from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
 from hypothesis import given, strategies as st
 from hypothesis.extra.django import TestCase as HypTestCase, from_model
 from django.apps import apps
+from django.core.management import call_command, CommandError
+import base64
+import io
+import json
+import re
+import unittest
+import hashlib
+import importlib
+import os
+import tempfile
+from PIL import Image
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import AsyncRequestFactory
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404
+from django.urls import clear_url_caches, resolve
 
 # Получаем модели через apps.get_model()
 Product = apps.get_model('catalog', 'Product')
 ProductColor = apps.get_model('catalog', 'ProductColor')
 Review = apps.get_model('catalog', 'Review')
 CustomUser = apps.get_model('users', 'CustomUser')
+ProductRating = apps.get_model('catalog', 'ProductRating')
+SearchToken = apps.get_model('catalog', 'SearchToken')
+SearchTrigram = apps.get_model('catalog', 'SearchTrigram')
+Favorite = apps.get_model('catalog', 'Favorite')
+
+from catalog.ratings import check_ratings, get_global_rating
+from catalog.search import search
+from catalog.facets import compute_facets
+from catalog.cache import get_stats as get_cache_stats, make_key as make_cache_key
+from catalog.favorites import favorites_key, get_favorite_ids
+from catalog.thumbnails import derivative_name
+from catalog.render_timing import collect as collect_render_timings
+from catalog import views as catalog_views
+from flower_shop.flower_shop.views import ahome, aget_reviews
+from query_plans import explain
+
+
+def raw_cursor(values):
+    """Курсор с произвольными значениями — как подделанный клиентом"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
 
 # Фиксируем правильный ROOT_URLCONF для всех тестов
 @override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls')
@@ -119,4 +160,768 @@ class ProductFilterTests(TestCase):
         response = self.client.get(
             reverse('catalog:catalog') + f"?colors={color1.id}&colors={color2.id}"
         )
-        self.assertContains(response, "Multicolor Product")
\ No newline at end of file
+        self.assertContains(response, "Multicolor Product")
+
+
+@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls')
+class RatingSummaryTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            name="Rated Product",
+            price=100,
+            image=SimpleUploadedFile('rated.jpg', b'', 'image/jpeg')
+        )
+        self.other = Product.objects.create(name="Other Product", price=200)
+        self.users = [
+            CustomUser.objects.create_user(username=f"rater{i}", password="testpass")
+            for i in range(3)
+        ]
+
+    def review(self, user, rating, product=None):
+        return Review.objects.create(user=user, product=product or self.product, text="ok", rating=rating)
+
+    def test_summary_updated_incrementally(self):
+        self.review(self.users[0], 5)
+        first = self.review(self.users[1], 2)
+        self.review(self.users[2], 4, product=self.other)
+
+        summary = ProductRating.objects.get(product=self.product)
+        self.assertEqual((summary.rating_sum, summary.rating_count), (7, 2))
+        self.assertEqual(summary.histogram, {1: 0, 2: 1, 3: 0, 4: 0, 5: 1})
+        self.assertEqual(summary.average, 3.5)
+
+        first.rating = 3
+        first.save()
+        first.delete()
+        summary.refresh_from_db()
+        self.assertEqual((summary.rating_sum, summary.rating_count), (5, 1))
+
+        global_rating = get_global_rating()
+        self.assertEqual((global_rating.rating_sum, global_rating.rating_count), (9, 2))
+        self.assertEqual(check_ratings(), [])
+
+    def test_product_delete_cascades_cleanly(self):
+        self.review(self.users[0], 5)
+        self.review(self.users[1], 1, product=self.other)
+        self.product.delete()
+        self.assertEqual(get_global_rating().rating_count, 1)
+        self.assertEqual(check_ratings(), [])
+
+    def test_rebuild_and_check(self):
+        self.review(self.users[0], 5)
+        self.review(self.users[1], 3)
+        ProductRating.objects.filter(product=self.product).update(rating_count=10)
+        self.assertEqual(len(check_ratings()), 1)
+
+        with self.assertRaises(CommandError):
+            call_command('check_ratings', stdout=io.StringIO())
+        call_command('rebuild_ratings', stdout=io.StringIO())
+        self.assertEqual(check_ratings(), [])
+        self.assertEqual(ProductRating.objects.get(product=self.product).average, 4.0)
+
+    def test_views_read_summary(self):
+        self.review(self.users[0], 4)
+        self.review(self.users[1], 5)
+
+        response = self.client.get(reverse('catalog:product_detail', args=[self.product.id]))
+        self.assertEqual(response.context['average_rating'], 4.5)
+        self.assertEqual(response.context['reviews_count'], 2)
+
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['average_rating'], 4.5)
+        self.assertEqual(response.context['reviews_count'], 2)
+
+@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls', REVIEWS_PAGE_SIZE=2)
+class ReviewsEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name="Feed Product", price=100)
+        for i in range(5):
+            user = CustomUser.objects.create_user(username=f"feeduser{i}", password="testpass")
+            Review.objects.create(user=user, product=cls.product, text=f"review {i}", rating=i + 1)
+
+    def test_cursor_pagination_walks_all_reviews(self):
+        texts = []
+        cursor = None
+        pages = 0
+        while True:
+            params = {'cursor': cursor} if cursor else {}
+            data = self.client.get(reverse('get_reviews'), params).json()
+            texts.extend(review['text'] for review in data['reviews'])
+            pages += 1
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(texts, [f"review {i}" for i in reversed(range(5))])
+
+    def test_limit_and_invalid_cursor(self):
+        data = self.client.get(reverse('get_reviews'), {'limit': 10}).json()
+        self.assertEqual(len(data['reviews']), 5)
+        self.assertIsNone(data['next_cursor'])
+
+        response = self.client.get(reverse('get_reviews'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_tampered_cursor_values(self):
+        # Курсор правильного вида, но значения не подходят к полям created_at и id
+        for values in (["abc", "1"], [1, 2], ["2024-01-01 00:00:00+00:00", "x"]):
+            with self.subTest(values=values):
+                response = self.client.get(reverse('get_reviews'), {'cursor': raw_cursor(values)})
+                self.assertEqual(response.status_code, 400)
+
+    def test_streaming_mode(self):
+        response = self.client.get(reverse('get_reviews'), {'stream': '1'})
+        self.assertTrue(response.streaming)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(data['reviews']), 5)
+        self.assertEqual(data['reviews'][0]['product'], "Feed Product")
+
+@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls', REVIEWS_PAGE_SIZE=2)
+class AsyncViewTests(TestCase):
+    """Async-версии страниц для ASGI: тот же результат, что у синхронных"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name="Async Rose", price=100, is_new=True)
+        cls.user = CustomUser.objects.create_user(username="asyncuser", password="x")
+        Review.objects.create(user=cls.user, product=cls.product, text="async review", rating=5)
+
+    def request(self, path, user=None, **params):
+        request = AsyncRequestFactory().get(path, params)
+        request.user = user or AnonymousUser()
+
+        async def auser():
+            return request.user
+
+        request.auser = auser
+        return request
+
+    async def test_pages(self):
+        response = await ahome(self.request('/'))
+        self.assertContains(response, "Async Rose")
+        response = await catalog_views.aproduct_detail(self.request('/'), self.product.pk)
+        self.assertContains(response, "Async Rose")
+        response = await catalog_views.aproduct_reviews(self.request('/'), self.product.pk)
+        self.assertContains(response, "async review")
+
+        with self.assertRaises(Http404):
+            await catalog_views.aproduct_detail(self.request('/'), 10 ** 9)
+
+    async def test_review_link_for_authenticated_user(self):
+        add_review_url = reverse('catalog:add_review', args=[self.product.pk])
+        other = await CustomUser.objects.acreate(username="asyncother")
+        response = await catalog_views.aproduct_detail(self.request('/', user=other), self.product.pk)
+        self.assertContains(response, add_review_url)
+        # Автору отзыва не предлагается оставить ещё один
+        response = await catalog_views.aproduct_detail(self.request('/', user=self.user), self.product.pk)
+        self.assertNotContains(response, add_review_url)
+
+    async def test_reviews_page_and_stream(self):
+        data = json.loads((await aget_reviews(self.request('/reviews/'))).content)
+        self.assertEqual([review['text'] for review in data['reviews']], ["async review"])
+        self.assertIsNone(data['next_cursor'])
+
+        response = await aget_reviews(self.request('/reviews/', limit='0'))
+        self.assertEqual(response.status_code, 400)
+        response = await aget_reviews(self.request('/reviews/', cursor=raw_cursor(["abc", "1"])))
+        self.assertEqual(response.status_code, 400)
+
+        response = await aget_reviews(self.request('/reviews/', stream='1'))
+        self.assertTrue(response.is_async)
+        content = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertEqual(json.loads(content)['reviews'][0]['product'], "Async Rose")
+
+    def reload_urls(self):
+        # Выбор async-версий делается при импорте модулей URL
+        import catalog.urls
+        from flower_shop.flower_shop import urls as root_urls
+        importlib.reload(catalog.urls)
+        importlib.reload(root_urls)
+        clear_url_caches()
+
+    def test_asgi_routes_to_async_views(self):
+        self.assertFalse(settings.ASYNC_VIEWS)
+        self.assertIs(resolve(reverse('catalog:product_detail', args=[1])).func, catalog_views.product_detail)
+
+        with override_settings(ASYNC_VIEWS=True):
+            self.addCleanup(self.reload_urls)
+            self.reload_urls()
+            routes = {
+                reverse('catalog:product_detail', args=[1]): catalog_views.aproduct_detail,
+                reverse('catalog:product_reviews', args=[1]): catalog_views.aproduct_reviews,
+                reverse('home'): ahome,
+                reverse('get_reviews'): aget_reviews,
+            }
+            for url, view in routes.items():
+                with self.subTest(url=url):
+                    self.assertIs(resolve(url).func, view)
+
+
+@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls')
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.red = Product.objects.create(name="Красные розы Эквадор", price=100, group="Букеты")
+        cls.white = Product.objects.create(name="Белая роза", price=200)
+        cls.chrysanthemum = Product.objects.create(
+            name="Хризантема Бакарди", price=300,
+            subgroup="Хризантемы", flower_type="Декоративные хризантемы"
+        )
+
+    def test_exact_and_prefix_match(self):
+        self.assertEqual(search("эквадор"), [self.red.id])
+        self.assertEqual(set(search("роз")), {self.red.id, self.white.id})
+        self.assertEqual(search("красные эквадор"), [self.red.id])
+
+    def test_name_ranks_above_labels(self):
+        # «хризантема» есть в названии одного товара и только в подписях у других
+        self.assertEqual(search("хризантем")[0], self.chrysanthemum.id)
+
+    def test_typo_tolerance(self):
+        self.assertEqual(search("бакарди"), [self.chrysanthemum.id])
+        self.assertEqual(search("бокарди"), [self.chrysanthemum.id])
+
+    def test_wildcard_matches_whole_name(self):
+        self.assertEqual(search("Красн*адор"), [self.red.id])
+        self.assertEqual(search("бел*"), [self.white.id])
+        self.assertEqual(search("*роза"), [self.white.id])
+
+    def test_wildcard_short_word_inside_word(self):
+        # Одна-две буквы после '*' — не начало слова: индекс префиксов не подходит
+        self.assertEqual(search("*ра*"), [self.red.id])
+        self.assertEqual(search("*ак*"), [self.chrysanthemum.id])
+        self.assertEqual(search("б*"), [self.white.id])
+
+    def test_index_follows_product_changes(self):
+        self.white.name = "Пионовидная роза"
+        self.white.save()
+        self.assertEqual(search("белая"), [])
+        self.assertEqual(search("пионовидная"), [self.white.id])
+
+        self.white.delete()
+        self.assertFalse(SearchToken.objects.filter(product_id=self.white.id).exists())
+
+    def test_dead_vocabulary_is_dropped(self):
+        def vocabulary():
+            return set(SearchTrigram.objects.values_list('token', flat=True))
+
+        self.white.name = "Пионовидная роза"
+        self.white.save()
+        self.assertNotIn("белая", vocabulary())
+        # «роза» осталась у товара, «розы» — у другого
+        self.assertTrue({"пионовидная", "роза", "розы"} <= vocabulary())
+
+        self.white.delete()
+        self.assertFalse({"пионовидная", "роза"} & vocabulary())
+        self.assertIn("розы", vocabulary())
+        self.assertEqual(vocabulary(), set(SearchToken.objects.values_list('token', flat=True)))
+
+    def test_rebuild_command(self):
+        SearchToken.objects.all().delete()
+        self.assertEqual(search("эквадор"), [])
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(search("эквадор"), [self.red.id])
+
+@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls')
+class FacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.red = ProductColor.objects.create(name="Красный", css_name="red")
+        cls.white = ProductColor.objects.create(name="Белый", css_name="white")
+        image = SimpleUploadedFile('facet.jpg', b'', 'image/jpeg')
+        specs = [
+            ("Букеты", "Розы", True, False, 5, [cls.red]),
+            ("Букеты", "Хризантемы", False, True, 0, [cls.red, cls.white]),
+            ("Одиночные цветы", "Розы", True, True, 3, [cls.white]),
+        ]
+        for index, (group, subgroup, is_new, is_bestseller, quantity, colors) in enumerate(specs):
+            product = Product.objects.create(
+                name=f"Facet {index}", price=100 + index, group=group, subgroup=subgroup,
+                is_new=is_new, is_bestseller=is_bestseller, quantity=quantity, image=image
+            )
+            product.colors.add(*colors)
+
+    def test_counts_for_whole_catalog(self):
+        with self.assertNumQueries(2):
+            facets = compute_facets(Product.objects.all())
+        self.assertEqual(facets['total'], 3)
+        self.assertEqual(facets['group'], {"Букеты": 2, "Одиночные цветы": 1})
+        self.assertEqual(facets['subgroup'], {"Розы": 2, "Хризантемы": 1})
+        self.assertEqual(facets['flags'], {'is_new': 2, 'is_bestseller': 2, 'in_stock': 2})
+        self.assertEqual(facets['colors'], {self.red.id: 2, self.white.id: 2})
+
+    def test_counts_follow_current_filters(self):
+        response = self.client.get(reverse('catalog:catalog'), {'group': "Букеты", 'in_stock': 'on'})
+        facets = response.context['facets']
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual(facets['colors'], {self.red.id: 1})
+        self.assertContains(response, "Букеты (1)")
+
+    def test_json_endpoint(self):
+        data = self.client.get(reverse('catalog:facets'), {'colors': [self.white.id]}).json()
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['colors'], {str(self.red.id): 1, str(self.white.id): 2})
+        self.assertEqual(data['flags']['is_bestseller'], 2)
+
+@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls', CATALOG_PAGE_SIZE=3, CATALOG_MAX_OFFSET_PAGE=2)
+class CatalogPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        image = SimpleUploadedFile('page.jpg', b'', 'image/jpeg')
+        # Цены с повторами: порядок внутри одной цены задаёт id
+        cls.products = [
+            Product.objects.create(name=f"Page {i}", price=100 + i % 4, image=image) for i in range(8)
+        ]
+
+    def names(self, products):
+        return [product.name for product in products]
+
+    def walk(self, params):
+        """Первая страница HTML, дальше — JSON-фрагменты по курсору, как при прокрутке"""
+        response = self.client.get(reverse('catalog:catalog'), params)
+        names = self.names(response.context['products'])
+        cursor = response.context['page']['next_cursor']
+        while cursor:
+            data = self.client.get(reverse('catalog:page'), {**params, 'cursor': cursor}).json()
+            names.extend(re.findall(r'Page \d+', data['html'])[::2])
+            cursor = data['next_cursor']
+        return names
+
+    def test_offset_pages(self):
+        response = self.client.get(reverse('catalog:catalog'), {'page': 2})
+        page = response.context['page']
+        self.assertEqual(self.names(response.context['products']), ["Page 3", "Page 4", "Page 5"])
+        self.assertEqual(page['num_pages'], 3)
+        # Номеров страниц не больше CATALOG_MAX_OFFSET_PAGE, дальше — курсор
+        self.assertEqual(list(page['page_range']), [1, 2])
+        self.assertTrue(page['next_cursor'])
+
+        response = self.client.get(reverse('catalog:catalog'), {'page': 'abc'})
+        self.assertEqual(response.context['page']['number'], 1)
+
+    def test_cursor_walk_matches_ordering(self):
+        expected = {
+            '': [p.name for p in self.products],
+            'price': [p.name for p in sorted(self.products, key=lambda p: (p.price, p.id))],
+            '-price': [p.name for p in sorted(self.products, key=lambda p: (-p.price, -p.id))],
+        }
+        for ordering, names in expected.items():
+            with self.subTest(ordering=ordering):
+                self.assertEqual(self.walk({'ordering': ordering} if ordering else {}), names)
+
+    def test_fragment_endpoint(self):
+        response = self.client.get(reverse('catalog:catalog'), {'ordering': 'price'})
+        cursor = response.context['page']['next_cursor']
+        data = self.client.get(reverse('catalog:page'), {'ordering': 'price', 'cursor': cursor}).json()
+        self.assertEqual(data['count'], 3)
+        self.assertIn('class="card h-100 shadow-sm"', data['html'])
+
+        response = self.client.get(reverse('catalog:page'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_tampered_cursor_values(self):
+        # Значения не подходят к полям ключа: created_at/id, price/id
+        cases = [
+            (reverse('catalog:catalog'), {'cursor': raw_cursor(["abc", "1"])}),
+            (reverse('catalog:page'), {'ordering': 'price', 'cursor': raw_cursor(["2024-01-01T00:00:00", "x"])}),
+            (reverse('catalog:page'), {'ordering': '-price', 'cursor': raw_cursor(["100", "1.5"])}),
+        ]
+        for url, params in cases:
+            with self.subTest(url=url, params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+    def test_search_results_use_page_numbers(self):
+        data = self.client.get(reverse('catalog:page'), {'q': 'page', 'page': 3}).json()
+        self.assertEqual(data['count'], 2)
+        self.assertIsNone(data['next_cursor'])
+        self.assertIsNone(data['next_page'])
+
+        data = self.client.get(reverse('catalog:page'), {'q': 'page'}).json()
+        self.assertEqual(data['next_page'], 2)
+
+@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls')
+class CatalogCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.red = ProductColor.objects.create(name="Красный", css_name="red")
+        image = SimpleUploadedFile('cache.jpg', b'', 'image/jpeg')
+        cls.rose = Product.objects.create(name="Cache Rose", price=100, quantity=5, image=image)
+        cls.tulip = Product.objects.create(name="Cache Tulip", price=200, quantity=0, image=image)
+
+    def setUp(self):
+        caches['catalog'].clear()
+
+    def names(self, params=None):
+        response = self.client.get(reverse('catalog:catalog'), params or {})
+        return [product.name for product in response.context['products']]
+
+    def test_hit_skips_filtering_and_facets(self):
+        self.client.get(reverse('catalog:catalog'), {'in_stock': 'on'})
+        # товары страницы по id, их цвета и варианты фильтра цветов
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('catalog:catalog'), {'in_stock': 'on'})
+        self.assertEqual([p.name for p in response.context['products']], ["Cache Rose"])
+        self.assertEqual(response.context['facets']['total'], 1)
+
+        stats = get_cache_stats()
+        # промахи: фасеты и страница, попадания — они же при повторе
+        self.assertEqual((stats['hits'], stats['misses']), (2, 2))
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_key_ignores_param_order_and_empty_values(self):
+        self.assertEqual(
+            make_cache_key('page', QueryDict('in_stock=on&ordering=&group=Букеты')),
+            make_cache_key('page', QueryDict('group=Букеты&in_stock=on')),
+        )
+        self.assertNotEqual(
+            make_cache_key('page', QueryDict('group=Букеты')),
+            make_cache_key('page', QueryDict('group=Букеты&page=2')),
+        )
+
+    def test_invalidated_by_quantity_change(self):
+        self.assertEqual(self.names({'in_stock': 'on'}), ["Cache Rose"])
+        self.tulip.quantity = 3
+        self.tulip.save(update_fields=['quantity'])
+        self.assertEqual(self.names({'in_stock': 'on'}), ["Cache Rose", "Cache Tulip"])
+
+    def test_invalidated_by_colors_and_delete(self):
+        params = {'colors': [self.red.id]}
+        self.assertEqual(self.names(params), [])
+        self.rose.colors.add(self.red)
+        self.assertEqual(self.names(params), ["Cache Rose"])
+
+        self.assertEqual(self.names(), ["Cache Rose", "Cache Tulip"])
+        self.tulip.delete()
+        self.assertEqual(self.names(), ["Cache Rose"])
+
+    def test_invalidated_by_color_delete(self):
+        self.rose.colors.add(self.red)
+        facets = self.client.get(reverse('catalog:catalog')).context['facets']
+        self.assertEqual(facets['colors'], {self.red.pk: 1})
+        # Связи товаров с цветом удаляются каскадно, без m2m_changed
+        self.red.delete()
+        facets = self.client.get(reverse('catalog:catalog')).context['facets']
+        self.assertEqual(facets['colors'], {})
+
+    def test_stats_command(self):
+        self.names()
+        self.names()
+        out = io.StringIO()
+        call_command('catalog_cache_stats', '--reset', stdout=out)
+        self.assertIn("доля попаданий: 50.0%", out.getvalue())
+        self.assertEqual(get_cache_stats()['hits'], 0)
+
+@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls')
+class CatalogQueryCountTests(TestCase):
+    """Число запросов страницы каталога не зависит от количества товаров"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="counter", password="testpass")
+        cls.colors = [
+            ProductColor.objects.create(name=name, css_name=name) for name in ("red", "white", "pink")
+        ]
+
+    def seed(self, count):
+        products = Product.objects.bulk_create([
+            Product(name=f"Count {i}", price=100 + i, image='products/count.jpg') for i in range(count)
+        ])
+        through = Product.colors.through
+        through.objects.bulk_create([
+            through(product_id=product.pk, productcolor_id=color.pk)
+            for product in products for color in self.colors[:1 + product.pk % 3]
+        ])
+        Favorite.objects.create(user=self.user, product=products[0])
+
+    def assert_constant_queries(self, expected, params=None):
+        for count in (10, 100, 1000):
+            with self.subTest(products=count):
+                Product.objects.all().delete()
+                self.seed(count)
+                # bulk_create не шлёт сигналов, сбрасываем кэш выборок явно;
+                # шапка и карточки отрисовываются заново
+                caches['catalog'].clear()
+                caches['template_fragments'].clear()
+                with self.assertNumQueries(expected):
+                    response = self.client.get(reverse('catalog:catalog'), params or {})
+                self.assertEqual(response.status_code, 200)
+
+    def test_anonymous(self):
+        # фасеты (2), товары, цвета товаров (prefetch), варианты фильтра цветов
+        self.assert_constant_queries(5)
+
+    def test_authenticated(self):
+        self.client.force_login(self.user)
+        # + сессия, пользователь, id избранного и значок корзины в шапке
+        self.assert_constant_queries(9)
+
+    def test_filtered_by_color(self):
+        # + проверка выбранного цвета формой фильтра
+        self.assert_constant_queries(6, {'colors': [self.colors[1].id]})
+
+
+@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls')
+class FavoriteToggleTests(TestCase):
+    """Избранное: JSON-переключатель и закэшированное множество id для карточек"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="hearts", password="x")
+        cls.products = Product.objects.bulk_create([
+            Product(name=f"Heart {i}", price=100 + i, image='products/heart.jpg') for i in range(3)
+        ])
+
+    def setUp(self):
+        caches['catalog'].clear()
+        self.client.force_login(self.user)
+
+    def toggle(self, product_id):
+        return self.client.post(reverse('catalog:toggle_favorite', args=[product_id]))
+
+    def test_toggle_returns_state(self):
+        product = self.products[0]
+        response = self.toggle(product.pk)
+        self.assertEqual(response.json(), {'product_id': product.pk, 'is_favorite': True})
+        self.assertTrue(Favorite.objects.filter(user=self.user, product=product).exists())
+
+        self.assertFalse(self.toggle(product.pk).json()['is_favorite'])
+        self.assertFalse(Favorite.objects.filter(user=self.user).exists())
+
+    def test_errors(self):
+        self.assertEqual(self.toggle(10 ** 9).status_code, 404)
+        self.assertEqual(self.client.get(reverse('catalog:toggle_favorite', args=[self.products[0].pk])).status_code, 405)
+        self.client.logout()
+        self.assertEqual(self.toggle(self.products[0].pk).status_code, 401)
+
+    @override_settings(CACHE_USER_STATE_IN_LOCMEM=True)
+    def test_favorite_ids_cached_and_invalidated(self):
+        Favorite.objects.create(user=self.user, product=self.products[1])
+        self.client.get(reverse('catalog:catalog'))
+        # Повторный показ: товары и цвета по закэшированным id страницы, сессия,
+        # пользователь, варианты цветов фильтра — избранное из кэша
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('catalog:catalog'))
+        self.assertEqual(response.context['favorite_ids'], {self.products[1].pk})
+
+        self.toggle(self.products[2].pk)
+        response = self.client.get(reverse('catalog:catalog'))
+        self.assertEqual(response.context['favorite_ids'], {self.products[1].pk, self.products[2].pk})
+
+        # Удаление со страницы избранного тоже сбрасывает кэш
+        favorite = Favorite.objects.get(user=self.user, product=self.products[1])
+        self.client.get(reverse('catalog:remove_from_favorites', args=[favorite.pk]))
+        response = self.client.get(reverse('catalog:catalog'))
+        self.assertEqual(response.context['favorite_ids'], {self.products[2].pk})
+
+    def test_not_cached_in_process_memory_by_default(self):
+        Favorite.objects.create(user=self.user, product=self.products[0])
+        self.assertEqual(get_favorite_ids(self.user.pk), {self.products[0].pk})
+        self.assertIsNone(caches['catalog'].get(favorites_key(self.user.pk)))
+
+
+@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls')
+class FragmentCacheTests(TestCase):
+    """Карточки каталога кэшируются по версии товара (updated_at)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name="Fragment Rose", price=100)
+        cls.color = ProductColor.objects.create(name="fragment", css_name="crimson")
+
+    def setUp(self):
+        caches['catalog'].clear()
+        caches['template_fragments'].clear()
+
+    def page(self):
+        # Выборка каталога сбрасывается: проверяется только кэш фрагментов
+        caches['catalog'].clear()
+        return self.client.get(reverse('catalog:catalog'))
+
+    def test_card_refreshed_on_save(self):
+        self.assertContains(self.page(), "Fragment Rose")
+        # QuerySet.update() версию не меняет — карточка отдаётся из кэша
+        Product.objects.filter(pk=self.product.pk).update(name="Stale Rose")
+        self.assertContains(self.page(), "Fragment Rose")
+
+        product = Product.objects.get(pk=self.product.pk)
+        product.name = "Fresh Rose"
+        product.save()
+        self.assertContains(self.page(), "Fresh Rose")
+
+    def test_card_refreshed_on_colors_change(self):
+        self.assertNotContains(self.page(), "crimson")
+        self.product.colors.add(self.color)
+        self.assertContains(self.page(), "crimson")
+
+        self.color.css_name = "gold"
+        self.color.save()
+        response = self.page()
+        self.assertContains(response, "gold")
+        self.assertNotContains(response, "crimson")
+
+    def test_card_refreshed_on_color_clear_and_delete(self):
+        self.product.colors.add(self.color)
+        self.assertContains(self.page(), "crimson")
+        # Очистка со стороны цвета: pk_set в m2m_changed пуст
+        self.color.product_set.clear()
+        self.assertNotContains(self.page(), "crimson")
+
+        self.product.colors.add(self.color)
+        self.assertContains(self.page(), "crimson")
+        # Удаление цвета снимает связи каскадно, без m2m_changed
+        self.color.delete()
+        self.assertNotContains(self.page(), "crimson")
+
+    def test_render_timing(self):
+        with collect_render_timings() as timings:
+            self.page()
+        names = [name for name, _ in timings]
+        self.assertIn('catalog/catalog.html', names)
+        self.assertIn('header.html', names)
+        # Время включающее: страница отрисовывается дольше вложенной шапки
+        durations = dict(timings)
+        self.assertGreaterEqual(durations['catalog/catalog.html'], durations['header.html'])
+
+        with self.modify_settings(MIDDLEWARE={'prepend': 'catalog.render_timing.TemplateTimingMiddleware'}):
+            # Новый клиент: цепочка middleware собирается при первом запросе
+            response = self.client_class().get(reverse('catalog:catalog'))
+        self.assertIn('desc="catalog/catalog.html"', response['Server-Timing'])
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "Планы запросов проверяются на SQLite")
+@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls')
+class CatalogQueryPlanTests(TestCase):
+    """Фильтры, сортировки и фасеты каталога идут по индексам товаров"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.bulk_create([
+            Product(name=f"Plan {i}", price=100 + i, group="Букеты", subgroup="Розы",
+                    flower_type="Красные розы", quantity=i % 3, image='products/plan.jpg')
+            for i in range(20)
+        ])
+
+    def setUp(self):
+        caches['catalog'].clear()
+
+    def catalog_plans(self, params):
+        """Планы запросов страницы каталога к таблице товаров: фасеты и выборка страницы"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('catalog:catalog'), params)
+        return [
+            explain(query['sql']) for query in queries.captured_queries
+            if query['sql'].startswith('SELECT "catalog_product".')
+        ]
+
+    def test_facets_read_covering_index(self):
+        facets, _ = self.catalog_plans({'group': "Букеты", 'subgroup': "Розы"})
+        self.assertIn("COVERING INDEX product_classifier_idx (group=? AND subgroup=?)", facets)
+
+    def test_orderings_follow_index(self):
+        for ordering, index in [(None, 'product_created_idx'), ('price', 'product_price_idx'),
+                                ('-price', 'product_price_idx')]:
+            with self.subTest(ordering=ordering):
+                _, page = self.catalog_plans({'ordering': ordering} if ordering else {})
+                self.assertIn(f"INDEX {index}", page)
+                self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", page)
+
+    def test_flower_type_sorted_by_price(self):
+        _, page = self.catalog_plans({'flower_type': "Красные розы", 'ordering': 'price'})
+        self.assertIn("INDEX product_type_price_idx (flower_type=?)", page)
+        self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", page)
+
+
+@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls')
+class ThumbnailTests(TestCase):
+    """Уменьшенные копии фото: имена по хэшу содержимого, создание при загрузке и при показе"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.media_root = tmp.name
+        media = override_settings(MEDIA_ROOT=tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        caches['catalog'].clear()
+
+    def photo(self, name='rose.jpg', size=(2000, 1000), color=(200, 30, 60)):
+        output = io.BytesIO()
+        Image.new('RGB', size, color).save(output, format='JPEG')
+        return SimpleUploadedFile(name, output.getvalue(), content_type='image/jpeg')
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.media_root, name))
+
+    def test_derivatives_created_on_upload(self):
+        upload = self.photo()
+        expected_hash = hashlib.sha256(upload.read()).hexdigest()
+        product = Product.objects.create(name="Thumb", price=100, image=upload)
+        self.assertEqual(product.image_hash, expected_hash)
+
+        for size in ('card', 'detail'):
+            for fmt in ('jpeg', 'webp'):
+                self.assertTrue(self.exists(derivative_name(product.image_hash, size, fmt)))
+        with Image.open(os.path.join(self.media_root, derivative_name(product.image_hash, 'card', 'webp'))) as img:
+            self.assertEqual(img.format, 'WEBP')
+            self.assertEqual(img.size, (600, 300))
+
+    def test_same_content_shares_derivatives(self):
+        first = Product.objects.create(name="First", price=100, image=self.photo('a.jpg'))
+        second = Product.objects.create(name="Second", price=100, image=self.photo('b.jpg'))
+        other = Product.objects.create(name="Other", price=100, image=self.photo('c.jpg', color=(0, 0, 0)))
+        self.assertNotEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image_hash, second.image_hash)
+        self.assertNotEqual(first.image_hash, other.image_hash)
+        files = os.listdir(os.path.join(self.media_root, 'thumbs', first.image_hash[:2]))
+        self.assertEqual(len([f for f in files if f.startswith(first.image_hash[:32])]), 4)
+
+    def test_catalog_page_serves_thumbnails_lazily(self):
+        product = Product.objects.create(name="Lazy", price=100, image=self.photo())
+        # Товар загружен до появления производных: хэша и файлов ещё нет
+        Product.objects.filter(pk=product.pk).update(image_hash='')
+        for name in os.listdir(os.path.join(self.media_root, 'thumbs', product.image_hash[:2])):
+            os.remove(os.path.join(self.media_root, 'thumbs', product.image_hash[:2], name))
+
+        response = self.client.get(reverse('catalog:catalog'))
+        card = derivative_name(product.image_hash, 'card')
+        card_webp = derivative_name(product.image_hash, 'card', 'webp')
+        self.assertContains(response, f'src="/media/{card}"')
+        self.assertContains(response, f'srcset="/media/{card_webp}"')
+        self.assertNotContains(response, product.image.url)
+        self.assertTrue(self.exists(card))
+        self.assertEqual(Product.objects.get(pk=product.pk).image_hash, product.image_hash)
+
+    def test_assigning_stored_file_resets_hash(self):
+        product = Product.objects.create(name="Swap", price=100, image=self.photo())
+        other = Product.objects.create(name="Other", price=100, image=self.photo('b.jpg', color=(0, 0, 0)))
+        product.name = "Swap 2"
+        product.save()
+        self.assertNotEqual(Product.objects.get(pk=product.pk).image_hash, '')
+
+        product.image = other.image.name
+        product.save()
+        self.assertEqual(Product.objects.get(pk=product.pk).image_hash, '')
+        response = self.client.get(reverse('catalog:catalog'))
+        self.assertContains(response, f'src="/media/{derivative_name(other.image_hash, "card")}"', count=2)
+        self.assertEqual(Product.objects.get(pk=product.pk).image_hash, other.image_hash)
+
+    def test_unreadable_image_falls_back_to_original(self):
+        product = Product.objects.create(
+            name="Broken", price=100, image=SimpleUploadedFile('broken.jpg', b'not an image', 'image/jpeg')
+        )
+        response = self.client.get(reverse('catalog:catalog'))
+        self.assertContains(response, f'src="{product.image.url}"')
+
+    def test_prune_command(self):
+        product = Product.objects.create(name="Kept", price=100, image=self.photo())
+        removed = Product.objects.create(name="Removed", price=100, image=self.photo(color=(0, 0, 0)))
+        stale = derivative_name(removed.image_hash, 'card')
+        removed.delete()
+
+        out = io.StringIO()
+        call_command('generate_thumbnails', '--prune', stdout=out)
+        self.assertIn("Удалено лишних копий: 4", out.getvalue())
+        self.assertFalse(self.exists(stale))
+        self.assertTrue(self.exists(derivative_name(product.image_hash, 'card')))
@@ -0,0 +1,137 @@
+"""
+Уменьшенные копии фото товаров для карточек каталога, главной и избранного.
+
+Оригинал загружается как есть, а страницы отдают производные фиксированных
+размеров (settings.THUMBNAIL_SIZES) в JPEG и WebP. Имя производной строится
+из хэша содержимого оригинала, размера и качества:
+
+    thumbs/3f/3fa1c2...-600x600-q82.webp
+
+Поэтому файл по имени никогда не меняется: замена фото даёт новый хэш и
+новые имена, а прежние можно отдавать с долгим Cache-Control. Хэш хранится
+в Product.image_hash и считается при загрузке; производные создаются сразу
+после загрузки (signals.py), а для товаров без них — при первом показе
+(шаблонный тег thumbnail_url).
+"""
+import hashlib
+import logging
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Чем может закончиться чтение и перекодирование присланного файла
+IMAGE_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+
+FORMATS = {
+    'jpeg': ('jpg', 'JPEG', {'progressive': True, 'optimize': True}),
+    'webp': ('webp', 'WEBP', {'method': 4}),
+}
+
+
+def content_hash(file):
+    """sha256 содержимого файла (File или FieldFile), читается кусками"""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def derivative_name(image_hash, size, fmt='jpeg'):
+    """Имя производной в хранилище; size — ключ settings.THUMBNAIL_SIZES"""
+    width, height = settings.THUMBNAIL_SIZES[size]
+    extension = FORMATS[fmt][0]
+    quality = settings.THUMBNAIL_QUALITY[fmt]
+    return posixpath.join(
+        settings.THUMBNAIL_DIR, image_hash[:2], f'{image_hash[:32]}-{width}x{height}-q{quality}.{extension}'
+    )
+
+
+def render_derivative(source, size, fmt='jpeg'):
+    """
+    Уменьшает изображение из файлового объекта source до размеров size
+    с сохранением пропорций (меньшие не увеличиваются). Возвращает байты.
+    """
+    extension, pil_format, options = FORMATS[fmt]
+    with Image.open(source) as img:
+        # Фото с телефонов повёрнуты через EXIF — поворачиваем пиксели
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail(settings.THUMBNAIL_SIZES[size], Image.LANCZOS)
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        output = BytesIO()
+        img.save(output, format=pil_format, quality=settings.THUMBNAIL_QUALITY[fmt], **options)
+    return output.getvalue()
+
+
+def save_derivative(image, image_hash, size, fmt='jpeg', storage=default_storage):
+    """Создаёт производную, если её ещё нет. Возвращает имя в хранилище"""
+    name = derivative_name(image_hash, size, fmt)
+    if storage.exists(name):
+        return name
+    with image.storage.open(image.name, 'rb') as source:
+        data = render_derivative(source, size, fmt)
+    saved = storage.save(name, ContentFile(data))
+    if saved != name:
+        # Ту же производную успел записать параллельный запрос — наша копия лишняя
+        storage.delete(saved)
+    return name
+
+
+def ensure_image_hash(product):
+    """
+    Хэш фото товара; у товаров, загруженных до появления производных,
+    считается по файлу и сохраняется UPDATE-ом без сигналов модели
+    """
+    if not product.image_hash:
+        with product.image.storage.open(product.image.name, 'rb') as source:
+            product.image_hash = content_hash(source)
+        type(product).objects.filter(pk=product.pk).update(image_hash=product.image_hash)
+    return product.image_hash
+
+
+def generate_derivatives(product):
+    """Все размеры и форматы для товара. Возвращает имена производных"""
+    image_hash = ensure_image_hash(product)
+    return [
+        save_derivative(product.image, image_hash, size, fmt)
+        for size in settings.THUMBNAIL_SIZES
+        for fmt in FORMATS
+    ]
+
+
+def thumbnail_url(product, size, fmt='jpeg'):
+    """
+    URL производной фото товара; при первом обращении она создаётся.
+    Если фото не читается (битый или отсутствующий файл), отдаётся оригинал.
+    """
+    if not product.image:
+        return ''
+    try:
+        name = save_derivative(product.image, ensure_image_hash(product), size, fmt)
+    except IMAGE_ERRORS as e:
+        logger.warning(f"Не удалось подготовить {size}/{fmt} для товара {product.pk}: {e}")
+        return product.image.url
+    return default_storage.url(name)
+
+
+def prune_derivatives(image_hashes, storage=default_storage):
+    """Удаляет производные, хэш которых не входит в image_hashes. Возвращает число удалённых"""
+    keep = {image_hash[:32] for image_hash in image_hashes}
+    removed = 0
+    try:
+        directories, _ = storage.listdir(settings.THUMBNAIL_DIR)
+    except FileNotFoundError:
+        return 0
+    for directory in directories:
+        path = posixpath.join(settings.THUMBNAIL_DIR, directory)
+        for filename in storage.listdir(path)[1]:
+            if filename.split('-', 1)[0] not in keep:
+                storage.delete(posixpath.join(path, filename))
+                removed += 1
+    return removed
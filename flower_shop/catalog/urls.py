@@ -1,14 +1,24 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'catalog'
 
+# Под ASGI (settings.ASYNC_VIEWS) — async-версии страницы товара и отзывов
+if settings.ASYNC_VIEWS:
+    product_detail, product_reviews = views.aproduct_detail, views.aproduct_reviews
+else:
+    product_detail, product_reviews = views.product_detail, views.product_reviews
+
 urlpatterns = [
     path('', views.catalog_view, name='catalog'),
+    path('facets/', views.catalog_facets, name='facets'),
+    path('page/', views.catalog_page, name='page'),
     path('favorites/', views.favorite_products, name='favorites'),
     path('add_to_favorites/<int:product_id>/', views.add_to_favorites, name='add_to_favorites'),
+    path('favorites/toggle/<int:product_id>/', views.toggle_favorite, name='toggle_favorite'),
     path('remove_from_favorites/<int:favorite_id>/', views.remove_from_favorites, name='remove_from_favorites'),
-    path('<int:product_id>/', views.product_detail, name='product_detail'),
-    path('<int:product_id>/reviews/', views.product_reviews, name='product_reviews'),
+    path('<int:product_id>/', product_detail, name='product_detail'),
+    path('<int:product_id>/reviews/', product_reviews, name='product_reviews'),
     path('<int:product_id>/add-review/', views.add_review, name='add_review'),
 ]
\ No newline at end of file
@@ -1,37 +1,40 @@
+import functools
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
+from django.views.decorators.http import require_POST
 from .models import Favorite
 from .filters import ProductFilter
-import re
+from .search import filter_by_search
+from .facets import apply_facet_labels, compute_facets
+from .pagination import paginate_catalog
+from . import cache as catalog_cache
+from . import favorites as catalog_favorites
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
+from django.template.loader import render_to_string
 from django.contrib import messages
 
-from django.db.models import Avg
 from .models import Product, Review
 from .forms import ReviewForm
+from .ratings import get_product_rating
 
 # views.py
-def catalog_view(request):
-    # Исходный набор всех товаров
-    queryset = Product.objects.all()
+def _product_filter(request):
+    # Создаем фильтр без начальных значений
+    return ProductFilter(
+        request.GET if request.GET else None,  # Важно для первого открытия
+        queryset=Product.objects.all()
+    )
 
+def _filter_products(request, product_filter):
+    """Общий конвейер каталога: поиск, ProductFilter и «В наличии»"""
     # Применяем поиск
     search_query = request.GET.get('q', '').strip()
     if search_query:
-
-        if '*' in search_query:
-            # Режим wildcard с регулярными выражениями
-            regex_pattern = search_query.replace('*', '.*')
-            regex_pattern = re.escape(regex_pattern).replace(r'\.\*', '.*')
-            queryset = queryset.filter(name__iregex=f'^{regex_pattern}$')
-        else:
-            # Обычный регистронезависимый поиск
-            queryset = queryset.filter(name__icontains=search_query)
-
-    # Создаем фильтр без начальных значений
-    product_filter = ProductFilter(
-        request.GET if request.GET else None,  # Важно для первого открытия
-        queryset=queryset
-    )
+        # Поиск по инвертированному индексу (префиксы, wildcard '*', опечатки),
+        # результаты упорядочены по релевантности
+        product_filter.queryset = filter_by_search(product_filter.queryset, search_query)
 
     # Применяем фильтрацию и сортировку
     filtered_products = product_filter.qs
@@ -40,19 +43,108 @@ def catalog_view(request):
     if request.GET.get('in_stock') == 'on':
         filtered_products = filtered_products.filter(quantity__gt=0)
 
+    return filtered_products
+
+def _lazy_filtered_products(request, product_filter=None):
+    """Отфильтрованный queryset по требованию: при попадании в кэш поиск не выполняется"""
+    return functools.cache(lambda: _filter_products(request, product_filter or _product_filter(request)))
+
+def _filter_params(request):
+    """Параметры фильтров без номера страницы и курсора"""
+    params = request.GET.copy()
+    params.pop('page', None)
+    params.pop('cursor', None)
+    return params
+
+def _page_products(ids):
+    """Товары закэшированной страницы в сохранённом порядке"""
+    products = Product.objects.filter(pk__in=ids).prefetch_related('colors').in_bulk()
+    return [products[pk] for pk in ids if pk in products]
+
+def _catalog_page(request, filtered_products, search_query, kind, total=None):
+    """
+    Страница товаров с цветами и id избранного для карточек. В кэше хранятся
+    только id товаров страницы и параметры продолжения, не HTML.
+    """
+    # Выдача поиска без явной сортировки идёт по релевантности
+    ranked = bool(search_query) and not request.GET.get('ordering')
+    computed = {}
+
+    def compute():
+        page = paginate_catalog(filtered_products().prefetch_related('colors'), request.GET, total, ranked)
+        computed['products'] = page.pop('products')
+        page['ids'] = [product.pk for product in computed['products']]
+        return page
+
+    page = dict(catalog_cache.get_or_compute(kind, request.GET, compute))
+    page['products'] = computed['products'] if computed else _page_products(page['ids'])
+
+    # Избранное — закэшированное множество id пользователя (catalog.favorites)
+    return page, catalog_favorites.request_favorite_ids(request)
+
+def _cached_facets(request, filtered_products):
+    return catalog_cache.get_or_compute(
+        'facets', _filter_params(request), lambda: compute_facets(filtered_products())
+    )
+
+def catalog_view(request):
+    search_query = request.GET.get('q', '').strip()
+    product_filter = _product_filter(request)
+    filtered_products = _lazy_filtered_products(request, product_filter)
+
+    # Счётчики для фасетной навигации — два сгруппированных запроса (или кэш)
+    facets = _cached_facets(request, filtered_products)
+    apply_facet_labels(product_filter.form, facets)
+
     # Проверка активных фильтров
     has_filters = any(
         value for key, value in request.GET.items()
-        if key not in ['q', 'page'] and value
+        if key not in ['q', 'page', 'cursor'] and value
     )
 
+    # На страницу попадает не больше CATALOG_PAGE_SIZE товаров
+    try:
+        page, favorite_ids = _catalog_page(request, filtered_products, search_query, 'page', facets['total'])
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
     return render(request, 'catalog/catalog.html', {
         'filter': product_filter,
-        'products': filtered_products,
+        'products': page['products'],
+        'page': page,
+        'page_query': _filter_params(request).urlencode(),
+        'favorite_ids': favorite_ids,
         'search_query': search_query,
         'has_filters': has_filters,
+        'facets': facets,
     })
 
+def catalog_page(request):
+    """
+    Следующая порция карточек для бесконечной прокрутки: HTML-фрагмент
+    и параметры продолжения (next_cursor или next_page для выдачи поиска).
+    """
+    search_query = request.GET.get('q', '').strip()
+    try:
+        page, favorite_ids = _catalog_page(request, _lazy_filtered_products(request), search_query, 'fragment')
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    html = render_to_string('catalog/product_cards.html', {
+        'products': page['products'],
+        'favorite_ids': favorite_ids,
+    }, request=request)
+    return JsonResponse({
+        'html': html,
+        'count': len(page['products']),
+        'next_cursor': page['next_cursor'],
+        'next_page': page['next_page'],
+    })
+
+def catalog_facets(request):
+    """Фасетные счётчики для текущих параметров каталога в JSON"""
+    return JsonResponse(_cached_facets(request, _lazy_filtered_products(request)))
+
 def favorite_products(request):
     if not request.user.is_authenticated:
         return render(request, 'catalog/favorites.html')
@@ -61,22 +153,33 @@ def favorite_products(request):
 
 @login_required
 def add_to_favorites(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
-
+    # Форма без JavaScript: переключение и возврат на страницу
     if request.method == 'POST':
-        favorite, created = Favorite.objects.get_or_create(
-            user=request.user,
-            product=product
-        )
-
-        if not created:
-            favorite.delete()
-            messages.success(request, "Товар удалён из избранного")
-        else:
+        try:
+            is_favorite = catalog_favorites.toggle_favorite(request.user, product_id)
+        except Product.DoesNotExist:
+            raise Http404("Товар не найден")
+        if is_favorite:
             messages.success(request, "Товар добавлен в избранное")
+        else:
+            messages.success(request, "Товар удалён из избранного")
 
     return redirect(request.META.get('HTTP_REFERER', 'catalog'))
 
+@require_POST
+def toggle_favorite(request, product_id):
+    """
+    Переключает избранное для кнопки-сердечка без перезагрузки каталога:
+    {"product_id": ..., "is_favorite": true|false}
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': "Войдите, чтобы добавлять товары в избранное"}, status=401)
+    try:
+        is_favorite = catalog_favorites.toggle_favorite(request.user, product_id)
+    except Product.DoesNotExist:
+        return JsonResponse({'error': "Товар не найден"}, status=404)
+    return JsonResponse({'product_id': product_id, 'is_favorite': is_favorite})
+
 @login_required
 def remove_from_favorites(request, favorite_id):
     favorite = get_object_or_404(Favorite, id=favorite_id, user=request.user)
@@ -84,9 +187,9 @@ def remove_from_favorites(request, favorite_id):
     return redirect('catalog:favorites')
 
 def product_detail(request, product_id):
-    product = get_object_or_404(Product, pk=product_id)
-    reviews = Review.objects.filter(product=product)
-    avg_rating = reviews.aggregate(Avg('rating'))['rating__avg'] or 0
+    # Сводка рейтинга подтягивается тем же запросом, что и товар
+    product = get_object_or_404(Product.objects.select_related('rating_summary'), pk=product_id)
+    rating = get_product_rating(product)
     user_has_review = False
 
     if request.user.is_authenticated:
@@ -97,8 +200,26 @@ def product_detail(request, product_id):
 
     return render(request, 'catalog/product_detail.html', {
         'product': product,
-        'average_rating': round(avg_rating, 1),
-        'reviews_count': reviews.count(),
+        'average_rating': rating.average,
+        'reviews_count': rating.rating_count,
+        'user_has_review': user_has_review
+    })
+
+async def aproduct_detail(request, product_id):
+    # То же, что product_detail, для ASGI: запросы идут через async ORM,
+    # в поток уходит только отрисовка шаблона
+    product = await aget_object_or_404(Product.objects.select_related('rating_summary'), pk=product_id)
+    rating = get_product_rating(product)
+    user = await request.auser()
+    user_has_review = False
+
+    if user.is_authenticated:
+        user_has_review = await Review.objects.filter(user=user, product=product).aexists()
+
+    return await sync_to_async(render)(request, 'catalog/product_detail.html', {
+        'product': product,
+        'average_rating': rating.average,
+        'reviews_count': rating.rating_count,
         'user_has_review': user_has_review
     })
 
@@ -131,4 +252,13 @@ def product_reviews(request, product_id):
     return render(request, 'catalog/reviews_list.html', {
         'product': product,
         'reviews': reviews
+    })
+
+async def aproduct_reviews(request, product_id):
+    product = await aget_object_or_404(Product, pk=product_id)
+    # Отзывы читаются заранее: шаблон не должен обращаться к БД из цикла событий
+    reviews = [review async for review in Review.objects.filter(product=product).select_related('user')]
+    return await sync_to_async(render)(request, 'catalog/reviews_list.html', {
+        'product': product,
+        'reviews': reviews
     })
\ No newline at end of file
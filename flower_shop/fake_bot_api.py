@@ -0,0 +1,107 @@
+"""
+Локальный поддельный Bot API Telegram для тестов уведомлений.
+
+Поднимает aiohttp-сервер на 127.0.0.1 со случайным портом и отвечает на
+sendMessage / sendPhoto / sendMediaGroup так же, как настоящий API, записывая
+каждый вызов. Бот направляется на него через TelegramAPIServer.from_base(api.url).
+
+    async with FakeBotAPI() as api:
+        bot = api.bot()
+        ...
+        assert api.calls_to('sendMessage')
+"""
+import itertools
+import json
+import time
+
+from aiohttp import web
+from aiohttp.web_request import FileField
+from aiogram import Bot
+from aiogram.bot.api import TelegramAPIServer
+
+TOKEN = '123456:FAKE'
+
+
+class FakeBotAPI:
+    def __init__(self):
+        self.calls = []
+        self.uploads = 0
+        self._failures = {}
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._runner = None
+        self.url = None
+
+    async def __aenter__(self):
+        app = web.Application(client_max_size=50 * 1024 * 1024)
+        app.router.add_post('/bot{token}/{method}', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f'http://127.0.0.1:{port}'
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._runner.cleanup()
+
+    def bot(self):
+        return Bot(token=TOKEN, server=TelegramAPIServer.from_base(self.url))
+
+    def fail(self, method, times=1, status=500, retry_after=None):
+        """Следующие times вызовов method завершатся ошибкой"""
+        self._failures[method] = [times, status, retry_after]
+
+    def calls_to(self, method):
+        return [call for call in self.calls if call['method'] == method]
+
+    async def _handle(self, request):
+        method = request.match_info['method']
+        form = await request.post()
+        fields = {}
+        for name, value in form.items():
+            if isinstance(value, FileField):
+                self.uploads += 1
+                value.file.read()
+                fields[name] = f'attach://{value.filename}'
+            else:
+                fields[name] = value
+        self.calls.append({'method': method, **fields})
+
+        failure = self._failures.get(method)
+        if failure and failure[0] > 0:
+            failure[0] -= 1
+            _, status, retry_after = failure
+            body = {'ok': False, 'error_code': status, 'description': 'Internal Server Error'}
+            if retry_after:
+                body['parameters'] = {'retry_after': retry_after}
+            return web.json_response(body, status=status)
+
+        return web.json_response({'ok': True, 'result': self._result(method, fields)})
+
+    def _message(self, chat_id, **extra):
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id), 'type': 'private'},
+            **extra,
+        }
+
+    def _photo(self, value):
+        # Уже загруженное фото приходит строкой file_id, новое — файлом
+        file_id = value if not str(value).startswith('attach://') else f'photo-{next(self._file_ids)}'
+        return [{'file_id': file_id, 'file_unique_id': file_id, 'width': 100, 'height': 100}]
+
+    def _result(self, method, fields):
+        chat_id = fields.get('chat_id', 0)
+        if method == 'sendMessage':
+            return self._message(chat_id, text=fields.get('text', ''))
+        if method == 'sendPhoto':
+            return self._message(chat_id, photo=self._photo(fields['photo']))
+        if method == 'sendMediaGroup':
+            return [
+                self._message(chat_id, photo=self._photo(media['media']), caption=media.get('caption'))
+                for media in json.loads(fields['media'])
+            ]
+        return True
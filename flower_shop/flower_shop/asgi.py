@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'flower_shop.settings')
+# Под ASGI-сервером маршруты читающих страниц ведут на async-представления
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -62,19 +62,36 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Замер времени отрисовки шаблонов (catalog.render_timing): заголовок
+# Server-Timing и журнал catalog.render_timing. Включается TEMPLATE_TIMING=1
+TEMPLATE_TIMING = os.getenv('TEMPLATE_TIMING', '0') == '1'
+if TEMPLATE_TIMING:
+    MIDDLEWARE.insert(0, 'catalog.render_timing.TemplateTimingMiddleware')
+
 ROOT_URLCONF = 'flower_shop.urls'
 
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                # Значки шапки: версия корзины и число избранных — ключ кэша header.html
+                'orders.context_processors.cart_badge',
+                'catalog.context_processors.favorites_badge',
+            ],
+            # Шаблоны компилируются один раз на процесс. Django включает cached.Loader
+            # и сам, пока loaders не заданы, — здесь он явный, чтобы не пропал при
+            # правке настроек; при DEBUG автоперезагрузка сбрасывает его после правки шаблона
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
             ],
         },
     },
@@ -85,13 +102,103 @@ WSGI_APPLICATION = 'flower_shop.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# База выбирается окружением: DB_ENGINE=postgresql — PostgreSQL (DB_NAME,
+# DB_USER, DB_PASSWORD, DB_HOST, DB_PORT), иначе файл SQLite (SQLITE_PATH)
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite3')
+
+# PRAGMA для каждого нового соединения SQLite. WAL: чтения не ждут запись,
+# а запись — чтения. synchronous=NORMAL в режиме WAL не портит базу при сбое,
+# теряются лишь последние транзакции при отключении питания. mmap_size —
+# страницы читаются из отображённого в память файла без копирования
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': {
+            # Транзакция сразу берёт блокировку записи и ждёт её до timeout секунд
+            # (busy timeout), иначе параллельные оформления заказов падают
+            # с «database is locked»
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 20)),
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        },
     }
 }
 
+if DB_ENGINE == 'postgresql':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('DB_NAME', 'flower_shop'),
+        'USER': os.getenv('DB_USER', 'flower_shop'),
+        'PASSWORD': os.getenv('DB_PASSWORD', ''),
+        'HOST': os.getenv('DB_HOST', 'localhost'),
+        'PORT': os.getenv('DB_PORT', '5432'),
+        # Соединение переживает запрос и переиспользуется потоком до CONN_MAX_AGE
+        # секунд; перед повторным использованием оно проверяется
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+    # DB_POOL=psycopg — пул соединений в процессе (нужен psycopg 3, не psycopg2);
+    # DB_POOL=pgbouncer — внешний PgBouncer в режиме transaction
+    DB_POOL = os.getenv('DB_POOL', '')
+    if DB_POOL == 'psycopg':
+        # С пулом Django не держит соединения сам: CONN_MAX_AGE обязан быть 0
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        }
+    elif DB_POOL == 'pgbouncer':
+        # Серверные курсоры iterator() не переживают смену соединения между транзакциями
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Кэш. Отдельный псевдоним 'catalog' — для результатов выборок каталога.
+# В продакшене — Redis (CATALOG_CACHE_URL=redis://...), иначе память процесса;
+# LocMemCache при переполнении MAX_ENTRIES вытесняет давно не читанные записи (LRU)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+        'TIMEOUT': int(os.getenv('CATALOG_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+# Фрагменты шаблонов: {% cache %} берёт псевдоним 'template_fragments' сам.
+# Шапка, подвал и карточки каталога; здесь же версии корзин (orders.badges)
+CACHES['template_fragments'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'template_fragments',
+    'OPTIONS': {'MAX_ENTRIES': 10000},
+}
+if os.getenv('CATALOG_CACHE_URL'):
+    CACHES['catalog'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CATALOG_CACHE_URL'),
+        'TIMEOUT': int(os.getenv('CATALOG_CACHE_TIMEOUT', 300)),
+        'KEY_PREFIX': 'flower_shop',
+    }
+    CACHES['template_fragments'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CATALOG_CACHE_URL'),
+        'KEY_PREFIX': 'flower_shop:fragments',
+    }
+# Состояние пользователя (избранное, версия корзины) кэшируется только
+# в общем кэше: число процессов сервера (gunicorn -w 4) отсюда не видно.
+# В памяти процесса — лишь по явному согласию, когда запросы обслуживает
+# один процесс (runserver, один воркер): CACHE_USER_STATE_IN_LOCMEM=1
+CACHE_USER_STATE_IN_LOCMEM = os.getenv('CACHE_USER_STATE_IN_LOCMEM', '0') == '1'
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -138,11 +245,56 @@ DATETIME_FORMAT = 'd.m.Y H:i'
 DATE_FORMAT = 'd.m.Y'
 TIME_FORMAT = 'H:i'
 
+# Отзывы на главной: размер страницы /reviews/ и чанк потоковой выдачи
+REVIEWS_PAGE_SIZE = int(os.getenv('REVIEWS_PAGE_SIZE', 20))
+REVIEWS_MAX_PAGE_SIZE = 100
+REVIEWS_STREAM_CHUNK_SIZE = 2000
+
+# Async-версии читающих страниц (главная, товар, отзывы). Включает asgi.py:
+# под WSGI async-представление обходится дороже синхронного
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', '0') == '1'
+
+# Сколько секунд держится резерв остатков под корзину на странице оформления
+STOCK_RESERVATION_TIMEOUT = int(os.getenv('STOCK_RESERVATION_TIMEOUT', 15 * 60))
+
+# Каталог: товаров на странице и сколько первых страниц листается по номеру (OFFSET)
+CATALOG_PAGE_SIZE = int(os.getenv('CATALOG_PAGE_SIZE', 24))
+CATALOG_MAX_OFFSET_PAGE = 10
+
 #load_dotenv()
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_ADMIN_CHAT_ID = os.getenv("TELEGRAM_ADMIN_CHAT_ID")
 TELEGRAM_ADMIN_CHAT_IDS = os.getenv('TELEGRAM_ADMIN_CHAT_IDS', '').split(',')
+TELEGRAM_API_SERVER = os.getenv('TELEGRAM_API_SERVER')
+# Заказов на странице команды /orders
+BOT_ORDERS_PAGE_SIZE = int(os.getenv('BOT_ORDERS_PAGE_SIZE', 5))
+
+# Очередь уведомлений: повторы с экспоненциальной задержкой (секунды)
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv('NOTIFICATION_MAX_ATTEMPTS', 8))
+NOTIFICATION_BACKOFF_BASE = 5
+NOTIFICATION_BACKOFF_MAX = 60 * 60
+# Сколько секунд строка очереди закреплена за взявшим её обработчиком
+NOTIFICATION_LEASE = 5 * 60
+
+# Уменьшенные копии фото товаров (catalog.thumbnails): размеры вписывания
+# для тегов шаблонов, каталог в MEDIA_ROOT и качество сжатия по форматам
+THUMBNAIL_SIZES = {
+    'card': (600, 600),
+    'detail': (1200, 1200),
+}
+THUMBNAIL_DIR = 'thumbs'
+THUMBNAIL_QUALITY = {'jpeg': 82, 'webp': 80}
+
+# Кэш фотографий с подписями для уведомлений (bot.add_caption_to_image)
+CAPTION_CACHE_DIR = os.getenv('CAPTION_CACHE_DIR', os.path.join(MEDIA_ROOT, 'cache', 'captions'))
+CAPTION_CACHE_MAX_BYTES = int(os.getenv('CAPTION_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+# Отрисовка подписей: 'process' — пул процессов, 'thread' — пул потоков
+CAPTION_RENDER_EXECUTOR = os.getenv('CAPTION_RENDER_EXECUTOR', 'process')
+CAPTION_RENDER_WORKERS = int(os.getenv('CAPTION_RENDER_WORKERS', 2))
+# Сколько фото отрисовывается одновременно и сколько секунд ждать одно
+CAPTION_RENDER_CONCURRENCY = int(os.getenv('CAPTION_RENDER_CONCURRENCY', 4))
+CAPTION_RENDER_TIMEOUT = float(os.getenv('CAPTION_RENDER_TIMEOUT', 30))
 
 if 'test' in sys.argv:
     DATABASES = {
@@ -25,11 +25,15 @@ from .views import home, get_reviews
 
 from .views import main_page
 
+# Под ASGI (settings.ASYNC_VIEWS) — async-версии тех же страниц
+if settings.ASYNC_VIEWS:
+    home, get_reviews = views.ahome, views.aget_reviews
+
 urlpatterns = [
     path('admin/', admin.site.urls),
 
     # Главная страница (home.html)
-    path('', views.home, name='home'),
+    path('', home, name='home'),
 
     # Отдельные маршруты для header и footer (опционально)
     path('header/', TemplateView.as_view(template_name='header.html'), name='header'),
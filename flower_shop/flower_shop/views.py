@@ -1,11 +1,13 @@
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
+import json
 import requests
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
-from django.db.models import Count
-from django.db.models import Avg
 from catalog.models import Review
+from catalog.pagination import akeyset_page, keyset_page
+from catalog.ratings import aget_global_rating, get_global_rating
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
 from catalog.models import Product  # Импортируйте вашу модель продукта
 
@@ -71,36 +73,113 @@ def home(request):
     # Получаем новинки (продукты с is_new=True)
     new_products = Product.objects.filter(is_new=True)
 
-    # Основная статистика
-    reviews_stats = Review.objects.aggregate(
-        avg_rating=Avg('rating'),
-        total=Count('id')
-    )
+    # Основная статистика из денормализованной сводки (без агрегации по отзывам)
+    rating = get_global_rating()
 
     context = {
         'new_products': new_products,
-        'average_rating': round(reviews_stats['avg_rating'] or 0, 1),
-        'reviews_count': reviews_stats['total']
+        'average_rating': rating.average,
+        'reviews_count': rating.rating_count
     }
     return render(request, 'home.html', context)
 
 
+async def ahome(request):
+    # home для ASGI: новинки и сводка читаются через async ORM до отрисовки
+    new_products = [product async for product in Product.objects.filter(is_new=True)]
+    rating = await aget_global_rating()
+
+    context = {
+        'new_products': new_products,
+        'average_rating': rating.average,
+        'reviews_count': rating.rating_count
+    }
+    return await sync_to_async(render)(request, 'home.html', context)
+
+
+REVIEW_ORDERING = ('-created_at', '-id')
+REVIEW_FIELDS = ('id', 'created_at', 'text', 'rating', 'user__username', 'product__name')
+
+
+def _serialize_review(row):
+    return {
+        'user': row['user__username'],
+        'product': row['product__name'],
+        'text': row['text'],
+        'rating': row['rating'],
+        'date': row['created_at'].strftime("%d.%m.%Y %H:%M")
+    }
+
+
+def _stream_reviews(rows):
+    # Массив отдаётся по частям: в памяти держится только текущий чанк строк
+    yield '{"reviews": ['
+    for index, row in enumerate(rows):
+        yield (',' if index else '') + json.dumps(_serialize_review(row))
+    yield ']}'
+
+
+async def _astream_reviews(rows):
+    yield '{"reviews": ['
+    index = 0
+    async for row in rows:
+        yield (',' if index else '') + json.dumps(_serialize_review(row))
+        index += 1
+    yield ']}'
+
+
 def get_reviews(request):
-    # Получаем все отзывы с оптимизацией запросов
-    reviews = Review.objects.select_related('user', 'product').all().order_by('-created_at')
-
-    # Сериализуем данные
-    reviews_data = []
-    for review in reviews:
-        reviews_data.append({
-            'user': review.user.username,
-            'product': review.product.name,
-            'text': review.text,
-            'rating': review.rating,
-            'date': review.created_at.strftime("%d.%m.%Y %H:%M")
-        })
-
-    return JsonResponse({'reviews': reviews_data})
+    # Выбираем только нужные колонки: values() вместо целых объектов Review/User/Product
+    reviews = Review.objects.values(*REVIEW_FIELDS)
+
+    if request.GET.get('stream') in ('1', 'true'):
+        rows = reviews.order_by(*REVIEW_ORDERING).iterator(chunk_size=settings.REVIEWS_STREAM_CHUNK_SIZE)
+        return StreamingHttpResponse(_stream_reviews(rows), content_type='application/json')
+
+    try:
+        limit = int(request.GET.get('limit', settings.REVIEWS_PAGE_SIZE))
+        if limit < 1:
+            raise ValueError
+        page, next_cursor = keyset_page(
+            reviews,
+            REVIEW_ORDERING,
+            cursor=request.GET.get('cursor'),
+            limit=min(limit, settings.REVIEWS_MAX_PAGE_SIZE)
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Некорректные параметры limit или cursor'}, status=400)
+
+    return JsonResponse({
+        'reviews': [_serialize_review(row) for row in page],
+        'next_cursor': next_cursor
+    })
+
+
+async def aget_reviews(request):
+    # get_reviews для ASGI: страница и поток читаются через async ORM
+    reviews = Review.objects.values(*REVIEW_FIELDS)
+
+    if request.GET.get('stream') in ('1', 'true'):
+        rows = reviews.order_by(*REVIEW_ORDERING).aiterator(chunk_size=settings.REVIEWS_STREAM_CHUNK_SIZE)
+        return StreamingHttpResponse(_astream_reviews(rows), content_type='application/json')
+
+    try:
+        limit = int(request.GET.get('limit', settings.REVIEWS_PAGE_SIZE))
+        if limit < 1:
+            raise ValueError
+        page, next_cursor = await akeyset_page(
+            reviews,
+            REVIEW_ORDERING,
+            cursor=request.GET.get('cursor'),
+            limit=min(limit, settings.REVIEWS_MAX_PAGE_SIZE)
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Некорректные параметры limit или cursor'}, status=400)
+
+    return JsonResponse({
+        'reviews': [_serialize_review(row) for row in page],
+        'next_cursor': next_cursor
+    })
 
 def main_page(request):
     # Получаем новинки (продукты с is_new=True)
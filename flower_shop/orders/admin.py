@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Order, Cart, CartItem, DeliveryCity
+from .models import Order, Cart, CartItem, DeliveryCity, StockReservation, NotificationOutbox
+from .badges import bump_cart_version
 
 class CartInline(admin.TabularInline):
     model = CartItem
@@ -56,8 +57,32 @@ class CartAdmin(admin.ModelAdmin):
     inlines = [CartInline]
     raw_id_fields = ('user',)
 
+    def get_queryset(self, request):
+        # Суммы корзин считаются в запросе списка, а не по запросу на строку
+        return super().get_queryset(request).select_related('user').with_totals()
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Строки корзины правятся инлайном — значок в шапке владельца устарел
+        bump_cart_version(form.instance.user_id)
+
 @admin.register(DeliveryCity)
 class DeliveryCityAdmin(admin.ModelAdmin):
     list_display = ('name', 'is_available')
     list_editable = ('is_available',)
-    search_fields = ('name',)
\ No newline at end of file
+    search_fields = ('name',)
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('cart', 'product', 'quantity', 'created_at', 'expires_at')
+    list_filter = ('expires_at',)
+    raw_id_fields = ('cart', 'product')
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('order', 'chat_id', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('order__id', 'chat_id')
+    raw_id_fields = ('order',)
+    readonly_fields = ('last_error', 'created_at', 'sent_at')
@@ -0,0 +1,60 @@
+"""
+Значок корзины в шапке сайта.
+
+Шапка кэшируется фрагментом (header.html) с ключом по пользователю и версии
+его корзины. Версия хранится в кэше фрагментов и меняется представлениями
+orders.views при каждом изменении строк корзины, поэтому при попадании в кэш
+число товаров не считается вовсе, а при промахе — одним запросом. Версия
+работает только в общем для процессов кэше (context_processors.cart_badge).
+"""
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+from .models import CartItem
+
+# Псевдоним, который тег {% cache %} использует по умолчанию
+FRAGMENT_CACHE_ALIAS = 'template_fragments'
+
+
+def cart_version_key(user_id):
+    return f'fragments:cart:{user_id}'
+
+
+def get_cart_version(user_id):
+    """Версия корзины пользователя; как и версия каталога, начинается со времени"""
+    cache = caches[FRAGMENT_CACHE_ALIAS]
+    key = cart_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(key):
+    cache = caches[FRAGMENT_CACHE_ALIAS]
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def bump_cart_version(user_id):
+    """
+    Сбрасывает закэшированную шапку пользователя. Повторно — после коммита:
+    параллельный запрос мог отрисовать шапку по ещё не закоммиченной корзине.
+    """
+    key = cart_version_key(user_id)
+    _bump(key)
+    transaction.on_commit(lambda: _bump(key))
+
+
+def cart_items_count(user_id):
+    """Число единиц товара в корзине пользователя"""
+    return CartItem.objects.filter(cart__user_id=user_id).aggregate(
+        count=Coalesce(Sum('quantity'), 0)
+    )['count']
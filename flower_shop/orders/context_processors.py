@@ -0,0 +1,22 @@
+from catalog.cache import caches_user_state
+
+from .badges import FRAGMENT_CACHE_ALIAS, cart_items_count, get_cart_version
+
+
+def cart_badge(request):
+    """
+    Версия корзины — часть ключа кэша шапки. Число товаров отдаётся функцией:
+    шаблон вызовет её, только если шапки нет в кэше. В кэше фрагментов,
+    своём у каждого процесса, версию, поднятую в одном, другие не увидят —
+    тогда ключом служит само число товаров (catalog.cache.caches_user_state).
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {'cart_badge_version': 0, 'cart_items_count': 0}
+    if not caches_user_state(FRAGMENT_CACHE_ALIAS):
+        count = cart_items_count(user.pk)
+        return {'cart_badge_version': f'count:{count}', 'cart_items_count': count}
+    return {
+        'cart_badge_version': get_cart_version(user.pk),
+        'cart_items_count': lambda: cart_items_count(user.pk),
+    }
@@ -3,4 +3,14 @@ from rest_framework.exceptions import APIException
 class SkipError(APIException):
     status_code = 400
     default_detail = 'Операция была пропущена'
-    default_code = 'skip_error'
\ No newline at end of file
+    default_code = 'skip_error'
+
+class OutOfStockError(Exception):
+    """
+    Остатков не хватило хотя бы на одну строку заказа. items — список
+    {'name', 'available', 'requested'} по товарам, которых не хватило.
+    """
+
+    def __init__(self, items):
+        self.items = items
+        super().__init__(", ".join(f"{item['name']}: {item['available']} из {item['requested']}" for item in items))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from orders.stock import release_expired
+
+
+class Command(BaseCommand):
+    help = "Снимает истёкшие резервы остатков и возвращает товар на склад (запускать по cron)"
+
+    def handle(self, *args, **options):
+        released = release_expired()
+        self.stdout.write(self.style.SUCCESS(f"Снято резервов: {released}"))
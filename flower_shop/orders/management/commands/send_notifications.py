@@ -0,0 +1,27 @@
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+
+from orders.notifications import run_worker
+
+
+class Command(BaseCommand):
+    help = "Отправляет уведомления о заказах из очереди в Telegram (с повторами)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Отправить всё, что подошло, и завершиться")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Пауза между проверками очереди, секунд")
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help="Сколько заказов отправляется одновременно")
+
+    def handle(self, *args, **options):
+        # async_to_sync, а не asyncio.run: запросы к БД идут в потоке команды
+        processed = async_to_sync(run_worker)(
+            poll_interval=options['poll_interval'],
+            batch_size=options['batch_size'],
+            concurrency=options['concurrency'],
+            once=options['once'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Обработано уведомлений: {processed}"))
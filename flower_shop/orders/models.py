@@ -1,7 +1,10 @@
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
-from django.db.models import Case, When, F, Count, Sum, IntegerField
+from django.db.models import Case, When, F, Count, Sum, IntegerField, Q
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
+from decimal import Decimal
 from datetime import datetime, timedelta
 
 class OrderManager(models.Manager):
@@ -38,6 +41,70 @@ class OrderManager(models.Manager):
 
         return stats
 
+    def get_periods_stats(self, periods):
+        """
+        Статистика сразу по нескольким периодам одним запросом.
+        periods — {имя: (начало, конец)}, границы включительно; результат —
+        {имя: словарь как у get_period_stats}.
+
+        Периоды пересекаются (день внутри недели, неделя внутри месяца...), поэтому
+        ось времени режется их границами на непересекающиеся отрезки: запрос
+        группирует заказы по номеру отрезка (один CASE на строку) и считает
+        четыре агрегата на отрезок, а суммы по периодам собираются из отрезков.
+        Это дешевле, чем по четыре условных агрегата на каждый период в каждой строке.
+        """
+        if not periods:
+            return {}
+
+        # Точки разреза: «раньше начала» (lt) и «не позже конца» (lte). При
+        # одинаковом времени lt идёт первым, тогда условия по порядку монотонны
+        cuts = sorted(
+            {(start, 'lt') for start, _ in periods.values()} |
+            {(end, 'lte') for _, end in periods.values()},
+            key=lambda cut: (cut[0], cut[1] == 'lte')
+        )
+        position = {cut: index for index, cut in enumerate(cuts)}
+        segment = Case(
+            *[When(**{f'order_date__{op}': value}, then=index) for index, (value, op) in enumerate(cuts)],
+            default=len(cuts),
+            output_field=IntegerField()
+        )
+
+        rows = self.filter(
+            order_date__gte=cuts[0][0],
+            order_date__lte=cuts[-1][0]
+        ).exclude(status="canceled").annotate(segment=segment).values('segment').annotate(
+            total_orders=Count('id'),
+            total_amount=Sum('total_price'),
+            delivered_total=Count('id', filter=Q(status='delivered')),
+            delivered_on_time=Count(
+                'id', filter=Q(status='delivered', delivered_date__lte=F('delivery_date'))
+            ),
+        ).order_by()
+        segments = {row.pop('segment'): row for row in rows}
+
+        result = {}
+        for name, (start_date, end_date) in periods.items():
+            # Период — отрезки после разреза по началу и до разреза по концу включительно
+            inside = [
+                segments[index]
+                for index in range(position[(start_date, 'lt')] + 1, position[(end_date, 'lte')] + 1)
+                if index in segments
+            ]
+            stats = {
+                'total_orders': sum(row['total_orders'] for row in inside),
+                'total_amount': sum(row['total_amount'] for row in inside) if inside else None,
+                'delivered_total': sum(row['delivered_total'] for row in inside),
+                'delivered_on_time': sum(row['delivered_on_time'] for row in inside),
+            }
+            # Расчет среднего чека
+            if stats['total_orders'] > 0 and stats['total_amount']:
+                stats['avg_check'] = stats['total_amount'] / stats['total_orders']
+            else:
+                stats['avg_check'] = 0
+            result[name] = stats
+        return result
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ("ordered", "Заказано"),
@@ -89,6 +156,19 @@ class Order(models.Model):
 
     class Meta:
         app_label = 'orders'  # Явное указание app_lab
+        indexes = [
+            # История заказов пользователя: filter(user=...).order_by('-order_date')
+            models.Index(fields=['user', '-order_date'], name='order_user_date_idx'),
+            # Статистика и дневная сводка: диапазон order_date без отменённых
+            models.Index(fields=['order_date', 'status'], name='order_date_status_idx'),
+            # /orders в боте: активные заказы от новых к старым. Частичный индекс
+            # не хранит доставленные и отменённые — основную часть истории
+            models.Index(
+                fields=['-order_date', '-id'],
+                name='order_active_date_idx',
+                condition=~models.Q(status__in=['delivered', 'canceled']),
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         status_date_map = {
@@ -108,7 +188,8 @@ class Order(models.Model):
     objects = OrderManager()
 
     @classmethod
-    def get_stats(cls):
+    def stats_periods(cls):
+        """Периоды статистики: {имя: (начало, конец)}"""
         now = timezone.localtime()
         today = now.date()
         tz = timezone.get_current_timezone()
@@ -169,30 +250,49 @@ class Order(models.Model):
         )
 
         return {
-            'today': cls.objects.get_period_stats(
+            'today': (
                 now.replace(hour=0, minute=0, second=0, microsecond=0),
                 now.replace(hour=23, minute=59, second=59, microsecond=999999)
             ),
-            'week': cls.objects.get_period_stats(start_week, end_week),
-            'month': cls.objects.get_period_stats(start_month, end_month),
-            'year': cls.objects.get_period_stats(start_year, end_year),
-            'last_year_week': cls.objects.get_period_stats(
-                last_year_week_start,
-                last_year_week_end
-            ),
-            'last_year_month': cls.objects.get_period_stats(
-                last_year_month_start,
-                last_year_month_end
-            ),
-            'last_year': cls.objects.get_period_stats(
-                last_year_start,
-                last_year_end
-            )
+            'week': (start_week, end_week),
+            'month': (start_month, end_month),
+            'year': (start_year, end_year),
+            'last_year_week': (last_year_week_start, last_year_week_end),
+            'last_year_month': (last_year_month_start, last_year_month_end),
+            'last_year': (last_year_start, last_year_end),
         }
 
+    @classmethod
+    def get_stats(cls):
+        """Статистика для /stats и админки: все семь периодов одним запросом"""
+        return cls.objects.get_periods_stats(cls.stats_periods())
+
     def __str__(self):
         return f"Заказ #{self.id}"
 
+def cart_totals(prefix=''):
+    """
+    Агрегаты корзины: сумма (количество × цена товара) и число единиц.
+    prefix — путь к строкам корзины: 'cartitem__' при аннотации корзин
+    """
+    return {
+        'total_price': Coalesce(Sum(F(f'{prefix}quantity') * F(f'{prefix}product__price')), Decimal('0')),
+        'total_items': Coalesce(Sum(f'{prefix}quantity'), 0),
+    }
+
+
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Корзины с суммой и числом товаров, посчитанными в том же запросе
+        (для списков, например changelist админки): total_price() и
+        total_items() таких корзин запросов не делают
+        """
+        return self.annotate(**{
+            f'annotated_{name}': expression for name, expression in cart_totals('cartitem__').items()
+        })
+
+
 class Cart(models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
@@ -209,11 +309,24 @@ class Cart(models.Model):
         verbose_name="Дата создания"
     )
 
+    objects = CartQuerySet.as_manager()
+
+    @cached_property
+    def totals(self):
+        """
+        {'total_price', 'total_items'} одним агрегирующим запросом (или из
+        аннотаций with_totals()). Запоминается на объекте: повторные вызовы в
+        рамках запроса бесплатны. После изменения строк — del cart.totals
+        """
+        if hasattr(self, 'annotated_total_price'):
+            return {'total_price': self.annotated_total_price, 'total_items': self.annotated_total_items}
+        return self.cartitem_set.aggregate(**cart_totals())
+
     def total_price(self):
-        return sum(item.product.price * item.quantity for item in self.cartitem_set.all())
+        return self.totals['total_price']
 
     def total_items(self):
-        return sum(item.quantity for item in self.cartitem_set.all())
+        return self.totals['total_items']
 
     def __str__(self):
         return f"Корзина {self.user.username}"
@@ -273,4 +386,77 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
 
     def __str__(self):
-        return f"{self.product.name} x{self.quantity} (Order #{self.cart.id})"  # Используем self.cart.id
\ No newline at end of file
+        return f"{self.product.name} x{self.quantity} (Order #{self.cart.id})"  # Используем self.cart.id
+
+class StockReservation(models.Model):
+    """
+    Остаток, снятый со склада под корзину на время оформления заказа.
+    Product.quantity уже уменьшен на quantity; по истечении expires_at
+    резерв снимается и остаток возвращается (orders.stock.release_expired).
+    """
+    cart = models.ForeignKey(
+        Cart,
+        on_delete=models.CASCADE,
+        related_name='reservations',
+        verbose_name="Корзина"
+    )
+    product = models.ForeignKey(
+        'catalog.Product',
+        on_delete=models.CASCADE,
+        verbose_name="Товар"
+    )
+    quantity = models.PositiveIntegerField(verbose_name="Количество")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создан")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Истекает")
+
+    class Meta:
+        verbose_name = "Резерв товара"
+        verbose_name_plural = "Резервы товаров"
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product_reservation')
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} x{self.quantity} (корзина #{self.cart_id})"
+
+
+class NotificationOutbox(models.Model):
+    """
+    Уведомление о заказе для одного чата администраторов. Пишется в транзакции
+    оформления заказа и отправляется отдельным процессом (manage.py send_notifications),
+    поэтому оформление не ждёт Telegram, а уведомление не теряется при сбое.
+    """
+    STATUS_CHOICES = [
+        ("pending", "Ожидает отправки"),
+        ("sent", "Отправлено"),
+        ("failed", "Не отправлено"),
+    ]
+
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='notifications',
+        verbose_name="Заказ"
+    )
+    chat_id = models.CharField(max_length=64, verbose_name="Чат")
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default="pending",
+        verbose_name="Статус"
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Следующая попытка")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Отправлено")
+
+    class Meta:
+        verbose_name = "Уведомление"
+        verbose_name_plural = "Очередь уведомлений"
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Заказ #{self.order_id} → {self.chat_id} ({self.status})"
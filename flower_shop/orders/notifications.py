@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import random
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .models import NotificationOutbox, Order
+from .snapshots import load_order_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_order_notification(order):
+    """
+    Ставит уведомление о новом заказе в очередь — по строке на каждый чат
+    администраторов. Вызывается в транзакции оформления: строки появятся
+    только вместе с заказом.
+    """
+    NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(order=order, chat_id=chat_id.strip())
+        for chat_id in settings.TELEGRAM_ADMIN_CHAT_IDS
+        if chat_id.strip()
+    ])
+
+
+def backoff(attempts):
+    """Задержка перед следующей попыткой: экспонента от числа попыток со случайным разбросом"""
+    delay = min(settings.NOTIFICATION_BACKOFF_MAX, settings.NOTIFICATION_BACKOFF_BASE * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def claim_due(limit=50, now=None):
+    """
+    Забирает до limit строк, время которых подошло. Строка закрепляется за
+    обработчиком сдвигом next_attempt_at на NOTIFICATION_LEASE: условный UPDATE
+    по старому значению выигрывает только один из параллельных обработчиков,
+    а если обработчик упал, строка вернётся в работу по истечении аренды.
+    """
+    now = now or timezone.now()
+    lease_until = now + timedelta(seconds=settings.NOTIFICATION_LEASE)
+    due = (
+        NotificationOutbox.objects
+        .filter(status='pending', next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'id')
+        .values_list('id', 'next_attempt_at')[:limit]
+    )
+    claimed = [
+        pk for pk, next_attempt_at in due
+        if NotificationOutbox.objects.filter(pk=pk, next_attempt_at=next_attempt_at)
+        .update(next_attempt_at=lease_until)
+    ]
+    return list(NotificationOutbox.objects.filter(pk__in=claimed).order_by('id'))
+
+
+def mark_sent(notification):
+    notification.status = 'sent'
+    notification.sent_at = timezone.now()
+    notification.attempts += 1
+    notification.last_error = ''
+    notification.save(update_fields=['status', 'sent_at', 'attempts', 'last_error'])
+
+
+def mark_failed(notification, error, retry_after=None):
+    """Планирует повтор; после NOTIFICATION_MAX_ATTEMPTS попыток строка помечается failed"""
+    notification.attempts += 1
+    notification.last_error = str(error)[:2000]
+    if notification.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+        notification.status = 'failed'
+        logger.error(f"Уведомление {notification.pk} не отправлено после {notification.attempts} попыток: {error}")
+    else:
+        delay = timedelta(seconds=retry_after) if retry_after else backoff(notification.attempts)
+        notification.next_attempt_at = timezone.now() + delay
+    notification.save(update_fields=['status', 'attempts', 'last_error', 'next_attempt_at'])
+
+
+async def deliver_order(order_id, notifications):
+    """
+    Отправляет уведомления одного заказа в их чаты; каждая строка завершается
+    отдельно. Текст и фото готовятся один раз, фото загружаются в Telegram один
+    раз — следующим чатам уходят полученные file_id.
+    """
+    from aiogram.utils.exceptions import RetryAfter
+    from bot import prepare_order_notification, send_prepared_notification
+
+    # Заказ, клиент и строки с товарами — одним переходом в поток
+    snapshot = await sync_to_async(load_order_snapshot)(order_id)
+    prepared = await prepare_order_notification(snapshot)
+    for notification in notifications:
+        try:
+            await send_prepared_notification(prepared, notification.chat_id)
+        except Exception as e:
+            # При RetryAfter Telegram сам сообщает, сколько ждать
+            retry_after = e.timeout if isinstance(e, RetryAfter) else None
+            await sync_to_async(mark_failed)(notification, e, retry_after)
+            logger.warning(f"Ошибка отправки уведомления {notification.pk}: {e}")
+        else:
+            await sync_to_async(mark_sent)(notification)
+
+
+async def drain_once(batch_size=50, concurrency=4):
+    """Один проход по очереди. Возвращает число обработанных строк"""
+    notifications = await sync_to_async(claim_due)(batch_size)
+    by_order = {}
+    for notification in notifications:
+        by_order.setdefault(notification.order_id, []).append(notification)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def deliver(order_id, items):
+        async with semaphore:
+            try:
+                await deliver_order(order_id, items)
+            except Order.DoesNotExist:
+                # Заказ удалён — строки очереди удалились каскадом
+                pass
+            except Exception:
+                # Сбой одного заказа (например, OperationalError в mark_sent)
+                # не останавливает обработчик: строки вернутся после истечения аренды
+                logger.exception(f"Не удалось обработать уведомления заказа {order_id}")
+
+    await asyncio.gather(*(deliver(order_id, items) for order_id, items in by_order.items()))
+    return len(notifications)
+
+
+async def run_worker(poll_interval=2.0, batch_size=50, concurrency=4, once=False):
+    """
+    Обработчик очереди: забирает подошедшие строки, отправляет, ждёт poll_interval.
+    С once=True выходит, когда подошедших строк не осталось.
+    """
+    total = 0
+    while True:
+        processed = await drain_once(batch_size, concurrency)
+        total += processed
+        if processed:
+            continue
+        if once:
+            return total
+        await asyncio.sleep(poll_interval)
@@ -0,0 +1,78 @@
+"""
+Неизменяемые снимки заказа для асинхронного кода (уведомления в Telegram).
+
+Снимок собирается одним синхронным вызовом — заказ с пользователем и строки
+с товарами — и дальше читается без обращений к ORM. В async-коде это один
+переход sync_to_async на заказ независимо от числа строк:
+
+    snapshot = await sync_to_async(load_order_snapshot)(order.pk)
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional, Tuple
+
+from django.db.models import Prefetch
+
+from .models import CartItem, Order
+
+
+@dataclass(frozen=True)
+class OrderLineSnapshot:
+    product_name: str
+    price: Decimal
+    quantity: int
+    # Путь к файлу фото товара в MEDIA_ROOT или '' без фото
+    image_name: str
+
+    @property
+    def total(self):
+        return self.price * self.quantity
+
+
+@dataclass(frozen=True)
+class OrderSnapshot:
+    id: int
+    status: str
+    order_date: datetime
+    delivery_date: Optional[datetime]
+    total_price: Decimal
+    address: str
+    username: str
+    phone: str
+    lines: Tuple[OrderLineSnapshot, ...]
+
+
+def load_order_snapshot(order_id):
+    """
+    Снимок заказа за два запроса: заказ с пользователем (select_related) и
+    строки с товарами (prefetch_related). Для отсутствующего заказа —
+    Order.DoesNotExist.
+    """
+    order = (
+        Order.objects
+        .select_related('user')
+        .prefetch_related(
+            Prefetch('cartitem_set', queryset=CartItem.objects.select_related('product').order_by('pk'))
+        )
+        .get(pk=order_id)
+    )
+    return OrderSnapshot(
+        id=order.pk,
+        status=order.status,
+        order_date=order.order_date,
+        delivery_date=order.delivery_date,
+        total_price=order.total_price,
+        address=order.address,
+        username=order.user.username,
+        phone=order.user.phone or '',
+        lines=tuple(
+            OrderLineSnapshot(
+                product_name=item.product.name,
+                price=item.product.price,
+                quantity=item.quantity,
+                image_name=item.product.image.name or '',
+            )
+            for item in order.cartitem_set.all()
+        ),
+    )
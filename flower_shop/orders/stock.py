@@ -0,0 +1,167 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from catalog.cache import invalidate_catalog
+from catalog.models import Product
+
+from .exceptions import OutOfStockError
+from .models import StockReservation
+
+
+def _amounts(lines):
+    """[(product_id, количество), ...] -> {product_id: суммарное количество}"""
+    amounts = Counter()
+    for product_id, quantity in lines:
+        amounts[product_id] += quantity
+    return dict(amounts)
+
+
+def _amount_case(amounts):
+    return Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in amounts.items()],
+        output_field=IntegerField()
+    )
+
+
+def _shortages(amounts):
+    return [
+        {'name': name, 'available': available, 'requested': amounts[product_id]}
+        for product_id, name, available in (
+            Product.objects.filter(pk__in=amounts).order_by('pk').values_list('pk', 'name', 'quantity')
+        )
+        if available < amounts[product_id]
+    ]
+
+
+def take_stock(lines):
+    """
+    Списывает остатки по всем строкам одним запросом
+    UPDATE ... SET quantity = quantity - n WHERE id IN (...) AND quantity >= n.
+    Списывается всё или ничего; при нехватке — OutOfStockError.
+    Блокируются только строки этих товаров, остальные списания не ждут.
+    """
+    amounts = _amounts(lines)
+    if not amounts:
+        return
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update:
+            # Строки блокируются в порядке id: встречные списания пересекающихся
+            # корзин не приводят к взаимоблокировке
+            list(Product.objects.select_for_update().filter(pk__in=amounts).order_by('pk').values_list('pk'))
+        amount = _amount_case(amounts)
+        updated = Product.objects.filter(pk__in=amounts, quantity__gte=amount).update(
+            quantity=F('quantity') - amount
+        )
+        if updated != len(amounts):
+            transaction.set_rollback(True)
+
+    if updated != len(amounts):
+        raise OutOfStockError(_shortages(amounts))
+    # Выборки каталога зависят от остатка только через «в наличии» (quantity > 0):
+    # кэш сбрасывается, лишь когда товар закончился
+    if Product.objects.filter(pk__in=amounts, quantity=0).exists():
+        invalidate_catalog()
+
+
+def return_stock(lines):
+    """Возвращает остатки на склад одним UPDATE"""
+    amounts = _amounts(lines)
+    if not amounts:
+        return
+    amount = _amount_case(amounts)
+    Product.objects.filter(pk__in=amounts).update(quantity=F('quantity') + amount)
+    # Остаток стал равен возвращённому — товар был закончившимся и снова в наличии
+    if Product.objects.filter(pk__in=amounts, quantity=amount).exists():
+        invalidate_catalog()
+
+
+def _release(reservations):
+    """
+    Снимает резервы и возвращает их остатки. Резерв, который уже снял
+    параллельный процесс (удаление вернуло 0 строк), повторно не возвращается.
+    """
+    released = []
+    for reservation in list(reservations):
+        deleted, _ = StockReservation.objects.filter(pk=reservation.pk).delete()
+        if deleted:
+            released.append((reservation.product_id, reservation.quantity))
+    return_stock(released)
+    return len(released)
+
+
+def _cart_lines(cart):
+    return _amounts(cart.cartitem_set.values_list('product_id', 'quantity'))
+
+
+def reserve_cart(cart, timeout=None, lines=None):
+    """
+    Резервирует остатки под корзину при переходе к оформлению: списывает их
+    сразу и записывает резерв, истекающий через STOCK_RESERVATION_TIMEOUT секунд.
+    Действующий резерв, совпадающий с корзиной (повторный показ страницы
+    оформления), только продлевается; иначе прежний резерв той же корзины
+    возвращается. При нехватке — OutOfStockError.
+    lines — [(product_id, количество)] из уже загруженной корзины.
+    """
+    timeout = timeout if timeout is not None else settings.STOCK_RESERVATION_TIMEOUT
+    lines = _amounts(lines) if lines is not None else _cart_lines(cart)
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=timeout)
+
+    release_expired(now)
+    with transaction.atomic():
+        current = StockReservation.objects.filter(cart=cart, expires_at__gt=now)
+        if lines and dict(current.values_list('product_id', 'quantity')) == lines:
+            # Продлеваем, только если ни одну строку не снял параллельный процесс
+            if current.update(expires_at=expires_at) == len(lines):
+                return
+        _release(StockReservation.objects.filter(cart=cart))
+        take_stock(lines.items())
+        StockReservation.objects.bulk_create([
+            StockReservation(cart=cart, product_id=product_id, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in lines.items()
+        ])
+
+
+def confirm_reservation(cart, lines=None):
+    """
+    Переводит резерв корзины в окончательное списание при оформлении заказа.
+    Вызывается внутри транзакции оформления. Если резерв истёк, снят или
+    корзина с тех пор изменилась — остатки списываются заново.
+    """
+    lines = _amounts(lines) if lines is not None else _cart_lines(cart)
+    with transaction.atomic():
+        with transaction.atomic():
+            reservations = list(StockReservation.objects.filter(cart=cart, expires_at__gt=timezone.now()))
+            reserved = {reservation.product_id: reservation.quantity for reservation in reservations}
+            if reserved == lines:
+                deleted, _ = StockReservation.objects.filter(pk__in=[r.pk for r in reservations]).delete()
+                if deleted == len(reservations):
+                    return
+            # Резерв истёк, не совпал с корзиной или часть его успел снять
+            # release_expired — откатываем и списываем заново
+            transaction.set_rollback(True)
+
+        _release(StockReservation.objects.filter(cart=cart))
+        take_stock(lines.items())
+
+
+def release_cart(cart):
+    """
+    Снимает резерв корзины и возвращает остатки: при очистке корзины, нехватке
+    товара и любом изменении её строк — резерв под прежний состав больше не нужен
+    """
+    with transaction.atomic():
+        return _release(StockReservation.objects.filter(cart=cart))
+
+
+def release_expired(now=None):
+    """Снимает истёкшие резервы и возвращает остатки. Возвращает число снятых резервов"""
+    expired = StockReservation.objects.filter(expires_at__lte=now or timezone.now())
+    with transaction.atomic():
+        return _release(expired)
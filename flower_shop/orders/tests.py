@@ -1,15 +1,36 @@
 import logging
-from django.test import TestCase, override_settings
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
-from unittest.mock import patch, ANY
+from unittest.mock import AsyncMock, patch, ANY
 from hypothesis import given, strategies as st, settings
 from hypothesis.extra.django import TestCase as HypTestCase
 from django.apps import apps
 from django.utils import timezone
 from PIL import Image, ImageDraw
 import io
-from django.db import transaction
+import json
+import re
+import os
+import tempfile
+from django.db import OperationalError, connection, connections, transaction
+from django.core.management import call_command
+from django.core.cache import caches
+from django.contrib.messages import get_messages
+from django.test.utils import CaptureQueriesContext
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import unittest
+from decimal import Decimal
+
+from orders.exceptions import OutOfStockError
+from orders.stock import confirm_reservation, release_expired, reserve_cart, return_stock, take_stock
+from orders import notifications
+from orders.notifications import claim_due, drain_once, enqueue_order_notification, run_worker
+from fake_bot_api import FakeBotAPI
+from query_plans import explain
+from asgiref.sync import async_to_sync, sync_to_async
+from dataclasses import FrozenInstanceError
 
 img = Image.new('RGB', (450, 450), color='white')
 draw = ImageDraw.Draw(img)
@@ -29,6 +50,8 @@ Cart = apps.get_model('orders', 'Cart')
 CartItem = apps.get_model('orders', 'CartItem')
 Product = apps.get_model('catalog', 'Product')
 CustomUser = apps.get_model('users', 'CustomUser')
+StockReservation = apps.get_model('orders', 'StockReservation')
+NotificationOutbox = apps.get_model('orders', 'NotificationOutbox')
 
 
 @override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls')
@@ -83,11 +106,11 @@ class OrderProcessingTests(TestCase):
         self.assertEqual(order.user, self.user)
         self.assertEqual(order.address, 'New Test Address')
 
-@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls')
+@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls', TELEGRAM_ADMIN_CHAT_IDS=['101', '102'])
 class PaymentIntegrationTests(TestCase):
-    @patch('orders.views.send_telegram_notification')
+    @patch('bot.send_prepared_notification')
     def test_notification_sending(self, mock_notification):
-        """Тест отправки уведомления после успешного заказа"""
+        """Оформление ставит уведомление в очередь, не обращаясь к Telegram"""
         # 1. Создание тестовых данных
         user = CustomUser.objects.create_user(
             username="tguser",
@@ -124,9 +147,12 @@ class PaymentIntegrationTests(TestCase):
         self.assertEqual(Order.objects.count(), 1, "Заказ не создан")
         order = Order.objects.first()
 
-        # 5. Проверка вызова уведомления
-        # Исправление: передаем объект заказа вместо order_id и user_id
-        mock_notification.assert_called_once_with(order)
+        # 5. Уведомление в очереди — по строке на чат, отправки в запросе нет
+        mock_notification.assert_not_called()
+        self.assertEqual(
+            sorted(NotificationOutbox.objects.filter(order=order).values_list('chat_id', 'status')),
+            [('101', 'pending'), ('102', 'pending')]
+        )
 
 @override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls')
 class OrderHypothesisTests(HypTestCase):
@@ -196,3 +222,644 @@ class OrderHypothesisTests(HypTestCase):
         Product.objects.all().delete()
         CustomUser.objects.all().delete()
 
+
+@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls')
+class StockReservationTests(TestCase):
+    """Резервирование и списание остатков при оформлении"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="stockuser", password="testpass", address="Stock Address"
+        )
+        image = SimpleUploadedFile('TestOrders.jpg', img_bytes, 'image/jpeg')
+        self.rose = Product.objects.create(name="Stock Rose", price=100, quantity=5, image=image)
+        self.tulip = Product.objects.create(name="Stock Tulip", price=200, quantity=1, image=image)
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, product=self.rose, quantity=3)
+
+    def quantities(self):
+        return list(Product.objects.order_by('pk').values_list('quantity', flat=True))
+
+    def test_take_stock_is_all_or_nothing(self):
+        with self.assertRaises(OutOfStockError) as error:
+            take_stock([(self.rose.pk, 2), (self.tulip.pk, 2)])
+        self.assertEqual(error.exception.items, [{'name': "Stock Tulip", 'available': 1, 'requested': 2}])
+        self.assertEqual(self.quantities(), [5, 1])
+
+        take_stock([(self.rose.pk, 2), (self.rose.pk, 3), (self.tulip.pk, 1)])
+        self.assertEqual(self.quantities(), [0, 0])
+
+    def test_checkout_reserves_then_consumes(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('orders:checkout'))
+        self.assertEqual(self.quantities(), [2, 1])
+        self.assertEqual(StockReservation.objects.get(cart=self.cart).quantity, 3)
+
+        # Повторный заход на страницу продлевает резерв, а не списывает ещё раз
+        self.client.get(reverse('orders:checkout'))
+        self.assertEqual(self.quantities(), [2, 1])
+
+        delivery_time = timezone.localtime() + timezone.timedelta(hours=3)
+        self.client.post(reverse('orders:checkout'), data={
+            'delivery_date': delivery_time.strftime('%Y-%m-%dT%H:%M'),
+            'use_profile_address': True,
+        })
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.quantities(), [2, 1])
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_refresh_keeps_reservation_and_catalog_cache(self):
+        self.client.force_login(self.user)
+        with patch('orders.stock.invalidate_catalog') as invalidate:
+            self.client.get(reverse('orders:checkout'))
+            first = StockReservation.objects.get(cart=self.cart)
+            self.client.get(reverse('orders:checkout'))
+        # Роз осталось 2 — «в наличии» не менялось, кэш каталога не сбрасывается
+        invalidate.assert_not_called()
+        second = StockReservation.objects.get(cart=self.cart)
+        self.assertEqual(second.pk, first.pk)
+        self.assertGreaterEqual(second.expires_at, first.expires_at)
+
+    def test_stock_crossing_zero_invalidates_catalog(self):
+        with patch('orders.stock.invalidate_catalog') as invalidate:
+            take_stock([(self.rose.pk, 2)])
+            return_stock([(self.rose.pk, 2)])
+            invalidate.assert_not_called()
+            take_stock([(self.tulip.pk, 1)])
+            self.assertEqual(invalidate.call_count, 1)
+            return_stock([(self.tulip.pk, 1)])
+            self.assertEqual(invalidate.call_count, 2)
+
+    def test_cart_changes_release_reservation(self):
+        self.client.force_login(self.user)
+        item = CartItem.objects.create(cart=self.cart, product=self.tulip, quantity=1)
+        self.client.get(reverse('orders:checkout'))
+        self.assertEqual(self.quantities(), [2, 0])
+
+        self.client.get(reverse('orders:remove_from_cart', args=[item.pk]))
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(self.quantities(), [5, 1])
+
+        self.client.get(reverse('orders:checkout'))
+        rose_item = self.cart.cartitem_set.get()
+        self.client.post(reverse('orders:update_cart_item', args=[rose_item.pk]), {'quantity': 1})
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(self.quantities(), [5, 1])
+
+    def test_checkout_out_of_stock_clears_cart(self):
+        CartItem.objects.create(cart=self.cart, product=self.tulip, quantity=4)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('orders:checkout'))
+        message = str(list(get_messages(response.wsgi_request))[0])
+        self.assertIn("Stock Tulip - доступно 1 шт., заказано 4", message)
+        self.assertFalse(self.cart.cartitem_set.exists())
+        self.assertEqual(self.quantities(), [5, 1])
+
+    def test_expired_reservation_is_released(self):
+        reserve_cart(self.cart, timeout=-1)
+        self.assertEqual(self.quantities(), [2, 1])
+
+        out = io.StringIO()
+        call_command('release_expired_reservations', stdout=out)
+        self.assertIn("Снято резервов: 1", out.getvalue())
+        self.assertEqual(self.quantities(), [5, 1])
+        self.assertEqual(release_expired(), 0)
+
+    def test_confirm_after_expiry_takes_stock_again(self):
+        reserve_cart(self.cart, timeout=-1)
+        # Корзина изменилась после резервирования
+        CartItem.objects.create(cart=self.cart, product=self.tulip, quantity=1)
+        confirm_reservation(self.cart)
+        self.assertEqual(self.quantities(), [2, 0])
+        self.assertFalse(StockReservation.objects.exists())
+
+
+@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls')
+class CheckoutQueryCountTests(TestCase):
+    """Число запросов оформления не зависит от числа строк корзины"""
+
+    def checkout_queries(self, lines):
+        user = CustomUser.objects.create_user(username=f"bulk{lines}", password="testpass", address="Bulk")
+        cart = Cart.objects.create(user=user)
+        products = Product.objects.bulk_create([
+            Product(name=f"Bulk {i}", price=100 + i, quantity=10) for i in range(lines)
+        ])
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=2) for product in products])
+
+        self.client.force_login(user)
+        delivery_time = timezone.localtime() + timezone.timedelta(hours=3)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('orders:checkout'), data={
+                'delivery_date': delivery_time.strftime('%Y-%m-%dT%H:%M'),
+                'use_profile_address': True,
+            })
+
+        order = Order.objects.get(user=user)
+        self.assertEqual(order.cartitem_set.count(), lines)
+        self.assertEqual(order.total_price, sum(2 * (100 + i) for i in range(lines)))
+        self.assertFalse(cart.cartitem_set.exists())
+        return len(queries)
+
+    def test_constant_queries(self):
+        # Первый заказ дня создаёт строку дневной сводки (analytics) — прогрев
+        self.checkout_queries(2)
+        self.assertEqual(self.checkout_queries(1), self.checkout_queries(20))
+
+
+@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls')
+class CartTotalsTests(TestCase):
+    """Суммы корзины считаются агрегатом в БД, а не перебором строк"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = Product.objects.bulk_create([
+            Product(name=f"Total {i}", price=Decimal('99.50') + i, quantity=10) for i in range(3)
+        ])
+
+    def make_cart(self, username, quantities):
+        cart = Cart.objects.create(user=CustomUser.objects.create_user(username=username, password="x"))
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, quantity=quantity)
+            for product, quantity in zip(self.products, quantities)
+        ])
+        return cart
+
+    def test_single_query_and_memoized(self):
+        cart = Cart.objects.get(pk=self.make_cart("totals", [1, 2, 3]).pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(cart.total_price(), Decimal('99.50') + Decimal('100.50') * 2 + Decimal('101.50') * 3)
+            self.assertEqual(cart.total_items(), 6)
+            cart.total_price()
+        # После изменения строк значение пересчитывается заново
+        CartItem.objects.filter(cart=cart).delete()
+        del cart.totals
+        self.assertEqual(cart.total_price(), 0)
+        self.assertEqual(cart.total_items(), 0)
+
+    def test_with_totals(self):
+        self.make_cart("first", [1])
+        self.make_cart("second", [2, 1])
+        Cart.objects.create(user=CustomUser.objects.create_user(username="empty", password="x"))
+        with self.assertNumQueries(1):
+            totals = {
+                cart.user_id: (cart.total_price(), cart.total_items())
+                for cart in Cart.objects.with_totals()
+            }
+        self.assertEqual(sorted(totals.values()), [
+            (0, 0), (Decimal('99.50'), 1), (Decimal('99.50') * 2 + Decimal('100.50'), 3),
+        ])
+
+    def test_admin_changelist_queries_constant(self):
+        admin = CustomUser.objects.create_superuser(username="cartadmin", password="x")
+        self.client.force_login(admin)
+        url = reverse('admin:orders_cart_changelist')
+
+        def changelist_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        self.make_cart("admin1", [1, 1, 1])
+        few = changelist_queries()
+        for i in range(5):
+            self.make_cart(f"admin{i + 2}", [2, 2])
+        self.assertEqual(changelist_queries(), few)
+
+
+@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls')
+class CartBadgeTests(TestCase):
+    """Значки шапки: закэшированная шапка обновляется при изменении корзины и избранного"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="badge", password="x")
+        cls.product = Product.objects.create(name="Badge Rose", price=100, quantity=10)
+
+    def setUp(self):
+        caches['template_fragments'].clear()
+        caches['catalog'].clear()
+        self.client.force_login(self.user)
+
+    def badges(self):
+        html = self.client.get(reverse('home')).content.decode()
+        return re.findall(r'badge bg-success[^>]*>\s*(\d+)\s*<', html)
+
+    def test_cart_badge_follows_cart(self):
+        self.assertEqual(self.badges(), [])
+        self.client.get(reverse('orders:add_to_cart', args=[self.product.pk]))
+        self.client.get(reverse('orders:add_to_cart', args=[self.product.pk]))
+        self.assertEqual(self.badges(), ['2'])
+
+        item = CartItem.objects.get(cart__user=self.user)
+        self.client.get(reverse('orders:remove_from_cart', args=[item.pk]))
+        self.assertEqual(self.badges(), [])
+
+    @override_settings(CACHE_USER_STATE_IN_LOCMEM=True)
+    def test_cached_header_skips_badge_query(self):
+        self.client.get(reverse('orders:add_to_cart', args=[self.product.pk]))
+        self.badges()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.badges(), ['1'])
+        self.assertFalse([q for q in queries if 'orders_cartitem' in q['sql']])
+
+    def test_process_local_cache_keys_header_by_count(self):
+        self.badges()
+        # Корзину изменил другой процесс: версия этого процесса не поднята
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=3)
+        self.assertEqual(self.badges(), ['3'])
+
+    def test_favorites_badge(self):
+        Favorite = apps.get_model('catalog', 'Favorite')
+        Favorite.objects.create(user=self.user, product=self.product)
+        self.assertEqual(self.badges(), ['1'])
+
+
+class ConcurrentStockTests(TransactionTestCase):
+    """
+    Параллельные списания из нескольких потоков не продают больше остатка.
+    В тестовой БД SQLite в памяти потоки не ждут блокировку, поэтому класс
+    работает на своей временной файловой БД: соединение основного потока
+    подменяется, потоки открывают новые по её настройкам.
+    """
+
+    THREADS = 8
+
+    @classmethod
+    def setUpClass(cls):
+        cls.memory_connection = None
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            cls.tmp = tempfile.TemporaryDirectory()
+            cls.memory_connection = connections['default']
+            cls.memory_settings = connections.settings['default']
+            connections.settings['default'] = {
+                **cls.memory_settings, 'NAME': os.path.join(cls.tmp.name, 'concurrent.sqlite3')
+            }
+            connections['default'] = connections.create_connection('default')
+            call_command('migrate', verbosity=0, interactive=False)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if cls.memory_connection is not None:
+            connections['default'].close()
+            connections.settings['default'] = cls.memory_settings
+            connections['default'] = cls.memory_connection
+            cls.tmp.cleanup()
+
+    def run_concurrently(self, func, args):
+        barrier = threading.Barrier(min(self.THREADS, len(args)))
+
+        def worker(arg):
+            try:
+                barrier.wait()
+                func(arg)
+                return True
+            except OutOfStockError:
+                return False
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            return list(executor.map(worker, args))
+
+    def test_no_oversell(self):
+        rose = Product.objects.create(name="Race Rose", price=100, quantity=10)
+        tulip = Product.objects.create(name="Race Tulip", price=100, quantity=100)
+        # Половина потоков берёт розу с тюльпаном, остальные — только тюльпаны
+        lines = [
+            [(rose.pk, 1), (tulip.pk, 1)] if i % 2 else [(tulip.pk, 2)]
+            for i in range(40)
+        ]
+        results = self.run_concurrently(take_stock, lines)
+
+        self.assertEqual(results.count(True), 30)
+        rose.refresh_from_db()
+        tulip.refresh_from_db()
+        self.assertEqual(rose.quantity, 0)
+        self.assertEqual(tulip.quantity, 100 - 20 * 2 - 10)
+
+    def test_concurrent_cart_reservations(self):
+        rose = Product.objects.create(name="Race Rose", price=100, quantity=5)
+        carts = []
+        for i in range(16):
+            cart = Cart.objects.create(user=CustomUser.objects.create_user(username=f"racer{i}", password="x"))
+            CartItem.objects.create(cart=cart, product=rose, quantity=1)
+            carts.append(cart)
+
+        results = self.run_concurrently(reserve_cart, carts)
+
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(StockReservation.objects.count(), 5)
+        rose.refresh_from_db()
+        self.assertEqual(rose.quantity, 0)
+
+
+@override_settings(TELEGRAM_ADMIN_CHAT_IDS=['101', '102'], NOTIFICATION_MAX_ATTEMPTS=3)
+class NotificationOutboxTests(TestCase):
+    """Обработчик очереди уведомлений против поддельного Bot API"""
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        caption_settings = self.settings(CAPTION_CACHE_DIR=cache_dir.name)
+        caption_settings.enable()
+        self.addCleanup(caption_settings.disable)
+
+        user = CustomUser.objects.create_user(username="outbox", password="x", phone="+79990000000")
+        product = Product.objects.create(name="Outbox Rose", price=150, quantity=10)
+        self.order = Order.objects.create(
+            user=user, total_price=300, delivery_date=timezone.now(), address="Outbox Address"
+        )
+        CartItem.objects.create(order=self.order, product=product, quantity=2)
+        enqueue_order_notification(self.order)
+
+    def run_worker(self, prepare=None):
+        """Один проход обработчика (once) с ботом, направленным на поддельный API"""
+        async def run():
+            async with FakeBotAPI() as api:
+                if prepare:
+                    prepare(api)
+                bot = api.bot()
+                try:
+                    with patch('bot.bot_instance', bot):
+                        await run_worker(once=True)
+                finally:
+                    await (await bot.get_session()).close()
+                return api
+        return async_to_sync(run)()
+
+    def statuses(self):
+        return list(NotificationOutbox.objects.order_by('chat_id').values_list('chat_id', 'status', 'attempts'))
+
+    def make_due(self):
+        NotificationOutbox.objects.filter(status='pending').update(next_attempt_at=timezone.now())
+
+    def test_delivers_to_every_chat(self):
+        api = self.run_worker()
+        messages = api.calls_to('sendMessage')
+        self.assertEqual(sorted(call['chat_id'] for call in messages), ['101', '102'])
+        self.assertIn("Outbox Rose", messages[0]['text'])
+        self.assertEqual(self.statuses(), [('101', 'sent', 1), ('102', 'sent', 1)])
+
+    def test_retries_only_failed_chat_with_backoff(self):
+        self.run_worker(lambda api: api.fail('sendMessage', times=1))
+        self.assertEqual(self.statuses(), [('101', 'pending', 1), ('102', 'sent', 1)])
+        pending = NotificationOutbox.objects.get(status='pending')
+        self.assertGreater(pending.next_attempt_at, timezone.now())
+        self.assertIn("Internal Server Error", pending.last_error)
+
+        # До наступления next_attempt_at строка не берётся повторно
+        self.assertEqual(self.run_worker().calls, [])
+
+        self.make_due()
+        api = self.run_worker()
+        self.assertEqual([call['chat_id'] for call in api.calls_to('sendMessage')], ['101'])
+        self.assertEqual(self.statuses(), [('101', 'sent', 2), ('102', 'sent', 1)])
+
+    def test_retry_after_and_giving_up(self):
+        self.run_worker(lambda api: api.fail('sendMessage', times=10, status=429, retry_after=30))
+        pending = NotificationOutbox.objects.get(chat_id='101')
+        delay = (pending.next_attempt_at - timezone.now()).total_seconds()
+        self.assertTrue(25 < delay <= 30)
+
+        for _ in range(2):
+            self.make_due()
+            self.run_worker(lambda api: api.fail('sendMessage', times=10))
+        self.assertEqual(self.statuses(), [('101', 'failed', 3), ('102', 'failed', 3)])
+
+    def test_media_rendered_and_uploaded_once(self):
+        for name in ("Outbox Tulip", "Outbox Lily"):
+            product = Product.objects.create(
+                name=name, price=90, quantity=5,
+                image=SimpleUploadedFile('TestOutbox.jpg', img_bytes, 'image/jpeg')
+            )
+            CartItem.objects.create(order=self.order, product=product, quantity=1)
+
+        import bot
+        with patch('bot.add_caption_to_image', wraps=bot.add_caption_to_image) as render:
+            api = self.run_worker()
+
+        # Две картинки отрисованы и загружены по одному разу на оба чата
+        self.assertEqual(render.call_count, 2)
+        self.assertEqual(api.uploads, 2)
+        albums = api.calls_to('sendMediaGroup')
+        self.assertEqual(sorted(call['chat_id'] for call in albums), ['101', '102'])
+        uploaded, reused = albums
+        self.assertTrue(all(
+            media['media'].startswith('attach://') for media in json.loads(uploaded['media'])
+        ))
+        self.assertEqual(
+            [media['media'] for media in json.loads(reused['media'])],
+            ['photo-1', 'photo-2']
+        )
+        self.assertEqual(self.statuses(), [('101', 'sent', 1), ('102', 'sent', 1)])
+
+    def test_failed_upload_is_retried_by_next_chat(self):
+        product = Product.objects.create(
+            name="Outbox Peony", price=90, quantity=5,
+            image=SimpleUploadedFile('TestOutbox.jpg', img_bytes, 'image/jpeg')
+        )
+        CartItem.objects.create(order=self.order, product=product, quantity=1)
+
+        api = self.run_worker(lambda api: api.fail('sendPhoto', times=1))
+        photos = [call['photo'] for call in api.calls_to('sendPhoto')]
+        self.assertEqual(len(photos), 2)
+        self.assertTrue(all(photo.startswith('attach://') for photo in photos))
+        self.assertEqual(self.statuses(), [('101', 'pending', 1), ('102', 'sent', 1)])
+
+    def test_claim_is_exclusive(self):
+        self.assertEqual(len(claim_due()), 2)
+        # Строки в аренде у первого обработчика второму не достаются
+        self.assertEqual(claim_due(), [])
+
+    def test_order_failure_does_not_stop_worker(self):
+        other = Order.objects.create(
+            user=self.order.user, total_price=100, delivery_date=timezone.now(), address="Other Address"
+        )
+        enqueue_order_notification(other)
+        real_mark_sent = notifications.mark_sent
+
+        def mark_sent(notification):
+            if notification.order_id == self.order.pk:
+                raise OperationalError("database is locked")
+            real_mark_sent(notification)
+
+        with patch('bot.send_prepared_notification', AsyncMock()), \
+                patch('orders.notifications.mark_sent', side_effect=mark_sent), \
+                self.assertLogs('orders.notifications', 'ERROR'):
+            processed = async_to_sync(drain_once)(concurrency=1)
+        self.assertEqual(processed, 4)
+        # Второй заказ обработан, хотя первый упал
+        self.assertEqual(set(other.notifications.values_list('status', flat=True)), {'sent'})
+
+    def test_command(self):
+        with patch('bot.send_prepared_notification', AsyncMock()) as send:
+            out = io.StringIO()
+            call_command('send_notifications', '--once', stdout=out)
+        self.assertEqual(send.await_count, 2)
+        self.assertIn("Обработано уведомлений: 2", out.getvalue())
+
+
+class OrderSnapshotTests(TestCase):
+    """Снимок заказа для уведомлений: постоянное число запросов и переходов в поток"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username="snap", password="x", phone="+79991234567")
+        self.products = [
+            Product.objects.create(name=f"Snapshot {i}", price=100 + i, quantity=10) for i in range(20)
+        ]
+
+    def make_order(self, lines):
+        order = Order.objects.create(
+            user=self.user, total_price=1000, delivery_date=timezone.now(), address="Snapshot Address"
+        )
+        CartItem.objects.bulk_create([
+            CartItem(order=order, product=product, quantity=2) for product in self.products[:lines]
+        ])
+        return order
+
+    def count_hops(self, order):
+        """Число переходов sync_to_async при сборке уведомления"""
+        import bot
+        from orders.snapshots import load_order_snapshot
+
+        calls = []
+
+        def counting(func, *args, **kwargs):
+            calls.append(func)
+            return sync_to_async(func, *args, **kwargs)
+
+        async def prepare():
+            with patch('bot.sync_to_async', counting):
+                snapshot = await bot.sync_to_async(load_order_snapshot)(order.pk)
+                return await bot.prepare_order_notification(snapshot)
+
+        prepared = async_to_sync(prepare)()
+        return len(calls), prepared
+
+    def test_snapshot_queries_do_not_grow_with_lines(self):
+        from orders.snapshots import load_order_snapshot
+
+        small, large = self.make_order(1), self.make_order(20)
+        with self.assertNumQueries(2):
+            load_order_snapshot(small.pk)
+        with self.assertNumQueries(2):
+            snapshot = load_order_snapshot(large.pk)
+
+        self.assertEqual(len(snapshot.lines), 20)
+        self.assertEqual(snapshot.lines[0].product_name, "Snapshot 0")
+        self.assertEqual(snapshot.lines[0].total, 200)
+        self.assertEqual(snapshot.phone, "+79991234567")
+        with self.assertRaises(FrozenInstanceError):
+            snapshot.address = "Другой адрес"
+
+    def test_thread_hops_do_not_grow_with_lines(self):
+        small_hops, _ = self.count_hops(self.make_order(1))
+        large_hops, prepared = self.count_hops(self.make_order(20))
+        self.assertEqual(small_hops, large_hops)
+        self.assertLessEqual(large_hops, 2)
+
+        message = "\n".join(prepared['parts'])
+        self.assertIn("Snapshot 19", message)
+        self.assertIn("2 × 119.00 ₽ = 238.00 ₽", message)
+        self.assertIn("*Клиент:* snap", message)
+
+
+class OrderStatsTests(TestCase):
+    """Order.get_stats: все периоды одним запросом, результат как у get_period_stats"""
+
+    def setUp(self):
+        user = CustomUser.objects.create_user(username="stats", password="x")
+        now = timezone.now()
+        ages = [0, 0, 2, 9, 40, 200, 365, 370, 400, 730]
+        statuses = ['ordered', 'delivered', 'canceled', 'delivered', 'in_delivery']
+        for i, days in enumerate(ages * 2):
+            status = statuses[i % len(statuses)]
+            order_date = now - timezone.timedelta(days=days)
+            order = Order.objects.create(
+                user=user,
+                total_price=100 * (i + 1),
+                status=status,
+                delivery_date=order_date + timezone.timedelta(days=1),
+                address="Stats Address",
+            )
+            Order.objects.filter(pk=order.pk).update(
+                order_date=order_date,
+                # Каждый второй доставленный — с опозданием
+                delivered_date=order_date + timezone.timedelta(days=2 if i % 2 else 0) if status == 'delivered' else None,
+            )
+
+    def test_single_query_matches_per_period_stats(self):
+        periods = Order.stats_periods()
+        expected = {
+            name: Order.objects.get_period_stats(start, end) for name, (start, end) in periods.items()
+        }
+        with self.assertNumQueries(1):
+            stats = Order.get_stats()
+
+        self.assertEqual(stats, expected)
+        self.assertEqual(list(stats), ['today', 'week', 'month', 'year', 'last_year_week', 'last_year_month', 'last_year'])
+        self.assertGreater(stats['year']['total_orders'], 0)
+        self.assertGreater(stats['last_year']['delivered_total'], 0)
+
+    def test_empty_periods(self):
+        Order.objects.all().delete()
+        stats = Order.get_stats()
+        self.assertEqual(stats['today'], {
+            'total_orders': 0, 'total_amount': None, 'delivered_total': 0,
+            'delivered_on_time': 0, 'avg_check': 0,
+        })
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "Планы запросов проверяются на SQLite")
+@override_settings(ROOT_URLCONF='flower_shop.flower_shop.urls')
+class QueryPlanTests(TestCase):
+    """
+    Горячие запросы заказов идут по индексам. Запросы снимаются с настоящего
+    кода (CaptureQueriesContext), для каждого выполняется EXPLAIN QUERY PLAN.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="plans", password="x")
+        for status in ['ordered', 'delivered', 'canceled', 'in_delivery']:
+            Order.objects.create(user=cls.user, status=status, delivery_date=timezone.now(), address="Plans")
+
+    def captured_plans(self, func, table='"orders_order"'):
+        """Планы запросов func() к таблице заказов (FROM orders_order)"""
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        plans = [
+            explain(query['sql']) for query in queries.captured_queries
+            if f'FROM {table}' in query['sql']
+        ]
+        self.assertTrue(plans, "Запросы к заказам не выполнялись")
+        return plans
+
+    def assertUsesIndex(self, plan, index):
+        self.assertIn(f"INDEX {index}", plan)
+        self.assertNotIn("SCAN orders_order\n", plan + "\n")
+        self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", plan)
+
+    def test_order_history(self):
+        self.client.force_login(self.user)
+        plan, = self.captured_plans(lambda: self.client.get(reverse('orders:my_orders')))
+        self.assertUsesIndex(plan, 'order_user_date_idx')
+
+    def test_period_stats(self):
+        plan, = self.captured_plans(Order.get_stats)
+        self.assertIn("INDEX order_date_status_idx", plan)
+
+    @override_settings(BOT_ORDERS_PAGE_SIZE=1)
+    def test_bot_active_orders(self):
+        import bot
+        _, cursor = bot.format_orders_page()
+        first, *_ = self.captured_plans(bot.format_orders_page)
+        self.assertUsesIndex(first, 'order_active_date_idx')
+        # Следующая страница — тот же индекс с keyset-условием
+        after = bot.decode_orders_cursor(cursor)[2]
+        first, *_ = self.captured_plans(lambda: bot.format_orders_page(after=after))
+        self.assertUsesIndex(first, 'order_active_date_idx')
@@ -6,40 +6,47 @@ from .models import Cart, Order, CartItem, OrderItem
 from .forms import DeliveryDateForm, DeliveryAddressForm
 from .models import Order
 import logging
-from asgiref.sync import async_to_sync
-from bot import send_telegram_notification
 from django.db import transaction
-
+from .exceptions import OutOfStockError
+from .notifications import enqueue_order_notification
+from .badges import bump_cart_version
+from .stock import confirm_reservation, release_cart, reserve_cart
+
+
+def _out_of_stock(request, cart, items):
+    error_message = "Невозможно оформить заказ:<br>"
+    for item in items:
+        error_message += (
+            f"• {item['name']} - доступно {item['available']} шт., "
+            f"заказано {item['requested']}<br>"
+        )
+    error_message += "Корзина была очищена."
+    release_cart(cart)
+    cart.cartitem_set.all().delete()
+    bump_cart_version(cart.user_id)
+    messages.error(request, error_message)
+    return redirect('orders:cart')
 
 @login_required
 def checkout_view(request):
     cart = get_object_or_404(Cart, user=request.user)
 
-    if not cart.cartitem_set.exists():
+    # Снимок корзины: строки вместе с товарами одним запросом. Дальше — проверка
+    # остатков, сумма, строки заказа и очистка корзины — работают только с ним
+    items = list(cart.cartitem_set.select_related('product'))
+    if not items:
         messages.error(request, "Невозможно оформить пустой заказ")
         return redirect('orders:cart')
+    lines = [(item.product_id, item.quantity) for item in items]
+    total = sum(item.product.price * item.quantity for item in items)
 
-    # Проверка наличия товаров
-    out_of_stock_items = []
-    for item in cart.cartitem_set.all():
-        if item.product.quantity < item.quantity:
-            out_of_stock_items.append({
-                'name': item.product.name,
-                'available': item.product.quantity,
-                'requested': item.quantity
-            })
-
-    if out_of_stock_items:
-        error_message = "Невозможно оформить заказ:<br>"
-        for item in out_of_stock_items:
-            error_message += (
-                f"• {item['name']} - доступно {item['available']} шт., "
-                f"заказано {item['requested']}<br>"
-            )
-        error_message += "Корзина была очищена."
-        cart.cartitem_set.all().delete()
-        messages.error(request, error_message)
-        return redirect('orders:cart')
+    # Резервируем остатки на время оформления: при параллельных заказах
+    # одного товара не будет продано больше, чем есть на складе
+    if request.method != 'POST':
+        try:
+            reserve_cart(cart, lines=lines)
+        except OutOfStockError as e:
+            return _out_of_stock(request, cart, e.items)
 
     date_form = DeliveryDateForm(request.POST or None)
     address_form = DeliveryAddressForm(
@@ -58,26 +65,32 @@ def checkout_view(request):
                 )
 
                 with transaction.atomic():
+                    # Резерв превращается в списание; если он истёк — списываем заново
+                    confirm_reservation(cart, lines=lines)
                     new_order = Order.objects.create(
                         user=request.user,
-                        total_price=cart.total_price(),
+                        total_price=total,
                         status='ordered',
                         delivery_date=date_form.cleaned_data['delivery_date'],
                         address=address
                     )
 
-                    for cart_item in cart.cartitem_set.all():
-                        CartItem.objects.create(
-                            order=new_order,
-                            product=cart_item.product,
-                            quantity=cart_item.quantity
-                        )
-
-                    cart.cartitem_set.all().delete()
-                    async_to_sync(send_telegram_notification)(new_order)
+                    CartItem.objects.bulk_create([
+                        CartItem(order=new_order, product_id=item.product_id, quantity=item.quantity)
+                        for item in items
+                    ])
+
+                    # Удаляются только оформленные строки: добавленное в корзину
+                    # во время оформления останется в ней
+                    CartItem.objects.filter(pk__in=[item.pk for item in items]).delete()
+                    bump_cart_version(request.user.pk)
+                    # Уведомление отправит manage.py send_notifications
+                    enqueue_order_notification(new_order)
                     messages.success(request, f"Заказ #{new_order.id} оформлен!")
                     return redirect('orders:my_orders')
 
+            except OutOfStockError as e:
+                return _out_of_stock(request, cart, e.items)
             except Exception as e:
                 messages.error(request, f"Ошибка: {str(e)}")
                 logger.error(f"Ошибка оформления заказа: {str(e)}")
@@ -87,7 +100,8 @@ def checkout_view(request):
             messages.error(request, "Пожалуйста, исправьте ошибки в форме")
             response = render(request, 'orders_templates/checkout.html', {
                 'cart': cart,
-                'total': cart.total_price(),
+                'items': items,
+                'total': total,
                 'date_form': date_form,
                 'address_form': address_form
             })
@@ -96,7 +110,8 @@ def checkout_view(request):
 
     return render(request, 'orders_templates/checkout.html', {
         'cart': cart,
-        'total': cart.total_price(),
+        'items': items,
+        'total': total,
         'date_form': date_form,
         'address_form': address_form
     })
@@ -117,6 +132,8 @@ def add_to_cart(request, product_id):
     if not created:
         cart_item.quantity += 1
         cart_item.save()
+    release_cart(cart)
+    bump_cart_version(request.user.pk)
 
     return redirect('orders:cart')
 
@@ -124,15 +141,18 @@ def add_to_cart(request, product_id):
 def remove_from_cart(request, item_id):
     cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
     cart_item.delete()
+    release_cart(cart_item.cart_id)
+    bump_cart_version(request.user.pk)
     return redirect('orders:cart')
 
 def cart_view(request):
     if not request.user.is_authenticated:
         return render(request, 'catalog/favorites.html')
     # Пытаемся получить корзину. Если её нет, вернем пустую.
-    cart = Cart.objects.filter(user=request.user).first()
+    # Сумма и число товаров приходят в том же запросе
+    cart = Cart.objects.with_totals().filter(user=request.user).first()
     # Проверяем, есть ли товары в корзине
-    if not cart or not cart.products.exists():
+    if not cart or not cart.total_items():
         messages.info(request, "Корзина пустая")
     #else: cart = Cart.objects.get(user=request.user)
     return render(request, 'orders_templates/cart.html', {'cart': cart})
@@ -164,6 +184,8 @@ def update_cart_item(request, item_id):
             else:
                 cart_item.delete()
                 messages.success(request, "Товар удален из корзины")
+            release_cart(cart_item.cart_id)
+            bump_cart_version(request.user.pk)
         except ValueError:
             messages.error(request, "Некорректное количество")
 
@@ -195,6 +217,8 @@ def add_order_to_cart(request, order_id):
         if not created:
             new_item.quantity += cart_item.quantity
             new_item.save()
+    release_cart(cart)
+    bump_cart_version(request.user.pk)
 
     messages.success(request, f"Товары из заказа #{order.id} добавлены в корзину!")
     return redirect('orders:cart')
\ No newline at end of file
@@ -0,0 +1,16 @@
+"""
+Планы запросов SQLite для тестов индексов: запросы снимаются с настоящего
+кода (CaptureQueriesContext), для каждого выполняется EXPLAIN QUERY PLAN.
+
+    with CaptureQueriesContext(connection) as queries:
+        ...
+    plans = [explain(query['sql']) for query in queries.captured_queries]
+"""
+from django.db import connection
+
+
+def explain(sql):
+    """План запроса — строки EXPLAIN QUERY PLAN через перевод строки"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return "\n".join(row[-1] for row in cursor.fetchall())
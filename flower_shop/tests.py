@@ -12,6 +12,17 @@ from django.test import TransactionTestCase
 from datetime import datetime, timezone
 from unittest.mock import patch
 from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+import bot
+import captions
+import statistics
+import time
+import os
+import tempfile
+import unittest
 
 class BotCommandsBaseTest(TransactionTestCase):
     reset_sequences = True
@@ -140,4 +151,228 @@ class BotCommandsBaseTest(TransactionTestCase):
         return order
 
     async def async_create_test_order(self, **kwargs):
-        return await sync_to_async(self.create_test_order)(**kwargs)
\ No newline at end of file
+        return await sync_to_async(self.create_test_order)(**kwargs)
+
+@unittest.skipUnless(connections['default'].vendor == 'sqlite', "Профиль соединения SQLite")
+class SQLiteConnectionTests(TransactionTestCase):
+    """settings.SQLITE_PRAGMAS применяются к каждому новому соединению"""
+
+    def pragma(self, connection, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        connection = connections['default']
+        # Журнал и mmap есть только у файловой БД
+        if not connection.is_in_memory_db():
+            self.assertEqual(self.pragma(connection, 'journal_mode'), settings.SQLITE_PRAGMAS['journal_mode'].lower())
+            self.assertEqual(self.pragma(connection, 'mmap_size'), settings.SQLITE_PRAGMAS['mmap_size'])
+        # NORMAL = 1
+        self.assertEqual(self.pragma(connection, 'synchronous'), 1)
+        self.assertEqual(self.pragma(connection, 'busy_timeout'), connection.settings_dict['OPTIONS']['timeout'] * 1000)
+
+    def test_new_thread_connection(self):
+        def read():
+            try:
+                return self.pragma(connections['default'], 'synchronous')
+            finally:
+                connections['default'].close()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            self.assertEqual(executor.submit(read).result(), 1)
+
+class CaptionCacheTests(SimpleTestCase):
+    """Дисковый кэш фото с подписями (captions.py)"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache_dir = os.path.join(self.tmp.name, 'cache')
+        self.source = os.path.join(self.tmp.name, 'rose.jpg')
+        Image.new('RGB', (300, 200), color='red').save(self.source)
+
+    def caption(self, text="Товар 1/1\nРоза\nКоличество: 2 × 150₽", max_bytes=10 ** 7):
+        with patch('captions.render_caption', wraps=captions.render_caption) as render:
+            path = captions.captioned_image(self.source, text, self.cache_dir, max_bytes)
+        return path, render.call_count
+
+    def test_repeated_caption_is_not_rerendered(self):
+        path, rendered = self.caption()
+        self.assertEqual(rendered, 1)
+        with Image.open(path) as img:
+            self.assertEqual(img.width, 300)
+            self.assertGreater(img.height, 200)
+
+        self.assertEqual(self.caption(), (path, 0))
+
+    def test_key_depends_on_caption_and_source(self):
+        path, _ = self.caption()
+        other, rendered = self.caption("Товар 1/1\nРоза\nКоличество: 3 × 150₽")
+        self.assertNotEqual(path, other)
+        self.assertEqual(rendered, 1)
+
+        # Замена фото товара даёт новый ключ
+        Image.new('RGB', (300, 200), color='blue').save(self.source)
+        os.utime(self.source, ns=(0, 10 ** 18))
+        replaced, rendered = self.caption()
+        self.assertNotEqual(replaced, path)
+        self.assertEqual(rendered, 1)
+
+    def test_least_recently_used_files_are_evicted(self):
+        first, _ = self.caption("первая")
+        size = os.path.getsize(first)
+        second, _ = self.caption("вторая")
+        os.utime(first, ns=(0, 1))
+        os.utime(second, ns=(0, 2))
+        # Попадание освежает файл: вытесняться должен второй
+        self.caption("первая")
+
+        third, _ = self.caption("третья", max_bytes=size * 2 + size // 2)
+        self.assertTrue(os.path.exists(first))
+        self.assertFalse(os.path.exists(second))
+        self.assertTrue(os.path.exists(third))
+
+    def test_wrapping_fits_width(self):
+        font = captions.get_font()
+        self.assertIs(font, captions.get_font())
+        lines = captions.wrap_caption("очень длинное название букета " * 5 + "\nКоличество: 1", font, 200)
+        self.assertGreater(len(lines), 2)
+        self.assertEqual(lines[-1], "Количество: 1")
+        self.assertTrue(all(font.getlength(line) <= 200 for line in lines if ' ' in line))
+
+
+class RenderPoolTests(SimpleTestCase):
+    """Отрисовка подписей в пуле не блокирует цикл событий бота"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(bot.shutdown_render_executor)
+        bot.shutdown_render_executor()
+        caption_settings = self.settings(CAPTION_CACHE_DIR=os.path.join(self.tmp.name, 'cache'))
+        caption_settings.enable()
+        self.addCleanup(caption_settings.disable)
+
+    def make_image(self, name, size=2000):
+        path = os.path.join(self.tmp.name, name)
+        Image.effect_noise((size, size), 64).convert('RGB').save(path, quality=95)
+        return path
+
+    async def probe_latency(self, done, interval=0.005):
+        """Задержки ответа обработчика /start, пока идёт отрисовка"""
+        latencies = []
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            await bot.start_command(AsyncMock())
+            latencies.append(time.perf_counter() - started - interval)
+        return latencies
+
+    async def render_with_probe(self, paths):
+        done = asyncio.Event()
+        probe = asyncio.create_task(self.probe_latency(done))
+        try:
+            results = await asyncio.gather(*(
+                bot.add_caption_to_image(path, f"Товар {i}\nБольшой букет") for i, path in enumerate(paths)
+            ))
+        finally:
+            done.set()
+        return results, await probe
+
+    def test_loop_stays_responsive_while_rendering(self):
+        paths = [self.make_image(f'large{i}.jpg') for i in range(4)]
+        executor = bot.get_render_executor()
+
+        with patch.object(executor, 'submit', wraps=executor.submit) as submit:
+            results, latencies = asyncio.run(self.render_with_probe(paths))
+
+        self.assertTrue(all(result.startswith(settings.CAPTION_CACHE_DIR) for result in results))
+        # Каждая отрисовка ушла в пул, а не выполнялась в цикле событий
+        self.assertEqual(submit.call_count, len(paths))
+        self.assertGreater(len(latencies), 5)
+        # Граница с большим запасом: без соотношений со временем рендера,
+        # которые зависят от загрузки машины
+        self.assertLess(statistics.median(latencies), 0.5)
+
+    @override_settings(CAPTION_RENDER_EXECUTOR='process')
+    def test_falls_back_to_threads(self):
+        with patch('bot.ProcessPoolExecutor', side_effect=OSError("no /dev/shm")):
+            executor = bot.get_render_executor()
+        self.assertIsInstance(executor, ThreadPoolExecutor)
+
+        path = self.make_image('small.jpg', size=200)
+        result = asyncio.run(bot.add_caption_to_image(path, "Роза"))
+        self.assertTrue(result.startswith(settings.CAPTION_CACHE_DIR))
+
+    @override_settings(CAPTION_RENDER_TIMEOUT=0.001, CAPTION_RENDER_EXECUTOR='thread')
+    def test_timeout_sends_original(self):
+        path = self.make_image('slow.jpg')
+        self.assertEqual(asyncio.run(bot.add_caption_to_image(path, "Роза")), path)
+
+
+@override_settings(BOT_ORDERS_PAGE_SIZE=3)
+class OrdersPaginationTest(BotCommandsBaseTest):
+    """Постраничный /orders: keyset по (order_date, id), фильтры, без запросов на заказ"""
+
+    def test_queries_do_not_grow_with_orders(self):
+        for _ in range(2):
+            self.create_test_order()
+        # заказы + строки + товары
+        with self.assertNumQueries(3):
+            bot.format_orders_page()
+        for _ in range(5):
+            self.create_test_order()
+        with self.assertNumQueries(3):
+            bot.format_orders_page()
+
+    def test_pages_follow_keyset(self):
+        orders = [self.create_test_order(days_ago=days) for days in range(7)]
+        orders.append(self.create_test_order(status="delivered"))
+        seen = []
+        text, cursor = bot.format_orders_page()
+        while True:
+            seen.extend(order.id for order in orders if f"`#{order.id}`" in text)
+            if not cursor:
+                break
+            self.assertLessEqual(len(cursor.encode()), 64)
+            text, cursor = bot.format_orders_page(*bot.decode_orders_cursor(cursor))
+
+        # Активные заказы от новых к старым, каждый ровно один раз
+        self.assertEqual(seen, [order.id for order in orders[:7]])
+
+    def test_filters(self):
+        self.create_test_order(days_ago=10)
+        recent = self.create_test_order(status="assembled", days_ago=1)
+        delivered = self.create_test_order(status="delivered")
+
+        text, _ = bot.format_orders_page(days=3)
+        self.assertIn(f"`#{recent.id}`", text)
+        self.assertNotIn(f"`#{delivered.id}`", text)
+        self.assertEqual(bot.parse_orders_args("/orders delivered 3"), ("delivered", 3))
+        text, cursor = bot.format_orders_page(*bot.parse_orders_args("/orders delivered"))
+        self.assertIn("Доставлено", text)
+        self.assertIn(f"`#{delivered.id}`", text)
+        self.assertIsNone(cursor)
+        with self.assertRaises(ValueError):
+            bot.parse_orders_args("/orders неизвестно")
+
+    async def test_next_page_button(self):
+        for days in range(4):
+            await self.async_create_test_order(days_ago=days)
+
+        message = AsyncMock()
+        message.text = "/orders"
+        await bot.handle_all_active_orders(message)
+        _, kwargs = message.answer.call_args
+        button = kwargs['reply_markup'].inline_keyboard[0][0]
+        self.assertEqual(button.text, "➡️ Дальше")
+
+        callback = AsyncMock()
+        callback.data = button.callback_data
+        await bot.handle_orders_next_page(callback)
+        callback.message.edit_reply_markup.assert_awaited_once()
+        args, kwargs = callback.message.answer.call_args
+        self.assertIn("Test Flower", args[0])
+        self.assertIsNone(kwargs['reply_markup'])
+        callback.answer.assert_awaited_once()